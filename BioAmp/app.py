@@ -4,23 +4,28 @@ import psutil
 import signal
 import sys
 import atexit
-import time
 import os
-import json
+import shlex
 from threading import Thread
 from flask import Response
+from supervisor import Supervisor
+from event_bus import EventBus
+from metrics import AcquisitionMetrics
 
 app = Flask(__name__)
 app.secret_key = '--'
 
-lsl_process = None            # Process Variable for LSL
-lsl_running = False           # Flag to check if LSL is running
-npg_running = False           # Flag to check if NPG is running
-npg_process = None            # Process Variable for NPG
+supervisor = Supervisor()     # Runs the LSL (chords.py) and NPG (npg-ble.py) stream processes and tracks their state
+events = EventBus()           # Pushes state changes and stream telemetry to the browser (/stream_events)
+acquisition_metrics = AcquisitionMetrics()   # Stream health for /metrics and /metrics.json
 app_processes = {}            # Dictionary to hold other app processes
+visualizer_process = None     # Shared process hosting the plotting apps (visualizer.py)
+VISUALIZER_VIEWS = {"heartbeat_ecg": "ecg", "emgenvelope": "emg", "eog": "eog", "ffteeg": "fft", "gui": "raw"}   # Apps shown as visualizer views
 current_message = None        # Message to display in the UI
 discovered_devices = []       # List for all discovered devices
-npg_connection_thread = None  # Thread for NPG connection
+CHORDS_PORT = os.environ.get("CHORDS_PORT")   # Serial port for chords.py instead of auto-detection (set by simulator.py)
+NPG_COMMAND = shlex.split(os.environ.get("CHORDS_NPG_COMMAND", os.path.join(os.path.dirname(os.path.abspath(__file__)), "npg-ble.py")))   # NPG script, or simulator.py npg
+NPG_FILL_GAPS = os.environ.get("CHORDS_NPG_FILL_GAPS") == "1"   # NaN rows for lost samples, turns the NPG streams into float32
 
 def is_process_running(name):
     """Function to check if a process is running by name."""
@@ -29,10 +34,39 @@ def is_process_running(name):
             return True                               # Returns True if process found
     return False                                      # Returns False if process not found
 
+def current_state():
+    """State shown by the web interface."""
+    return {"lsl_running": supervisor.is_active("lsl"), "npg_running": supervisor.is_active("npg"), "running_apps": [k for k,v in app_processes.items() if v.poll() is None], "message": current_message, "stream_interrupted": any((supervisor.snapshot(name) or {}).get("state") == "interrupted" for name in ("lsl", "npg"))}
+
+def publish_state():
+    """Send the current state to the connected browsers if it changed."""
+    events.publish("message", current_state(), only_changes=True)
+
+def publish_telemetry(name, stats):
+    """Supervisor telemetry listener: forward a stream's samples-per-second and missing-sample counts."""
+    events.publish("telemetry", {"stream": name, **stats})
+
+supervisor.add_telemetry_listener(publish_telemetry)
+supervisor.add_telemetry_listener(acquisition_metrics.observe)
+
+@app.after_request
+def publish_after_request(response):
+    """Request handlers change the state, publish it once they are done."""
+    if request.endpoint != "stream_events":
+        publish_state()
+    return response
+
+def watch_app(process):
+    """Publish the state when an app process exits (e.g. its window is closed)."""
+    def wait():
+        process.wait()
+        publish_state()
+    Thread(target=wait, daemon=True).start()
+
 @app.route("/")   # Route for the Home page
 def home():
     """Render the home page with the current status of LSL Stream , NPG stream, running applications, messages."""
-    return render_template("index.html", lsl_started=lsl_running, npg_started=npg_running, running_apps=[k for k,v in app_processes.items() if v.poll() is None], message=current_message, devices=session.get('devices', []), selected_device=session.get('selected_device'))
+    return render_template("index.html", lsl_started=supervisor.is_active("lsl"), npg_started=supervisor.is_active("npg"), running_apps=[k for k,v in app_processes.items() if v.poll() is None], message=current_message, devices=session.get('devices', []), selected_device=session.get('selected_device'))
 
 @app.route("/scan_devices", methods=["POST"])
 def scan_devices():
@@ -41,7 +75,7 @@ def scan_devices():
     
     try:
         # Run the scanning in a separate process
-        scan_process = subprocess.Popen([sys.executable, "npg-ble.py", "--scan"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        scan_process = subprocess.Popen([sys.executable, *NPG_COMMAND, "--scan"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         
         # Wait for scan to complete (with timeout)
         try:
@@ -71,142 +105,81 @@ def scan_devices():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
+def npg_command(device_addresses):
+    """Command line of the NPG stream process for the given devices."""
+    command = [sys.executable, *NPG_COMMAND, "--connect", *device_addresses, "--reconnect", "--status-json"]
+    if NPG_FILL_GAPS:
+        command.append("--fill-gaps")
+    return command
+
+def streams_ready():
+    """True once the LSL or NPG stream is delivering data, so applications can connect to it."""
+    return any((supervisor.snapshot(name) or {}).get("state") in ("streaming", "reconnecting") for name in ("lsl", "npg"))
+
 @app.route("/connect_device", methods=["POST"])
 def connect_device():
     """Handle POST request to connect to a Bluetooth device"""
-    global npg_process, npg_running, npg_connection_thread, current_message
+    global current_message
     
-    device_address = request.form.get("device_address")    # Get device address from the POST form data
-    if not device_address:                                 # Check if device address was provided
+    device_addresses = request.form.getlist("device_address")   # Get one or more device addresses from the POST form data
+    if not device_addresses:                                    # Check if a device address was provided
         return jsonify({"status": "error", "message": "No device selected"})
+    device_address = ", ".join(device_addresses)                # Shown in the status messages
     
-    session['selected_device'] = device_address            # Store selected device in session
-    
-    if npg_connection_thread and npg_connection_thread.is_alive(): # Check if there's an existing connection thread running
-        if npg_process and npg_process.poll() is None:             # If any active NPG process, terminate it
-            npg_process.terminate()
-            try:
-                npg_process.wait(timeout=2)                        # Wait for process to terminate (with timeout)
-            except subprocess.TimeoutExpired:
-                npg_process.kill()                                 # Force kill if process doesn't terminate smoothly within timeout
-    
-    def connect_and_monitor():
-        """Connect to the device and monitor the output."""
-        global npg_process, npg_running, current_message
-        
-        try:
-            script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "npg-ble.py")    # Get the path of the npg.ble script to run
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            npg_process = subprocess.Popen([sys.executable, script_path, "--connect", device_address], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True, creationflags=creation_flags)    # Start the process with no window
-            time.sleep(1)
-            
-            # Monitor the output for connection status
-            connected = False
-            for line in iter(npg_process.stdout.readline, ''):  # Read lines from the process output
-                if "Connected to" in line:                      # Check for the required message showing successful connection
-                    connected = True                            # Set connected flag to True         
-                if npg_process.poll() is not None:              # If process has terminated, break the loop
-                    break
-            
-            if connected:            # If connected successfully, update the global variables
-                current_message = f"Connected to {device_address}"
-                npg_running = True   # Set npg_running to True
-                monitor_thread = Thread(target=monitor_process_output, args=(npg_process, "npg"), daemon=True)     # Create a new thread to monitor the process output
-                monitor_thread.start()       # Start the monitoring thread that will handle the output of the process
-            else:
-                current_message = f"Failed to connect to {device_address}"      # If not connected, update the message
-                npg_running = False      # Set npg_running to False
-                if npg_process.poll() is None:   # If process is still running, terminate it
-                    npg_process.terminate()
-        
-        except Exception as e:
-            current_message = f"Connection error: {str(e)}"
-            npg_running = False
-            if npg_process and npg_process.poll() is None:
-                npg_process.terminate()
-    
-    # Start the connection in a new thread
-    npg_connection_thread = Thread(target=connect_and_monitor, daemon=True)
-    npg_connection_thread.start()
+    session['selected_device'] = device_addresses               # Store selected devices in session
     
+    if supervisor.is_active("npg"):                             # Replace any NPG process that is still connecting or running
+        supervisor.stop("npg")
+
+    supervisor.start("npg", npg_command(device_addresses))      # The supervisor follows the connection from the process's status lines
+    current_message = f"Connecting to {device_address}..."
     return jsonify({"status": "pending"})
 
 @app.route("/check_connection", methods=["GET"])
 def check_connection():
-    """Check the connection status of the NPG process"""
-    global npg_running, current_message, npg_process
-
-    if npg_process is None or npg_process.poll() is not None:
-        npg_running = False
-        if npg_process:
-            output = npg_process.stdout.read()
-            current_message = f"Connection terminated: {output}"
-        else:
-            current_message = "No active connection"
-        return jsonify({"connected": False, "message": current_message})
-    
-    while True:
-        line = npg_process.stdout.readline()
-        if not line:
-            break
-        
-        if "Connected to" in line:
-            npg_running = True
-            current_message = line.strip()
-            return jsonify({"connected": True, "message": current_message})
-        elif "Data Interrupted" in line or "Data Interrupted (Bluetooth disconnected)" in line:
-            npg_running = False
-            stop_dependent_apps("npg")
-            current_message = line.strip()
-            return jsonify({"connected": False, "message": current_message})
-    
-    return jsonify({"connected": npg_running, "message": current_message or "Connecting..."})
-
-def monitor_process_output(process, process_type):
-    """Monitor the output of a subprocess(LSL/NPG) and handle termination events."""
-    global lsl_running, npg_running, current_message, app_processes
-    
-    while True:      # Infinite loop to keep checking the process output
-        if process.poll() is not None:  # Process has terminated
-            if process_type == "lsl":
-                lsl_running = False
-                current_message = "LSL stream terminated"
-            elif process_type == "npg":
-                npg_running = False
-                current_message = "NPG stream terminated"
-            break
-            
-        line = process.stdout.readline()   # Read a line from the process output
-        if not line:
-            time.sleep(0.1)
-            continue
-            
-        print(f"{process_type} output:", line.strip())  # Debug logging
-            
-        if process_type == "npg" and ("Data Interrupted" in line or "Data Interrupted (Bluetooth disconnected)" in line.lower()): # Handle NPG data interruption
-            current_message = "NPG connection lost - stopping all applications"
-            npg_running = False           # Set npg_running to False
-            stop_dependent_apps("npg")    # Stop all dependent applications
-            
-            if process.poll() is None:    # If process is still running, terminate it
-                process.terminate()
-                try:
-                    process.wait(timeout=0.5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-            break
-            
-        elif process_type == "lsl" and ("Error while closing serial connection" in line or "disconnected" in line.lower()):     # Handle LSL stream interruption
-            current_message = "LSL stream error - connection closed"
-            lsl_running = False
-            stop_dependent_apps("lsl")
-            if process.poll() is None:
-                process.terminate()
-            break
+    """Report the connection status of the NPG process from the supervisor's cached state"""
+    status = supervisor.snapshot("npg")
+    if status is None:
+        return jsonify({"connected": False, "state": None, "message": "No active connection"})
+
+    if status["state"] in ("connected", "streaming", "reconnecting"):
+        return jsonify({"connected": True, "state": status["state"], "message": status["message"]})
+    if status["state"] == "starting":
+        return jsonify({"connected": False, "state": status["state"], "message": "Connecting..."})
+
+    message = status["message"] or "NPG stream terminated"
+    if not message.startswith("Failed"):       # The page stops waiting on messages starting with "Failed"
+        message = f"Failed to connect: {message}"
+    return jsonify({"connected": False, "state": status["state"], "message": message})
+
+def on_stream_change(name, status):
+    """Supervisor listener: update the UI message and stop dependent apps when a stream goes away."""
+    global current_message
+    state = status["state"]
+    if status["stopping"] or not supervisor.is_current(name, status["id"]):   # Stopped on request, or replaced by a newer process
+        return
+    if state == "reconnecting":                # npg-ble.py keeps the stream alive and reconnects
+        current_message = "NPG connection lost - reconnecting"
+    elif state == "streaming":
+        current_message = "LSL stream started successfully" if name == "lsl" else status["message"]
+    elif state == "connected" and name == "npg":
+        current_message = status["message"]
+    elif state == "interrupted":
+        current_message = f"{name.upper()} connection lost - stopping all applications"
+        stop_dependent_apps(name)
+        supervisor.stop(name, stream_id=status["id"])   # Not a process started since this event
+    elif state == "failed":
+        stop_dependent_apps(name)
+        current_message = f"Failed to start {name.upper()} stream - {status['message']}" if name == "lsl" else status["message"]
+    elif state == "stopped":
+        stop_dependent_apps(name)
+    publish_state()
+
+supervisor.add_listener(on_stream_change)
 
 def stop_dependent_apps(stream_type):
     """Stop all dependent applications based on the stream type(LSL/NPG)"""
-    global app_processes, current_message, lsl_running, npg_running
+    global app_processes, current_message
     
     apps_to_stop = []       # Track which apps we're stopping for status message
     for app_name, process in list(app_processes.items()):
@@ -219,96 +192,58 @@ def stop_dependent_apps(stream_type):
                 process.kill()
             del app_processes[app_name]
     
-    if stream_type == "lsl":
-        lsl_running = False
-    elif stream_type == "npg":
-        npg_running = False
-    elif stream_type == "all":
-        lsl_running = False
-        npg_running = False
-    
     if apps_to_stop:
         current_message = f"Stopped {', '.join(apps_to_stop)} due to {stream_type.upper()} stream termination"
     elif stream_type in ["lsl", "npg"]:
         current_message = f"{stream_type.upper()} stream terminated - dependent apps stopped"
+    publish_state()
 
 @app.route("/start_lsl", methods=["POST"])
 def start_lsl():
     """Start the LSL stream and handle CSV saving option."""
-    global lsl_process, lsl_running, current_message
+    global current_message
     save_csv = request.form.get('csv', 'false').lower() == 'true'
 
-    if npg_running:             # Check for conflicting NPG stream
+    if supervisor.is_active("npg"):             # Check for conflicting NPG stream
         current_message = "Please stop NPG stream first"
         return redirect(url_for('home'))
 
-    if lsl_running:              # Prevent duplicate LSL streams
+    if supervisor.is_active("lsl"):             # Prevent duplicate LSL streams
         current_message = "LSL stream already running"
         return redirect(url_for('home'))
 
-    try:
-        command = ["python", "chords.py", "--lsl"]  # Command to start chords.py with LSL streaming
-        if save_csv:                                # Check if CSV saving is requested
-            command.append("--csv")
-
-        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-        lsl_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, creationflags=creation_flags, text=True, bufsize=1)
-
-        output = lsl_process.stdout.readline().strip()
-        if "Serial Connection not established properly.Try Again" in output:      # Check for failure messages in output
-            current_message = "Failed to start LSL stream"
-            lsl_running = False
-        else:
-            current_message = "LSL stream started successfully"
-            lsl_running = True
-
-        if not lsl_running:
-            current_message = "Failed to start LSL stream - no data detected"
-            if lsl_process.poll() is None:
-                lsl_process.terminate()
-            return redirect(url_for('home'))
-
-        monitor_thread = Thread(target=monitor_process_output, args=(lsl_process, "lsl"), daemon=True)      # Create a new thread to monitor the LSL process output
-        monitor_thread.start()
-
-    except Exception as e:
-        current_message = f"Error starting LSL: {str(e)}"
-        lsl_running = False
+    command = ["python", "chords.py", "--lsl", "--status-json"]  # Command to start chords.py with LSL streaming
+    if save_csv:                                # Check if CSV saving is requested
+        command.append("--csv")
+    if CHORDS_PORT:
+        command += ["--port", CHORDS_PORT]
 
+    supervisor.start("lsl", command)            # Success or failure is reported through on_stream_change
+    current_message = "Starting LSL stream..."
     return redirect(url_for('home'))
 
 @app.route("/start_npg", methods=["POST"])
 def start_npg():
     """ Start the NPG stream and handle connection to the selected device."""
-    global npg_process, npg_running, current_message
+    global current_message
 
-    if lsl_running:        # Check for conflicting LSL stream
+    if supervisor.is_active("lsl"):        # Check for conflicting LSL stream
         current_message = "Please stop LSL stream first"
         return jsonify({"status": "error", "message": current_message})
 
-    device_address = session.get('selected_device')
-    if not device_address: # Check if a device is selected
+    device_addresses = session.get('selected_device')
+    if isinstance(device_addresses, str):   # Sessions from before multi-device support hold a single address
+        device_addresses = [device_addresses]
+    if not device_addresses: # Check if a device is selected
         current_message = "No device selected"
         return jsonify({"status": "error", "message": current_message})
 
-    if npg_running:        # Prevent duplicate NPG streams
+    if supervisor.is_active("npg"):        # Prevent duplicate NPG streams
         current_message = "NPG already running"
         return jsonify({"status": "error", "message": current_message})
 
-    try:
-        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "npg-ble.py")
-        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-        
-        npg_process = subprocess.Popen([sys.executable, script_path, "--connect", device_address], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, creationflags=creation_flags, text=True, bufsize=1)
-
-        monitor_thread = Thread(target=monitor_process_output, args=(npg_process, "npg"), daemon=True)
-        monitor_thread.start()
-        return jsonify({"status": "pending", "message": "Attempting to connect to NPG device..."})
-        
-    except Exception as e:
-        current_message = f"Error starting NPG: {str(e)}"
-        npg_running = False
-        return jsonify({"status": "error", "message": current_message})
+    supervisor.start("npg", npg_command(device_addresses))
+    return jsonify({"status": "pending", "message": "Attempting to connect to NPG device..."})
     
 @app.route("/run_app", methods=["POST"])
 def run_app():
@@ -317,7 +252,7 @@ def run_app():
     app_name = request.form.get("app_name")
     valid_apps = ["heartbeat_ecg", "emgenvelope", "eog", "ffteeg", "game", "beetle", "gui", "keystroke", "csvplotter"]
 
-    if not (lsl_running or npg_running):  # Verify either one of the streams is running
+    if not streams_ready():  # Verify either one of the streams is running
         current_message = "Start LSL or NPG first!"
         return redirect(url_for('home'))
 
@@ -330,9 +265,14 @@ def run_app():
         return redirect(url_for('home'))
 
     try:
-        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-        process = subprocess.Popen(["python", f"{app_name}.py"], creationflags=creation_flags)   # Start the application process
+        if app_name in VISUALIZER_VIEWS:
+            process = show_visualizer_view(VISUALIZER_VIEWS[app_name])
+        else:
+            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            process = subprocess.Popen(["python", f"{app_name}.py"], creationflags=creation_flags)   # Start the application process
         
+        if process not in app_processes.values():
+            watch_app(process)
         app_processes[app_name] = process   # Track running process in global dictionary
         current_message = f"{app_name} started successfully"
     except Exception as e:
@@ -340,22 +280,34 @@ def run_app():
 
     return redirect(url_for('home'))
 
+def show_visualizer_view(view):
+    """Open a view in the shared visualizer process, starting the process if needed, and return it.
+
+    All plotting apps run in one visualizer.py process, which resolves the LSL stream once and
+    shares the inlet and filters between its views.
+    """
+    global visualizer_process
+    if visualizer_process and visualizer_process.poll() is None:
+        try:
+            visualizer_process.stdin.write(f"show {view}\n")
+            visualizer_process.stdin.flush()
+            return visualizer_process
+        except OSError:
+            pass        # The visualizer is exiting, start a new one
+
+    creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    visualizer_process = subprocess.Popen(["python", "visualizer.py", "--views", view], stdin=subprocess.PIPE, text=True, creationflags=creation_flags)
+    return visualizer_process
+
 @app.route("/stream_events")
 def stream_events():
-    """Stream events to the client using Server-Sent Events (SSE)."""
-    def event_stream():
-        """Generator function that yields system state updates when changes occur."""
-        last_state = None    # Initialize last_state to None
-        
-        while True:
-            current_state = {"lsl_running": lsl_running, "npg_running": npg_running, "running_apps": [k for k,v in app_processes.items() if v.poll() is None], "message": current_message, "stream_interrupted": (current_message and ("Data Interrupted (Bluetooth Disconnected)" in current_message or "Error while closing serial connection" in current_message))}
-            if current_state != last_state:
-                yield f"data: {json.dumps(current_state)}\n\n"
-                last_state = current_state.copy()
-            
-            time.sleep(0.5)
-    
-    return Response(event_stream(), mimetype="text/event-stream")
+    """Stream events to the client using Server-Sent Events (SSE).
+
+    State changes are sent as default (message) events, stream telemetry as "telemetry" events.
+    Each client blocks on its own event bus queue until something is published.
+    """
+    publish_state()                      # Make sure a new client starts from the current state
+    return Response(events.stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/stop_all", methods=['POST'])
 def stop_all():
@@ -373,6 +325,18 @@ def cleanup_processes():
         if v.poll() is None  # Only keep running processes
     }
 
+@app.route("/metrics")
+def metrics():
+    """Acquisition health (samples/s, missing samples, queue depth, decode time, clock drift) in the Prometheus text format."""
+    streams = {name: supervisor.snapshot(name) for name in ("lsl", "npg")}
+    return Response(acquisition_metrics.to_prometheus(streams), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics.json")
+def metrics_json():
+    """Acquisition health as JSON, including the rolling histograms."""
+    streams = {name: supervisor.snapshot(name) for name in ("lsl", "npg")}
+    return jsonify(acquisition_metrics.to_json(streams))
+
 @app.route("/check_app_status", methods=["GET"])
 def check_app_status():
     """ Check the status of running applications and return a JSON response."""
@@ -381,29 +345,16 @@ def check_app_status():
 
 def stop_all_processes():
     """Stop all running processes and clear the current message."""
-    global lsl_process, npg_process, app_processes, lsl_running, npg_running, current_message
-
-    # Terminate LSL process
-    if lsl_process and lsl_process.poll() is None:
-        lsl_process.terminate()
-        try:
-            lsl_process.wait(timeout=3)
-        except subprocess.TimeoutExpired:
-            lsl_process.kill()
-        lsl_running = False
-        stop_dependent_apps("lsl")
+    global current_message
 
-    if npg_process and npg_process.poll() is None:
-        npg_process.terminate()
-        try:
-            npg_process.wait(timeout=3)
-        except subprocess.TimeoutExpired:
-            npg_process.kill()
-        npg_running = False
-        stop_dependent_apps("npg")
+    for name in ("lsl", "npg"):           # Terminate the stream processes
+        if supervisor.is_active(name):
+            supervisor.stop(name)
+            stop_dependent_apps(name)
 
     stop_dependent_apps("all")
     current_message = "All processes stopped"
+    publish_state()
     print("All processes terminated.")
 
 def handle_sigint(signal_num, frame):
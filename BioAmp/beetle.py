@@ -2,14 +2,14 @@ import pygame
 import pylsl
 import numpy as np
 import time
-from pylsl import StreamInlet, resolve_streams, resolve_byprop
-from scipy.signal import iirnotch, butter, lfilter
-import math
+from pylsl import StreamInlet, resolve_byprop
+from stream_filters import StreamingFilter, notch, bandpass
+from spectral import SpectralTracker
 from PIL import Image
 
 # Initialize LSL stream
 print("Searching for available LSL streams...")
-streams = resolve_streams()
+streams = resolve_byprop('type', 'EXG', timeout=1.0)   # Raw data only, not derived streams such as the EMG envelope
 available_streams = [s.name() for s in streams]
 
 if not available_streams:
@@ -31,12 +31,11 @@ if inlet is None:
 sampling_rate = int(inlet.info().nominal_srate())
 print(f"Sampling rate: {sampling_rate} Hz")
 
-b_notch, a_notch = iirnotch(50.0 / (sampling_rate / 2), 30.0)
-b_band, a_band = butter(4, [0.5 / (sampling_rate / 2), 48.0 / (sampling_rate / 2)], btype='band')
+eeg_filter = StreamingFilter(notch(50.0, sampling_rate), bandpass(0.5, 48.0, sampling_rate, order=4))
 
-# Buffer for EEG data and Focus tracking variables
-buffer = []
+# Focus tracking: band power of 500-sample windows, one window per focus update
 buffer_size = 500
+focus_tracker = SpectralTracker(sampling_rate, window_size=buffer_size, hop=buffer_size)
 
 # Beetle properties
 beetle_x, beetle_y = 380, 530
@@ -71,23 +70,14 @@ def show_message(message, duration=3):
         pygame.display.update()
 
 # Apply filters
-def apply_filters(eeg_point):
-    filtered = lfilter(b_notch, a_notch, [eeg_point])
-    filtered_point = lfilter(b_band, a_band, filtered)
-    return filtered_point[0]
-
-def calculate_focus_level(eeg_data, sampling_rate=500):
-    window = np.hanning(len(eeg_data))  
-    eeg_data_windowed = eeg_data * window
-    fft_data = np.abs(np.fft.fft(eeg_data_windowed))[:len(eeg_data_windowed) // 2]
-    fft_data /= len(eeg_data_windowed)
-    freqs = np.fft.fftfreq(len(eeg_data_windowed), d=1 / sampling_rate)[:len(eeg_data_windowed) // 2]
-    
-    delta_power = math.sqrt(np.sum((fft_data[(freqs >= 0.5) & (freqs <= 4)]) ** 2))
-    theta_power = math.sqrt(np.sum((fft_data[(freqs >= 4) & (freqs <= 8)]) ** 2))
-    alpha_power = math.sqrt(np.sum((fft_data[(freqs >= 8) & (freqs <= 13)]) ** 2))
-    beta_power = math.sqrt(np.sum((fft_data[(freqs >= 13) & (freqs <= 30)]) ** 2))
-    gamma_power = math.sqrt(np.sum((fft_data[(freqs >= 30) & (freqs <= 45)]) ** 2))
+def apply_filters(eeg_chunk):
+    return eeg_filter.process(eeg_chunk)
+
+def calculate_focus_level(eeg_data=None):
+    """Share of beta and gamma in the total band power of `eeg_data`, or of the tracker's latest window."""
+    if eeg_data is not None:
+        focus_tracker.compute(eeg_data)
+    delta_power, theta_power, alpha_power, beta_power, gamma_power = focus_tracker.band_power(normalize=False)[0]
     
     power = (beta_power + gamma_power) / (delta_power + theta_power + alpha_power + beta_power + gamma_power)
     return power
@@ -117,14 +107,13 @@ def calibrate():
         screen.blit(text, text_rect)
         pygame.display.update()
         
-        sample, _ = inlet.pull_sample(timeout=0.1)
-        if sample:
-            filtered_sample = apply_filters(sample[0])
-            calibration_data.append(filtered_sample)
+        samples, _ = inlet.pull_chunk(timeout=0.1)
+        if samples:
+            calibration_data.extend(apply_filters(np.asarray(samples)[:, 0]))
 
     if len(calibration_data) >= buffer_size:        # Ensure enough data was collected
         eeg_data = np.array(calibration_data)
-        baseline_focus_levels = [calculate_focus_level(eeg_data[i:i + buffer_size]) for i in range(0, len(eeg_data), buffer_size)]
+        baseline_focus_levels = [calculate_focus_level(eeg_data[i:i + buffer_size]) for i in range(0, len(eeg_data) - buffer_size + 1, buffer_size)]
         mean_focus = np.mean(baseline_focus_levels)
         std_focus = np.std(baseline_focus_levels)
 
@@ -160,7 +149,6 @@ print("STARTING GAME...")
 running = True
 focus_timer = 0
 last_focus_time = time.time()
-last_time = time.time()
 
 while running:
     try:
@@ -168,22 +156,17 @@ while running:
             if event.type == pygame.QUIT:
                 running = False
 
-        sample, _ = inlet.pull_sample(timeout=0.1)
-        if sample:
-            filtered_sample = apply_filters(sample[0])
-            buffer.append(filtered_sample)
+        samples, _ = inlet.pull_chunk(timeout=0.0)
+        window_ready = False
+        if samples:
+            window_ready = focus_tracker.update(apply_filters(np.asarray(samples)[:, 0]))
+        else:
+            pygame.time.wait(5)   # Nothing new yet, avoid busy-waiting
 
         current_time = time.time()
 
-        if current_time - last_time >= 1:
-            last_time = current_time
-            buffer = buffer[int(len(buffer) * 0.2):]
-
-        if len(buffer) >= buffer_size:
-            eeg_data = np.array(buffer)
-            buffer = []
-
-            focus_level = calculate_focus_level(eeg_data)
+        if window_ready:       # A new window was analysed (every buffer_size samples)
+            focus_level = calculate_focus_level()
             print(focus_level)
 
             if focus_level > focus_threshold:
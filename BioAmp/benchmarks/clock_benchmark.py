@@ -0,0 +1,54 @@
+# Accuracy benchmark for the stream_clock.py SampleClock
+#
+# Feeds SampleClock blocks from a simulated board whose clock runs off its nominal rate and
+# whose blocks arrive with random delivery delays (the first one extra late), then reports
+# how far the timestamps are from the true capture times and checks that they never go backwards.
+#
+# Usage: python benchmarks/clock_benchmark.py [--rate 500] [--block 10] [--ppm 300] [--first-delay 0.03]
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the BioAmp scripts importable
+from stream_clock import SampleClock
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SampleClock timestamps")
+    parser.add_argument('--rate', type=int, default=500, help="Nominal sampling rate")
+    parser.add_argument('--block', type=int, default=10, help="Samples per delivered block")
+    parser.add_argument('--seconds', type=int, default=60, help="Seconds of data")
+    parser.add_argument('--ppm', type=float, default=300, help="Board clock error in ppm (fast > 0)")
+    parser.add_argument('--latency', type=float, default=0.002, help="Smallest delivery delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.004, help="Mean extra delivery delay in seconds")
+    parser.add_argument('--first-delay', type=float, default=0.03, help="Extra delay of the first block in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    clock = SampleClock(args.rate)
+    true_rate = args.rate * (1 + args.ppm * 1e-6)
+    stamps, captures = [], []
+    for start in range(0, args.rate * args.seconds, args.block):
+        unrolled = np.arange(start, start + args.block)
+        capture = 1000.0 + unrolled / true_rate                 # Host time at which each sample was taken
+        arrival = capture[-1] + args.latency + rng.exponential(args.jitter) + (args.first_delay if start == 0 else 0.0)
+        stamps.append(clock.timestamps(unrolled, arrival))
+        captures.append(capture)
+    stamps, captures = np.concatenate(stamps), np.concatenate(captures)
+
+    steps = np.diff(stamps)
+    error = (stamps - captures - args.latency) * 1000
+    settled = error[args.rate * 2:]                              # After the first resync
+    print(f"{len(stamps)} samples, {args.block} per block, board {args.ppm:+g} ppm, first block {args.first_delay * 1000:g} ms late")
+    print(f"Timestamp error after 2 s: mean {settled.mean():.2f} ms, p95 {np.percentile(np.abs(settled), 95):.2f} ms, max {np.abs(settled).max():.2f} ms")
+    print(f"Smallest step between samples: {steps.min() * 1000:.3f} ms (nominal {1000 / args.rate:.3f} ms)")
+    if clock.drift is not None:
+        print(f"Estimated drift: {clock.drift:.3f} s/hour (actual {args.ppm * 1e-6 * 3600:.3f})")
+    if steps.min() <= 0:
+        print("Timestamps went backwards!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
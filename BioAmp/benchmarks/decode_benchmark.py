@@ -0,0 +1,108 @@
+# Throughput benchmark for the chords.py packet decoder
+#
+# Compares the vectorized `chords.decode_packets` against the original per-packet loop
+# on a synthetic byte stream and checks that both produce the same samples.
+#
+# Usage: python benchmarks/decode_benchmark.py [--channels 16] [--seconds 10] [--rate 500]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the BioAmp scripts importable
+import chords
+
+def make_stream(num_channels, num_packets, drop_rate=0.001, noise_rate=0.0005, seed=0):
+    """Build a byte stream of framed packets with a few dropped packets and stray bytes."""
+    rng = np.random.default_rng(seed)
+    stream = bytearray()
+    for counter in range(num_packets):
+        if rng.random() < drop_rate:
+            continue  # Simulate a lost packet
+        values = rng.integers(0, 2**14, num_channels, dtype=np.uint16)
+        stream += bytes([chords.SYNC_BYTE1, chords.SYNC_BYTE2, counter % 256])
+        stream += values.astype('>u2').tobytes()
+        stream.append(chords.END_BYTE)
+        if rng.random() < noise_rate:
+            stream += bytes(rng.integers(0, 256, 3, dtype=np.uint8))  # Simulate line noise between packets
+    return stream
+
+def per_packet_decode(buffer, num_channels, inverted=False, mid_value=0):
+    """The original read_arduino_data loop, without the serial and output side effects."""
+    packet_length = (2 * num_channels) + chords.HEADER_LENGTH + 1
+    counters = []
+    samples = []
+    while len(buffer) >= packet_length:
+        sync_index = buffer.find(bytes([chords.SYNC_BYTE1, chords.SYNC_BYTE2]))
+        if sync_index == -1:
+            buffer.clear()
+            continue
+        if len(buffer) >= sync_index + packet_length:
+            packet = buffer[sync_index:sync_index + packet_length]
+            if len(packet) == packet_length and packet[0] == chords.SYNC_BYTE1 and packet[1] == chords.SYNC_BYTE2 and packet[-1] == chords.END_BYTE:
+                counters.append(packet[2])
+                channel_data = []
+                for channel in range(num_channels):
+                    high_byte = packet[2*channel + chords.HEADER_LENGTH]
+                    low_byte = packet[2*channel + chords.HEADER_LENGTH + 1]
+                    value = (high_byte << 8) | low_byte
+                    if inverted:
+                        if value > mid_value:
+                            value = (mid_value) - abs(mid_value - value)
+                        elif value < mid_value:
+                            value = (mid_value) + abs(mid_value - value)
+                    channel_data.append(float(value))
+                samples.append(channel_data)
+                del buffer[:sync_index + packet_length]
+            else:
+                del buffer[:sync_index + 1]
+        else:
+            break
+    return counters, samples
+
+def feed(decoder, stream, read_size):
+    """Feed the stream to a decoder in serial-sized reads and return the decoded samples and elapsed time."""
+    buffer = bytearray()
+    decoded = []
+    start = time.perf_counter()
+    for offset in range(0, len(stream), read_size):
+        buffer.extend(stream[offset:offset + read_size])
+        decoded.extend(decoder(buffer))
+    return decoded, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chords.py packet decoder")
+    parser.add_argument('--channels', type=int, default=16, help="Number of channels per packet")
+    parser.add_argument('--rate', type=int, default=500, help="Sampling rate used to size the stream")
+    parser.add_argument('--seconds', type=int, default=10, help="Seconds of data to decode")
+    parser.add_argument('--read-size', type=int, default=4096, help="Bytes handed to the decoder per serial read")
+    args = parser.parse_args()
+
+    num_packets = args.rate * args.seconds
+    stream = make_stream(args.channels, num_packets)
+    print(f"{num_packets} packets, {args.channels} channels, {len(stream)} bytes, {args.read_size} bytes per read")
+
+    def legacy(buffer):
+        counters, samples = per_packet_decode(buffer, args.channels)
+        return samples
+
+    def vectorized(buffer):
+        counters, samples, consumed = chords.decode_packets(buffer, args.channels)
+        del buffer[:consumed]
+        return samples.tolist()
+
+    legacy_samples, legacy_time = feed(legacy, stream, args.read_size)
+    batch_samples, batch_time = feed(vectorized, stream, args.read_size)
+
+    if legacy_samples != batch_samples:
+        print("Mismatch between per-packet and vectorized decoders!")
+        sys.exit(1)
+
+    print(f"Per-packet decoder: {len(legacy_samples) / legacy_time:,.0f} samples/s ({legacy_time:.3f}s)")
+    print(f"Vectorized decoder: {len(batch_samples) / batch_time:,.0f} samples/s ({batch_time:.3f}s)")
+    print(f"Speedup: {legacy_time / batch_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
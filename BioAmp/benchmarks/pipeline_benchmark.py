@@ -0,0 +1,332 @@
+# End-to-end benchmark suite for the acquisition and processing pipeline
+#
+# Driven by the simulator's synthetic sources, it measures:
+#   serial_decode   chords.read_arduino_data on a stream of serial packets
+#   ble_decode      npg-ble.py NPGBluetoothClient.notification_handler on notification blocks
+#   lsl             push/pull overhead and latency through a local LSL outlet and inlet
+#   app_ticks       per-tick processing of the ffteeg, eog, heartbeat_ecg and emgenvelope views
+#                   (driven through a StreamHub, needs PyQt5 and pyqtgraph)
+#   keystroke       per-chunk processing of keystroke.py and the glass-to-action latency from the
+#                   sample at the blink peak to the keystroke action (needs tkinter and pyautogui)
+#
+# Results are written as JSON (--report) so runs can be compared across releases; --baseline
+# prints the change of every metric against an earlier report. Sections whose dependencies are
+# missing are reported as skipped.
+#
+# Usage: python benchmarks/pipeline_benchmark.py [--seconds 10] [--report benchmark-report.json] [--baseline old.json]
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+BIOAMP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BIOAMP_DIR)  # Make the BioAmp scripts importable
+import chords
+import simulator
+
+SECTIONS = ["serial_decode", "ble_decode", "lsl", "app_ticks", "keystroke"]
+
+def summarize(durations):
+    """Mean and percentiles of a list of durations in seconds, in milliseconds."""
+    values = np.asarray(durations) * 1000
+    if len(values) == 0:
+        return {}
+    return {"mean_ms": float(values.mean()), "p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max()), "count": int(len(values))}
+
+class ReplaySerial:
+    """Serial port stand-in that returns a prepared byte stream in fixed-size reads."""
+    def __init__(self, stream, read_size):
+        self.stream = stream
+        self.read_size = read_size
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.read_size, len(self.stream) - self.position)
+
+    def read(self, size):
+        data = self.stream[self.position:self.position + size]
+        self.position += len(data)
+        return bytes(data)
+
+def bench_serial_decode(args):
+    source = simulator.SignalSource(args.signal, args.channels, args.rate, resolution=14)
+    count = args.rate * args.seconds
+    counters = np.arange(count) % 256
+    stream = simulator.encode_packets(counters, source.read(count))
+    chords.board = "UNO-R4"
+    chords.set_session_layout(args.channels, 14)
+    chords.buffer = bytearray()
+    chords.previous_sample_number = None
+    chords.previous_unrolled_counter = None
+    chords.missing_samples = 0
+    chords.start_time = None
+    chords.cumulative_packet_count = 0
+    serial_port = ReplaySerial(stream, args.read_size)
+
+    calls = []
+    start = time.perf_counter()
+    while serial_port.in_waiting:
+        call_start = time.perf_counter()
+        chords.read_arduino_data(serial_port)
+        calls.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    decoded = chords.cumulative_packet_count
+    return {"samples": decoded, "bytes": len(stream), "read_size": args.read_size, "samples_per_s": decoded / elapsed,
+            "missing": chords.missing_samples, "per_read": summarize(calls)}
+
+def load_npg_module():
+    """Import npg-ble.py with the simulator's BLE stub in place of bleak."""
+    sys.modules["bleak"] = simulator.BleStub().module()
+    spec = importlib.util.spec_from_file_location("npg_ble", os.path.join(BIOAMP_DIR, "npg-ble.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench_ble_decode(args):
+    npg = load_npg_module()
+    source = simulator.SignalSource(args.signal, npg.NUM_CHANNELS, npg.SAMPLING_RATE, resolution=12)
+    blocks = []
+    for index in range(npg.SAMPLING_RATE * args.seconds // npg.BLOCK_COUNT):
+        block = np.zeros(npg.BLOCK_COUNT, dtype=npg.SAMPLE_DTYPE)
+        block['counter'] = (index * npg.BLOCK_COUNT + np.arange(npg.BLOCK_COUNT)) % 256
+        block['channels'] = source.read(npg.BLOCK_COUNT).astype(np.int16)
+        blocks.append(bytearray(block.tobytes()))
+
+    client = npg.NPGBluetoothClient("SIM-1")
+    client.fill_gaps = True
+    durations = []
+    start = time.perf_counter()
+    for block in blocks:
+        call_start = time.perf_counter()
+        client.notification_handler(None, block)
+        durations.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    samples = len(blocks) * npg.BLOCK_COUNT
+    return {"samples": samples, "samples_per_s": samples / elapsed, "missing": client.total_missing_samples, "per_notification": summarize(durations)}
+
+def bench_lsl(args):
+    from pylsl import StreamInfo, StreamOutlet, StreamInlet, resolve_byprop, local_clock
+    from sample_writer import push_block
+    source_id = f"benchmark-{os.getpid()}"
+    outlet = StreamOutlet(StreamInfo("Benchmark", "EXG", args.channels, args.rate, "float32", source_id))
+    streams = resolve_byprop("source_id", source_id, timeout=5)
+    if not streams:
+        return {"skipped": "benchmark stream not found"}
+    inlet = StreamInlet(streams[0])
+    inlet.open_stream(timeout=5)
+
+    source = simulator.SignalSource(args.signal, args.channels, args.rate)
+    chunk = max(1, args.rate // 100)                 # 10 ms chunks, as a board read would deliver
+    pushes, pulls, latencies = [], [], []
+    received = 0
+    end_time = time.perf_counter() + min(args.seconds, 5)
+    while time.perf_counter() < end_time:
+        samples = source.read(chunk).astype(np.float32)
+        now = local_clock()
+        timestamps = now - (chunk - 1 - np.arange(chunk)) / args.rate
+        push_start = time.perf_counter()
+        push_block(outlet, samples, timestamps)
+        pushes.append(time.perf_counter() - push_start)
+        pull_start = time.perf_counter()
+        count = 0
+        first, _ = inlet.pull_sample(timeout=0.5)                      # Waits for the chunk to arrive
+        if first is not None:
+            count = 1
+            deadline = time.perf_counter() + 0.5
+            while count < chunk and time.perf_counter() < deadline:  # and for the rest of it
+                _, pulled_timestamps = inlet.pull_chunk(timeout=0.0)
+                count += len(pulled_timestamps)
+        pulls.append(time.perf_counter() - pull_start)
+        received += count
+        if count >= chunk:
+            latencies.append(local_clock() - now)                   # Push of the chunk -> all of it pulled
+        time.sleep(chunk / args.rate)
+    inlet.close_stream()
+    return {"chunk_samples": chunk, "received": received, "push": summarize(pushes), "pull": summarize(pulls), "latency": summarize(latencies)}
+
+class ChunkInlet:
+    """LSL inlet stand-in that hands out prepared chunks, one per pull_chunk call."""
+    class Info:
+        def __init__(self, sampling_rate, num_channels):
+            self.sampling_rate = sampling_rate
+            self.num_channels = num_channels
+
+        def nominal_srate(self):
+            return self.sampling_rate
+
+        def channel_count(self):
+            return self.num_channels
+
+        def name(self):
+            return "Benchmark"
+
+    def __init__(self, chunks, timestamps, sampling_rate, num_channels):
+        self.chunks = chunks
+        self.timestamps = timestamps
+        self.position = 0
+        self.stream_info = self.Info(sampling_rate, num_channels)
+
+    def info(self):
+        return self.stream_info
+
+    def samples_available(self):
+        return len(self.chunks[self.position]) if self.position < len(self.chunks) else 0
+
+    def pull_chunk(self, timeout=0.0, max_samples=None):
+        if self.position >= len(self.chunks):
+            return [], []
+        chunk, timestamps = self.chunks[self.position], self.timestamps[self.position]
+        self.position += 1
+        return chunk, timestamps
+
+def make_chunks(signal, num_channels, sampling_rate, seconds, chunk):
+    source = simulator.SignalSource(signal, num_channels, sampling_rate)
+    chunks, timestamps = [], []
+    for start in range(0, sampling_rate * seconds, chunk):
+        chunks.append(source.read(chunk).astype(np.float64))
+        timestamps.append(list((start + np.arange(chunk)) / sampling_rate))
+    return chunks, timestamps
+
+def bench_app_ticks(args):
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from pyqtgraph.Qt import QtWidgets
+        from stream_hub import StreamHub
+    except ImportError as e:
+        return {"skipped": str(e)}
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    chunk = max(1, args.rate // 100)                 # What a 10 ms hub tick receives
+    views = {
+        "ffteeg": ("ffteeg", "EEGMonitor", "eeg", lambda cls, hub: cls(num_channels=1, hub=hub)),
+        "eog": ("eog", "EOGMonitor", "eog", lambda cls, hub: cls(hub=hub)),
+        "heartbeat_ecg": ("heartbeat_ecg", "ECGMonitor", "ecg", lambda cls, hub: cls(hub=hub)),
+        "emgenvelope": ("emgenvelope", "EMGMonitor", "emg", lambda cls, hub: cls(hub=hub)),
+    }
+    results = {}
+    for name, (module_name, class_name, signal, create) in views.items():
+        try:
+            view_class = getattr(importlib.import_module(module_name), class_name)
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+            continue
+        chunks, timestamps = make_chunks(signal, args.channels, args.rate, args.seconds, chunk)
+        hub = StreamHub(inlet=ChunkInlet(chunks, timestamps, args.rate, args.channels))
+        view = create(view_class, hub)
+        ticks = []
+        for _ in range(len(chunks)):
+            tick_start = time.perf_counter()
+            hub.update()
+            ticks.append(time.perf_counter() - tick_start)
+        app.processEvents()
+        view.close()
+        results[name] = {"chunk_samples": chunk, "per_tick": summarize(ticks)}
+    return results
+
+class NullButton:
+    """Stands in for the Tk blink button, whose colour keystroke.py flashes on every action."""
+    def config(self, **options):
+        pass
+
+    def update(self):
+        pass
+
+    def after(self, delay, callback):
+        pass
+
+def bench_keystroke(args):
+    try:
+        import keystroke
+    except Exception as e:  # tkinter or pyautogui (which needs a display) missing
+        return {"skipped": str(e)}
+    chunk = max(1, args.rate // 100)                 # keystroke.py handles samples as they arrive, 10 ms board reads
+    chunks, timestamps = make_chunks("eog", 1, args.rate, args.keystroke_seconds, chunk)
+    actions = []
+    detector = keystroke.EOGPeakDetector(NullButton(), lambda: actions.append(time.perf_counter()), NullButton())
+    detector.configure(args.rate)
+
+    # Blink peaks of the simulated EOG, in sample numbers (simulator.eog_wave: every 2.5 s, centred at 1.25 s)
+    peaks = [int((1.25 + 2.5 * index) * args.rate) for index in range(int(args.keystroke_seconds / 2.5))]
+    processing, latencies = [], []
+    false_actions = 0
+    stream_start = time.perf_counter()
+    for index, (samples, chunk_timestamps) in enumerate(zip(chunks, timestamps)):
+        arrival = stream_start + (index + 1) * chunk / args.rate   # The chunk is complete once its last sample exists
+        time.sleep(max(0.0, arrival - time.perf_counter()))        # Real time, the refractory periods use the clock
+        before = len(actions)
+        call_start = time.perf_counter()
+        detector.process_samples(samples, chunk_timestamps)
+        processing.append(time.perf_counter() - call_start)
+        if len(actions) > before:
+            peak = max([p for p in peaks if p < (index + 1) * chunk], default=None)
+            latency = actions[-1] - (stream_start + peak / args.rate) if peak is not None else None   # Blink peak in the signal -> action
+            if latency is not None and latency < 0.5:
+                latencies.append(latency)
+            else:
+                false_actions += 1            # Not caused by a blink (e.g. an eye movement)
+    return {"chunk_samples": chunk, "blinks": len(peaks), "detected": len(latencies), "false_actions": false_actions,
+            "per_chunk": summarize(processing), "glass_to_action": summarize(latencies)}
+
+BENCHMARKS = {"serial_decode": bench_serial_decode, "ble_decode": bench_ble_decode, "lsl": bench_lsl, "app_ticks": bench_app_ticks, "keystroke": bench_keystroke}
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BIOAMP_DIR, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "machine": platform.machine()}
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, numbers only."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(results, baseline_file):
+    """Print the change of every metric against an earlier report (throughput up and times down are better)."""
+    with open(baseline_file) as f:
+        baseline = flatten(json.load(f)["results"])
+    for key, value in flatten(results).items():
+        if key in baseline and baseline[key]:
+            change = (value - baseline[key]) / abs(baseline[key]) * 100
+            print(f"{key}: {baseline[key]:.4g} -> {value:.4g} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Chords-Python pipeline with simulated sources")
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS, help="Benchmarks to run (default: all)")
+    parser.add_argument('--seconds', type=int, default=10, help="Seconds of simulated data per benchmark")
+    parser.add_argument('--keystroke-seconds', type=int, default=10, help="Seconds of real-time EOG for the keystroke latency")
+    parser.add_argument('--channels', type=int, default=6, help="Number of channels")
+    parser.add_argument('--rate', type=int, default=500, help="Sampling rate")
+    parser.add_argument('--signal', default="eeg", choices=simulator.SIGNALS, help="Waveform for the decode and LSL benchmarks")
+    parser.add_argument('--read-size', type=int, default=4096, help="Bytes per simulated serial read")
+    parser.add_argument('--report', default="benchmark-report.json", help="JSON report file")
+    parser.add_argument('--baseline', help="Earlier report to compare with")
+    args = parser.parse_args()
+
+    results = {}
+    for section in args.sections:
+        print(f"Running {section}...")
+        results[section] = BENCHMARKS[section](args)
+        print(json.dumps(results[section], indent=2))
+
+    report = {"version": 1, "time": time.time(), "environment": environment(), "config": {key: value for key, value in vars(args).items() if key not in ("report", "baseline")}, "results": results}
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
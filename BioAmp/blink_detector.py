@@ -0,0 +1,70 @@
+from collections import namedtuple
+import numpy as np
+from scipy.signal import lfilter
+
+BlinkEvent = namedtuple("BlinkEvent", ["timestamp", "index", "value"])  # LSL timestamp, absolute sample number, filtered value
+
+class BlinkDetector:
+    """Streaming blink (peak) detector for a filtered EOG signal.
+
+    Only new samples are processed: the threshold is `mean + threshold_sd * std` of the signal,
+    tracked with exponential moving averages over roughly `stats_window` seconds, and local maxima
+    above it are found with NumPy. The last two samples are carried over so peaks on chunk
+    boundaries are not missed. Peaks closer than `refractory_period` seconds to the previous
+    blink (by timestamp) are ignored, and nothing is reported during the first `warmup` seconds.
+    """
+    def __init__(self, sampling_rate, threshold_sd=2.0, refractory_period=0.1, stats_window=5.0, warmup=2.0):
+        self.sampling_rate = sampling_rate
+        self.threshold_sd = threshold_sd
+        self.refractory_period = refractory_period
+        self.warmup_samples = int(warmup * sampling_rate)
+        alpha = 1.0 / (stats_window * sampling_rate)       # Smoothing factor of the moving averages
+        self.ema_b, self.ema_a = [alpha], [1.0, alpha - 1.0]
+        self.mean_zi = None                                # Moving average of the signal
+        self.square_zi = None                              # Moving average of the squared signal
+        self.tail = (np.empty(0), np.empty(0), np.empty(0))  # Last two (values, thresholds, timestamps)
+        self.total = 0                                     # Samples processed so far
+        self.last_blink = -np.inf                          # Timestamp of the last reported blink
+
+    def thresholds(self, values):
+        """Adaptive threshold after each of the (valid) samples."""
+        if self.mean_zi is None:
+            self.mean_zi = np.array([(1.0 - self.ema_b[0]) * values[0]])
+            self.square_zi = np.array([(1.0 - self.ema_b[0]) * values[0] ** 2])
+        mean, self.mean_zi = lfilter(self.ema_b, self.ema_a, values, zi=self.mean_zi)
+        square, self.square_zi = lfilter(self.ema_b, self.ema_a, values ** 2, zi=self.square_zi)
+        return mean + self.threshold_sd * np.sqrt(np.maximum(square - mean ** 2, 0))
+
+    def process(self, values, timestamps=None):
+        """Add filtered samples (and their LSL timestamps) and return the blinks found as BlinkEvents."""
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        if count == 0:
+            return []
+        if timestamps is None:
+            timestamps = (self.total + np.arange(count)) / self.sampling_rate
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        thresholds = np.full(count, np.nan)   # NaN samples (stream gaps) never count as peaks
+        valid = ~np.isnan(values)
+        if valid.any():
+            thresholds[valid] = self.thresholds(values[valid])
+
+        tail_values, tail_thresholds, tail_timestamps = self.tail
+        signal = np.concatenate([tail_values, values])
+        limits = np.concatenate([tail_thresholds, thresholds])
+        times = np.concatenate([tail_timestamps, timestamps])
+        first_index = self.total - len(tail_values)   # Absolute sample number of signal[0]
+        self.tail = (signal[-2:], limits[-2:], times[-2:])
+        self.total += count
+
+        middle = signal[1:-1]
+        candidates = np.flatnonzero((middle > signal[:-2]) & (middle > signal[2:]) & (middle > limits[1:-1])) + 1
+        candidates = candidates[first_index + candidates >= self.warmup_samples]
+
+        events = []
+        for position in candidates:   # Few candidates per chunk, so the refractory check stays in Python
+            if times[position] - self.last_blink >= self.refractory_period:
+                self.last_blink = times[position]
+                events.append(BlinkEvent(times[position], first_index + position, signal[position]))
+        return events
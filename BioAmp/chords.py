@@ -28,16 +28,25 @@
 
 
 # Import necessary modules
-from pylsl import StreamInfo, StreamOutlet  # For LSL (Lab Streaming Layer) to stream data
+from pylsl import StreamInfo, StreamOutlet, local_clock  # For LSL (Lab Streaming Layer) to stream data
 import argparse  # For command-line argument parsing
 import serial  # For serial communication with Arduino
 import time  # For time-related functions
-import csv  # For handling CSV file operations
+from recording import open_recorder  # For CSV and binary recordings
+from sample_writer import SampleWriter  # Background thread for recording and LSL output
+from stream_clock import SampleClock, unroll_counters  # For timestamps derived from the packet counter
 from datetime import datetime  # For getting current timestamps
 import serial.tools.list_ports  # To list available serial ports
 import numpy as np  # For handling numeric arrays
 import sys
 import signal
+import functools  # For caching the packet layout per channel count
+import json  # For the hardware detection cache
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed  # For probing all serial ports at once
+from ring_buffer import RingBuffer  # Preallocated plot history
+import status_events  # JSON status lines for app.py (--status-json)
 
 # Initialize global variables for tracking and processing data
 total_packet_count = 0  # Total packets received in the last second
@@ -45,27 +54,32 @@ cumulative_packet_count = 0  # Total packets received in the last 10 minutes
 start_time = None  # Track the start time for packet counting
 last_ten_minute_time = None  # Track the last 10-minute interval
 previous_sample_number = None  # Store the previous sample number for detecting missing samples
+previous_unrolled_counter = None  # Last unrolled (non-wrapping) counter value, used for timestamps
 missing_samples = 0  # Count of missing samples due to packet loss
 buffer = bytearray()  # Buffer for storing incoming raw data from Arduino
 samples_per_second = 0  # Number of samples received per second
-retry_limit = 4
+decode_time = 0.0  # Seconds spent decoding packets in the last second
+decode_max_time = 0.0  # Longest single decode in the last second
+PROBE_TIMEOUT = 0.2  # Seconds to wait for the reply to one WHORU probe
+BAUDRATES = [230400, 115200]  # Baudrates tried during detection
+HARDWARE_CACHE = os.path.join(os.path.expanduser("~"), ".chords_hardware.json")  # Last detected port, baudrate and board
 
 # Initialize gloabal variables for Arduino Board
 board = ""          # Variable for Connected Arduino Board
 supported_boards = {
-    "UNO-R3": {"sampling_rate": 250, "Num_channels": 6},
-    "UNO-CLONE": {"sampling_rate": 250, "Num_channels": 6},
-    "GENUINO-UNO": {"sampling_rate": 250, "Num_channels": 6}, 
-    "UNO-R4": {"sampling_rate": 500, "Num_channels": 6},
-    "RPI-PICO-RP2040": {"sampling_rate": 500, "Num_channels": 3},
-    "NANO-CLONE": {"sampling_rate": 250, "Num_channels": 8},
-    "NANO-CLASSIC": {"sampling_rate": 250, "Num_channels": 8},
-    "STM32F4-BLACK-PILL": {"sampling_rate": 500, "Num_channels": 8},
-    "STM32G4-CORE-BOARD": {"sampling_rate": 500, "Num_channels": 16},
-    "MEGA-2560-R3": {"sampling_rate": 250, "Num_channels": 16},
-    "MEGA-2560-CLONE": {"sampling_rate": 250, "Num_channels": 16},
-    "GIGA-R1": {"sampling_rate": 500, "Num_channels": 6},
-    "NPG-LITE": {"sampling_rate": 500, "Num_channels": 3},
+    "UNO-R3": {"sampling_rate": 250, "Num_channels": 6, "resolution": 10},
+    "UNO-CLONE": {"sampling_rate": 250, "Num_channels": 6, "resolution": 10},
+    "GENUINO-UNO": {"sampling_rate": 250, "Num_channels": 6, "resolution": 10},
+    "UNO-R4": {"sampling_rate": 500, "Num_channels": 6, "resolution": 14},
+    "RPI-PICO-RP2040": {"sampling_rate": 500, "Num_channels": 3, "resolution": 12},
+    "NANO-CLONE": {"sampling_rate": 250, "Num_channels": 8, "resolution": 10},
+    "NANO-CLASSIC": {"sampling_rate": 250, "Num_channels": 8, "resolution": 10},
+    "STM32F4-BLACK-PILL": {"sampling_rate": 500, "Num_channels": 8, "resolution": 12},
+    "STM32G4-CORE-BOARD": {"sampling_rate": 500, "Num_channels": 16, "resolution": 12},
+    "MEGA-2560-R3": {"sampling_rate": 250, "Num_channels": 16, "resolution": 10},
+    "MEGA-2560-CLONE": {"sampling_rate": 250, "Num_channels": 16, "resolution": 10},
+    "GIGA-R1": {"sampling_rate": 500, "Num_channels": 6, "resolution": 16},
+    "NPG-LITE": {"sampling_rate": 500, "Num_channels": 3, "resolution": 12},
 }
 
 # Initialize gloabal variables for Incoming Data
@@ -74,56 +88,148 @@ SYNC_BYTE2 = 0x7c  # Second byte of sync marker
 END_BYTE = 0x01  # End byte marker
 HEADER_LENGTH = 3   #Length of the Packet Header
 
+# Packets come in one of two layouts, chosen per session from the first packets after START:
+#   fixed:            sync1 sync2 counter | channels (big-endian uint16) | END_BYTE
+#   self-describing:  sync1 sync2 counter info | channels (big-endian uint16)
+# where the info byte holds (channels - 1) in its high nibble and (ADC resolution - 10) in its low nibble.
+# The fixed layout takes channel count and resolution from supported_boards.
+LAYOUT_CHECK_PACKETS = 8  # Consecutive packets that must agree with a layout before it is used
+
 ## Initialize gloabal variables for Output
 lsl_outlet = None  # Placeholder for LSL stream outlet
 verbose = False  # Flag for verbose output mode
-csv_filename = None  # Store CSV filename
-csv_file = None
+recording_filename = None  # Store recording filename
+recorder = None  # CSV or binary recorder
+sample_writer = None  # Background writer feeding the recorder and LSL outlet
+sample_clock = None  # Reconstructs LSL timestamps from the packet counter
 ser = None
 packet_length = None
 num_channels = None
+data = None  # Ring buffer of recent samples for plotting
+packet_info = None  # Info byte of self-describing packets, None for the fixed layout
+adc_resolution = None  # ADC bits of this session
+mid_value = None  # Mid point of the ADC range, used to invert the signal
 
-def connect_hardware(port, baudrate, timeout=1):
+def load_hardware_cache():
+    """Return the last detected {"port", "baudrate", "board"}, or None."""
     try:
-        ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)  # Try opening the port
-        response = None
-        retry_counter = 0
-        while response not in supported_boards and retry_counter < retry_limit:
-            ser.write(b'WHORU\n') # Check board type
-            try:
-                response = ser.readline().strip().decode()  # Attempt to decode the response
-            except UnicodeDecodeError as e:
-                print(f"Decode error: {e}. Ignoring this response.")
-                response = None
-            retry_counter += 1
-            if response in supported_boards:  # If response is received, assume it's the Arduino
-                global board, sampling_rate, data, num_channels, packet_length
-                board = response # Set board type
-                print(f"{response} detected at {port} with baudrate {baudrate}.")  # Notify the user
-                sampling_rate = supported_boards[board]["sampling_rate"]
-                num_channels = supported_boards[board]["Num_channels"]
-                packet_length = (2 * num_channels) + HEADER_LENGTH + 1
-                data = np.zeros((num_channels, 2000))  # 2D array to store data for real-time plotting (num_channels, 2000 data points)
-                if ser is not None:
-                    return ser  # Return the port name
-        ser.close()  # Close the port if no response
+        with open(HARDWARE_CACHE) as f:
+            cached = json.load(f)
+        return cached if {"port", "baudrate", "board"} <= cached.keys() else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def save_hardware_cache(port, baudrate):
+    try:
+        with open(HARDWARE_CACHE, 'w') as f:
+            json.dump({"port": port, "baudrate": baudrate, "board": board}, f)
+    except OSError as e:
+        print(f"Unable to save hardware cache: {e}")
+
+def probe_port(port, baudrate, deadline=2, stop_event=None):
+    """Open a port and send WHORU probes until a supported board answers or `deadline` seconds pass.
+
+    Probes are repeated every PROBE_TIMEOUT seconds, so boards that reset when the port is opened
+    are found as soon as they have booted. Returns (open serial port, board) or (None, None).
+    """
+    try:
+        ser = serial.Serial(port, baudrate=baudrate, timeout=PROBE_TIMEOUT)  # Try opening the port
     except (OSError, serial.SerialException):  # Handle exceptions if the port can't be opened
+        return None, None
+    try:
+        pending = b""  # Partial reply line
+        end_time = time.time() + deadline
+        while time.time() < end_time and not (stop_event and stop_event.is_set()):
+            if not pending:
+                ser.write(b'WHORU\n')  # Check board type
+            pending += ser.readline()
+            if not pending.endswith(b'\n') and len(pending) < 64:
+                continue  # No reply yet, or the rest of the line is still coming
+            try:
+                response = pending.strip().decode()  # Attempt to decode the response
+            except UnicodeDecodeError:
+                response = None  # Wrong baudrate or another device, ignore
+            pending = b""
+            if response in supported_boards:
+                return ser, response
+    except (OSError, serial.SerialException):
         pass
-    print(f"Unable to connect to any hardware at baudrate {baudrate}")  # Notify if no Arduino is found
+    ser.close()  # Close the port if no response
+    return None, None
+
+def use_board(response, port, baudrate):
+    """Set up the globals for a detected board and remember it for the next start."""
+    global board, sampling_rate
+    board = response # Set board type
+    print(f"{response} detected at {port} with baudrate {baudrate}.")  # Notify the user
+    status_events.emit("connected", board=response, port=port, baudrate=baudrate)
+    sampling_rate = supported_boards[board]["sampling_rate"]
+    set_session_layout(supported_boards[board]["Num_channels"], supported_boards[board]["resolution"])  # Until the packets say otherwise
+    save_hardware_cache(port, baudrate)
+
+def connect_hardware(port, baudrate=None, timeout=2):
+    cached = load_hardware_cache()
+    if baudrate:
+        baudrates = [baudrate]
+    elif cached and cached["port"] == port:
+        baudrates = sorted(BAUDRATES, key=lambda rate: rate != cached["baudrate"])  # Last working baudrate first
+    else:
+        baudrates = BAUDRATES
+    for baud_rate in baudrates:
+        ser, response = probe_port(port, baud_rate, timeout)
+        if ser is not None:
+            use_board(response, port, baud_rate)
+            return ser
+        print(f"Unable to connect to any hardware at baudrate {baud_rate}")  # Notify if no Arduino is found
     return None  # Return None if not found
 
-def detect_hardware(baudrate=None, timeout=1):
-    ports = serial.tools.list_ports.comports()  # List available serial ports
-    ser = None
-    baudrates = [baudrate] if baudrate else [230400, 115200]
-    for port in ports:  # Iterate through each port
-        for baud_rate in baudrates:  # Iterate through all baud rates
-            print(f"Trying {port.device} at Baudrate {baud_rate}...")
-            ser = connect_hardware(port.device, baud_rate, timeout)
+def detect_hardware(baudrate=None, timeout=2):
+    """Find the board on any serial port.
+
+    The port and baudrate of the last detected board are tried first. Otherwise all ports are
+    probed at the same time, each trying its baudrates in turn; the first board found is used.
+    """
+    ports = [port.device for port in serial.tools.list_ports.comports()]  # List available serial ports
+    baudrates = [baudrate] if baudrate else BAUDRATES
+    cached = load_hardware_cache()
+    tried = None
+    if cached and cached["port"] in ports and cached["baudrate"] in baudrates:
+        print(f"Trying last used port {cached['port']} at Baudrate {cached['baudrate']}...")
+        ser, response = probe_port(cached["port"], cached["baudrate"], timeout)
+        if ser is not None:
+            use_board(response, cached["port"], cached["baudrate"])
+            return ser
+        tried = (cached["port"], cached["baudrate"])
+
+    stop_event = threading.Event()  # Set once a board is found, ends the other probes
+    def scan(port):
+        for baud_rate in baudrates:
+            if (port, baud_rate) == tried or stop_event.is_set():
+                continue
+            print(f"Trying {port} at Baudrate {baud_rate}...")
+            ser, response = probe_port(port, baud_rate, timeout, stop_event)
             if ser is not None:
-                return ser
-    print("Unable to detect hardware!")  # Notify if no Arduino is found
-    return None  # Return None if not found
+                return ser, response, port, baud_rate
+        return None
+
+    found = None
+    if ports:
+        with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+            for future in as_completed([pool.submit(scan, port) for port in ports]):
+                result = future.result()
+                if result is None:
+                    continue
+                if found is None:
+                    found = result
+                    stop_event.set()
+                else:
+                    result[0].close()  # Another board answered too, keep the first one
+    if found is None:
+        print("Unable to detect hardware!")  # Notify if no Arduino is found
+        return None  # Return None if not found
+    ser, response, port, baud_rate = found
+    use_board(response, port, baud_rate)
+    return ser
 
 def send_command(ser, command):
     ser.flushInput()   # Clear the input buffer
@@ -133,73 +239,192 @@ def send_command(ser, command):
     response = ser.readline().decode('utf-8', errors='ignore').strip()  # Read response
     return response
 
+# Build the structured dtype describing one packet: sync bytes, counter, channel data (big-endian) and end byte,
+# or for self-describing packets sync bytes, counter, info byte and channel data
+@functools.lru_cache(maxsize=None)
+def packet_dtype(num_channels, self_describing=False):
+    if self_describing:
+        return np.dtype([('sync', 'u1', (2,)), ('counter', 'u1'), ('marker', 'u1'), ('channels', '>u2', (num_channels,))])
+    return np.dtype([('sync', 'u1', (2,)), ('counter', 'u1'), ('channels', '>u2', (num_channels,)), ('marker', 'u1')])
+
+def decode_info_byte(info):
+    """Channel count (high nibble + 1) and ADC resolution (low nibble + 10) of a self-describing packet."""
+    return ((info >> 4) & 0x0F) + 1, (info & 0x0F) + 10
+
+def encode_info_byte(num_channels, resolution):
+    return ((num_channels - 1) << 4) | (resolution - 10)
+
+def set_session_layout(channels, resolution, info=None):
+    """Set the packet layout, ADC range and plot buffer of the session."""
+    global num_channels, adc_resolution, mid_value, packet_info, packet_length, data
+    if channels != num_channels or data is None:
+        data = RingBuffer(2000, channels)  # Ring buffer to store data for real-time plotting (num_channels, 2000 data points)
+    num_channels = channels
+    adc_resolution = resolution
+    mid_value = ((2 ** resolution) - 1) / 2  # Inverted values stay within 0 .. 2**resolution - 1
+    packet_info = info
+    packet_length = packet_dtype(channels, info is not None).itemsize
+
+def layout_matches(raw, start, channels, self_describing, marker):
+    """True if LAYOUT_CHECK_PACKETS packets of the given layout follow each other from `start`."""
+    length = packet_dtype(channels, self_describing).itemsize
+    marker_offset = 3 if self_describing else length - 1
+    for index in range(LAYOUT_CHECK_PACKETS):
+        position = start + index * length
+        if position + length > len(raw):
+            return False
+        if raw[position] != SYNC_BYTE1 or raw[position + 1] != SYNC_BYTE2 or raw[position + marker_offset] != marker:
+            return False
+    return True
+
+def resolve_session_layout(buffer):
+    """Work out the packet layout from the first packets of the session.
+
+    The fixed layout of the detected board is checked first: its end byte is the same in every packet,
+    which data bytes of self-describing packets almost never are. Returns True once the layout is known,
+    False while more data is needed.
+    """
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    for start in np.flatnonzero((raw[:-1] == SYNC_BYTE1) & (raw[1:] == SYNC_BYTE2)):
+        if start + 4 > len(raw):
+            break
+        if board in supported_boards and layout_matches(raw, start, supported_boards[board]["Num_channels"], False, END_BYTE):
+            set_session_layout(supported_boards[board]["Num_channels"], supported_boards[board]["resolution"])
+            return True
+        channels, resolution = decode_info_byte(int(raw[start + 3]))
+        if layout_matches(raw, start, channels, True, raw[start + 3]):
+            set_session_layout(channels, resolution, int(raw[start + 3]))
+            print(f"Self-describing packets: {channels} channels, {resolution}-bit ADC")
+            return True
+    return False
+
+def start_session(ser, timeout=3):
+    """Send START and read until the packet layout of the session is known.
+
+    The bytes read stay in the buffer for decoding. If no layout can be confirmed within `timeout`
+    seconds the fixed layout of the detected board is used.
+    """
+    send_command(ser, 'START')
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        raw_data = ser.read(ser.in_waiting or 1)
+        if raw_data == b'':
+            send_command(ser, 'START')
+            continue
+        buffer.extend(raw_data)
+        if resolve_session_layout(buffer):
+            return
+    print(f"Unable to confirm the packet layout, using the {board} defaults")
+
+# Function to locate and decode every complete packet in the buffer in one pass
+def decode_packets(buffer, num_channels, inverted=False, mid_value=0, info=None):
+    """Decode all valid packets in `buffer`.
+
+    `info` is the info byte of self-describing packets, None for the fixed layout with an end byte.
+    Returns the counters as a (n_samples,) array, the channel values as a (n_samples, num_channels)
+    float array and the number of leading bytes of `buffer` that have been consumed.
+    """
+    dtype = packet_dtype(num_channels, info is not None)
+    length = dtype.itemsize
+    marker = END_BYTE if info is None else info  # End byte, or the info byte repeated in every packet
+    marker_offset = dtype.fields['marker'][1]
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    size = len(raw)
+    last_start = size - length + 1  # Last position at which a complete packet can begin
+
+    # Every position where sync bytes are followed by the marker byte at its place in the packet
+    if last_start > 0:
+        candidates = (raw[:last_start] == SYNC_BYTE1) & (raw[1:last_start + 1] == SYNC_BYTE2) & (raw[marker_offset:marker_offset + last_start] == marker)
+        valid_starts = np.flatnonzero(candidates)
+    else:
+        valid_starts = np.empty(0, dtype=np.intp)
+
+    # Walk runs of back-to-back packets; a healthy stream is a single run
+    blocks = []
+    position = 0
+    while True:
+        next_index = np.searchsorted(valid_starts, position)
+        if next_index == len(valid_starts):
+            break
+        start = int(valid_starts[next_index])
+        packets = np.frombuffer(buffer, dtype=dtype, count=(size - start) // length, offset=start)
+        valid = (packets['sync'][:, 0] == SYNC_BYTE1) & (packets['sync'][:, 1] == SYNC_BYTE2) & (packets['marker'] == marker)
+        run = len(valid) if valid.all() else int(np.argmin(valid))
+        blocks.append(packets[:run])
+        position = start + run * length
+
+    # Keep an incomplete trailing packet (or a split sync marker) for the next read, drop everything else
+    pending = np.flatnonzero((raw[position:-1] == SYNC_BYTE1) & (raw[position + 1:] == SYNC_BYTE2))
+    if len(pending):
+        consumed = position + int(pending[0])
+    elif size > position and raw[-1] == SYNC_BYTE1:
+        consumed = size - 1
+    else:
+        consumed = size
+
+    if not blocks:
+        return np.empty(0, dtype=np.uint8), np.empty((0, num_channels)), consumed
+
+    packets = np.concatenate(blocks)
+    counters = packets['counter'].copy()
+    samples = packets['channels'].astype(np.float64)
+    if inverted:  # Mirror every value around the mid point of the ADC range
+        samples = (2 * mid_value) - samples
+    return counters, samples, consumed
+
+# Function to account for missing samples using the packet counters of a decoded block
+def track_missing_samples(counters):
+    global previous_sample_number, missing_samples
+    if len(counters) == 0:
+        return
+    previous = counters[0] if previous_sample_number is None else previous_sample_number
+    steps = np.diff(counters.astype(np.int16), prepend=np.int16(previous))
+    gaps = (steps - 1) % 256  # Samples lost before each packet
+    if previous_sample_number is None:
+        gaps[0] = 0
+    for index in np.flatnonzero(gaps):  # Only runs when packets were actually lost
+        missing_samples += int(gaps[index])
+        if verbose:
+            expected = (int(counters[index]) - int(gaps[index])) % 256
+            print(f"Error: Expected counter {expected} but received {counters[index]}. Missing samples: {missing_samples}")
+    previous_sample_number = int(counters[-1])  # Update the previous sample number
+
 # Function to read data from Arduino
-def read_arduino_data(ser, csv_writer=None, inverted=False):
-    global total_packet_count, cumulative_packet_count, previous_sample_number, missing_samples, buffer, data
+def read_arduino_data(ser, writer=None, inverted=False):
+    global total_packet_count, cumulative_packet_count, buffer, previous_unrolled_counter, decode_time, decode_max_time
 
-    max_value = 2*10 if board == "UNO-R3" else 2*14
-    min_value = 0
-    mid_value = (max_value - 1) / 2
-    
     raw_data = ser.read(ser.in_waiting or 1)  # Read available data from the serial port
+    arrival_time = local_clock()  # Time at which the newest packet arrived
     if raw_data == b'':
         send_command(ser, 'START')
     buffer.extend(raw_data)  # Add received data to the buffer
-    while len(buffer) >= packet_length:  # Continue processing if the buffer contains at least one full packet
-        sync_index = buffer.find(bytes([SYNC_BYTE1, SYNC_BYTE2]))  # Search for the sync marker
+    if len(buffer) < packet_length:  # Wait until the buffer contains at least one full packet
+        return
 
-        if sync_index == -1:  # If sync marker not found, clear the buffer
-            buffer.clear()
-            continue
-        
-        if len(buffer) >= sync_index + packet_length:  # Check if a full packet is available
-            packet = buffer[sync_index:sync_index + packet_length]  # Extract the packet
-            if len(packet) == packet_length and packet[0] == SYNC_BYTE1 and packet[1] == SYNC_BYTE2 and packet[-1] == END_BYTE:
-                if(start_time is None):
-                    start_timer()  # Start timers for logging
-
-                # Extract the packet if it is valid (correct length, sync bytes, and end byte)
-                counter = packet[2]  # Read the counter byte (for tracking sample order)
-
-                # Check for missing samples by comparing the counter values
-                if previous_sample_number is not None and counter != (previous_sample_number + 1) % 256:
-                    missing_samples += (counter - previous_sample_number - 1) % 256  # Calculate missing samples
-                    if verbose:
-                        print(f"Error: Expected counter {previous_sample_number + 1} but received {counter}. Missing samples: {missing_samples}")
-
-                previous_sample_number = counter  # Update the previous sample number
-                total_packet_count += 1  # Increment total packet count for the current second
-                cumulative_packet_count += 1  # Increment cumulative packet count for the last 10 minutes
-
-                # Extract channel data (num_channels, 2 bytes per channel)
-                channel_data = []
-                for channel in range(num_channels):  # Loop through channel data bytes
-                    high_byte = packet[2*channel + HEADER_LENGTH]
-                    low_byte = packet[2*channel + HEADER_LENGTH + 1]
-                    value = (high_byte << 8) | low_byte  # Combine high and low bytes
-                    if inverted:  # Apply inversion if the flag is set
-                        if value > mid_value:
-                            inverted_data = (mid_value) - abs(mid_value - value)
-                        elif value < mid_value:
-                            inverted_data = (mid_value) + abs(mid_value - value)
-                        else:
-                            inverted_data = value
-                        channel_data.append(float(inverted_data))  # Append the inverted value
-                    else:
-                        channel_data.append(float(value))  # Convert to float and add to channel data
-
-                if csv_writer:  # If CSV logging is enabled, write the data to the CSV file
-                    csv_writer.writerow([counter] + channel_data)
-                if lsl_outlet:  # If LSL streaming is enabled, send the data to the LSL stream
-                    lsl_outlet.push_sample(channel_data)
-
-                # Update the data array for real-time plotting
-                data = np.roll(data, -1, axis=1)  # Shift data to the left
-                data[:, -1] = channel_data  # Add new channel data to the right end of the array
-
-                del buffer[:sync_index + packet_length]  # Remove the processed packet from the buffer
-            else:
-                del buffer[:sync_index + 1]  # If the packet is invalid, remove only the sync marker
+    decode_start = time.perf_counter()
+    counters, samples, consumed = decode_packets(buffer, num_channels, inverted=inverted, mid_value=mid_value, info=packet_info)
+    elapsed = time.perf_counter() - decode_start
+    decode_time += elapsed
+    decode_max_time = max(decode_max_time, elapsed)
+    del buffer[:consumed]  # Remove the processed packets from the buffer
+    if len(counters) == 0:
+        return
+
+    if(start_time is None):
+        start_timer()  # Start timers for logging
+
+    track_missing_samples(counters)  # Check for missing samples by comparing the counter values
+    total_packet_count += len(counters)  # Increment total packet count for the current second
+    cumulative_packet_count += len(counters)  # Increment cumulative packet count for the last 10 minutes
+
+    unrolled = unroll_counters(counters, previous_unrolled_counter)  # Sample index that does not wrap at 256
+    previous_unrolled_counter = int(unrolled[-1])
+    timestamps = sample_clock.timestamps(unrolled, arrival_time) if sample_clock else None
+
+    if writer:  # Hand the block to the writer thread for recording and LSL streaming
+        writer.submit(counters, samples, timestamps)
+
+    data.extend(samples)  # Update the ring buffer for real-time plotting
 
 # Function to start timers for logging data
 def start_timer():
@@ -212,11 +437,17 @@ def start_timer():
 
 # Function to log data every second
 def log_one_second_data(verbose=False):
-    global total_packet_count, samples_per_second
+    global total_packet_count, samples_per_second, decode_time, decode_max_time
     samples_per_second = total_packet_count  # Update the samples per second
+    status_events.emit("stats", samples=total_packet_count, missing=missing_samples, dropped=sample_writer.dropped_samples if sample_writer else 0,
+                       queue_depth=sample_writer.queue_depth if sample_writer else 0, decode_ms=decode_time * 1000, decode_max_ms=decode_max_time * 1000,
+                       drift=sample_clock.drift if sample_clock else None)
     if verbose:
         print(f"Data count for the last second: {total_packet_count} samples, Missing samples: {missing_samples}")  # Print verbose output
+        if sample_writer and sample_writer.dropped_samples:
+            print(f"Writer queue depth: {sample_writer.queue_depth}, Dropped samples: {sample_writer.dropped_samples}")  # Output could not keep up
     total_packet_count = 0  # Reset total packet count for the next second
+    decode_time = decode_max_time = 0.0
 
 # Function to log data for 10-minute intervals
 def log_ten_minute_data(verbose=False):
@@ -232,36 +463,37 @@ def log_ten_minute_data(verbose=False):
     last_ten_minute_time = time.time()  # Update the last 10-minute interval start time
 
 # Main function to parse command-line arguments and handle data acquisition
-def parse_data(ser, lsl_flag=False, csv_flag=False, verbose=False, run_time=None, inverted= False):
-    global total_packet_count, cumulative_packet_count, start_time, lsl_outlet, last_ten_minute_time, csv_filename
+def parse_data(ser, lsl_flag=False, csv_flag=False, verbose=False, run_time=None, inverted= False, record_format="csv"):
+    global total_packet_count, cumulative_packet_count, start_time, lsl_outlet, last_ten_minute_time, recording_filename, recorder, sample_writer, sample_clock
 
-    csv_writer = None  # Placeholder for CSV writer
-    csv_file = None
+    start_session(ser)  # Channel count and resolution are known before the outputs are created
 
     # Start LSL streaming if requested
     if lsl_flag:
         lsl_stream_info = StreamInfo('BioAmpDataStream', 'EXG', num_channels, supported_boards[board]["sampling_rate"], 'float32', 'UpsideDownLabs')  # Define LSL stream info
         lsl_outlet = StreamOutlet(lsl_stream_info)  # Create LSL outlet
+        sample_clock = SampleClock(supported_boards[board]["sampling_rate"])  # Timestamps from the counter and the nominal rate
         print("LSL stream started")  # Notify user
+        status_events.emit("streaming", stream="BioAmpDataStream", sampling_rate=supported_boards[board]["sampling_rate"], num_channels=num_channels, resolution=adc_resolution)
     
     if csv_flag:
-        csv_filename = f"ChordsPy-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv"  # Create timestamped filename
-        print(f"CSV recording started. Data will be saved to {csv_filename}")  # Notify user
+        extension = "bin" if record_format == "binary" else "csv"
+        recording_filename = f"ChordsPy-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"  # Create timestamped filename
+        print(f"{record_format.upper()} recording started. Data will be saved to {recording_filename}")  # Notify user
 
     try:
-        csv_file = open(csv_filename, mode='w', newline='') if csv_flag else None  # Open CSV file if logging is
-        if csv_file:
-            csv_writer = csv.writer(csv_file)  # Create CSV writer
-            csv_writer.writerow([f"Arduino Board: {board}"])
-            csv_writer.writerow([f"Sampling Rate (samples per second): {supported_boards[board]['sampling_rate']}"])
-            csv_writer.writerow([])  # Blank row for separation
-            csv_writer.writerow(['Counter'] + [f'Channel{i+1}' for i in range(num_channels)])  # Write header
+        if csv_flag:  # Open the recording file if logging is enabled
+            channel_dtype = "uint16"  # Inverted values are mirrored inside the ADC range
+            recorder = open_recorder(record_format, recording_filename, board, supported_boards[board]["sampling_rate"], num_channels, channel_dtype=channel_dtype)
+
+        # Recording and LSL output run on their own thread so the serial port is never blocked by I/O
+        sample_writer = SampleWriter(recorder=recorder, outlet=lsl_outlet)
+        sample_writer.start()
 
         end_time = time.time() + run_time if run_time else None
-        send_command(ser, 'START')
 
         while True:
-            read_arduino_data(ser, csv_writer, inverted=inverted)  # Read and process data from Arduino
+            read_arduino_data(ser, sample_writer, inverted=inverted)  # Read and process data from Arduino
             if(start_time is not None):
                 current_time = time.time()   # Get the current time
                 elapsed_time = current_time - start_time   # Time elapsed since the last second
@@ -289,7 +521,7 @@ def parse_data(ser, lsl_flag=False, csv_flag=False, verbose=False, run_time=None
     sys.exit(0)
 
 def cleanup():
-    global ser, lsl_outlet, csv_file
+    global ser, lsl_outlet, recorder, sample_writer
 
     # Close the serial connection first
     try:
@@ -304,6 +536,17 @@ def cleanup():
             print("Serial connection is not open.")
     except Exception as e:
         print(f"Error while closing serial connection: {e}")
+        status_events.emit("interrupted", message=f"Error while closing serial connection: {e}")
+
+    # Write out any queued samples before closing the outputs
+    try:
+        if sample_writer:
+            sample_writer.stop()
+            if sample_writer.dropped_samples:
+                print(f"Samples dropped by the writer queue: {sample_writer.dropped_samples}")
+            sample_writer = None
+    except Exception as e:
+        print(f"Error while stopping the sample writer: {e}")
 
     # Close the LSL stream if it exists
     try:
@@ -313,16 +556,18 @@ def cleanup():
     except Exception as e:
         print(f"Error while closing LSL stream: {e}")
 
-    # Close the CSV file if it exists
+    # Close the recording file if it exists
     try:
-        if csv_file:
-            csv_file.close()  # Close the CSV file
-            print("CSV recording saved.")
+        if recorder:
+            recorder.close()  # Close the recording file
+            recorder = None
+            print(f"Recording saved to {recording_filename}.")
     except Exception as e:
-        print(f"Error while closing CSV file: {e}")
+        print(f"Error while closing recording file: {e}")
 
     print("Cleanup completed, exiting program.")
     print(f"Total missing samples: {missing_samples}")
+    status_events.emit("stopped", missing=missing_samples)
     sys.exit(0)
 
 def signal_handler(sig, frame):
@@ -335,19 +580,24 @@ def main():
     parser.add_argument('-p', '--port', type=str, help="Specify the COM port")  # Port argument
     parser.add_argument('-b', '--baudrate', type=int, help="Set baud rate for the serial communication")  # Baud rate 
     parser.add_argument('--csv', action='store_true', help="Create and write to a CSV file")  # CSV logging flag
+    parser.add_argument('--record-format', choices=['csv', 'binary'], help="Recording format; 'binary' writes a compact file readable with recording.py (implies recording)")  # Recording format
     parser.add_argument('--lsl', action='store_true', help="Start LSL stream")  # LSL streaming flag
     parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose output with statistical data")  # Verbose flag
     parser.add_argument('-t', '--time', type=int, help="Run the program for a specified number of seconds and then exit")   #set time
     parser.add_argument('--inverted', action='store_true', help="Invert the signal before streaming LSL and logging")  # Inverted flag
+    parser.add_argument('--status-json', action='store_true', help="Also print status events as JSON lines (used by app.py)")  # Machine-readable status
 
     args = parser.parse_args()  # Parse command-line arguments
     verbose = args.verbose  # Set verbose mode
+    if args.status_json:
+        status_events.enable()
 
     # Register the signal handler to handle Ctrl+C
     signal.signal(signal.SIGINT, signal_handler)
 
     # Check if any logging or GUI options are selected, else show help
-    if not args.csv and not args.lsl:
+    record = args.csv or args.record_format is not None  # Choosing a format also enables recording
+    if not record and not args.lsl:
         parser.print_help()  # Print help if no options are selected
         return
 
@@ -358,13 +608,15 @@ def main():
         ser = detect_hardware(baudrate=args.baudrate)
         if ser is None:
             sys.stderr.write("Serial Connection not established properly.Try Again\n")
+            status_events.emit("error", message="Serial Connection not established properly. Try Again")
             sys.exit(1)  # Exit with a non-zero code to indicate failure
     if ser is None:
         print("Arduino port not specified or detected. Exiting.")  # Notify if no port is available
+        status_events.emit("error", message=f"Unable to connect to hardware on {args.port}")
         return
 
     # Start data acquisition
-    parse_data(ser, lsl_flag=args.lsl, csv_flag=args.csv, verbose=args.verbose, run_time=args.time, inverted=args.inverted)
+    parse_data(ser, lsl_flag=args.lsl, csv_flag=record, verbose=args.verbose, run_time=args.time, inverted=args.inverted, record_format=args.record_format or "csv")
 
 # Run the main function if this script is executed
 if __name__ == "__main__":
@@ -1,14 +1,21 @@
 import tkinter as tk 
 from tkinter import filedialog, messagebox, ttk
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
+import os
+import subprocess
+import sys
+from recording import BinaryRecording, read_csv_header
 
 class CSVPlotterApp:
     def __init__(self, root):                 # Initialize the main application window
         self.root = root
         self.root.title("CSV Plotter GUI")
         self.filename = None                  # Variable to store the selected CSV file name
-        self.data = None                      # Variable to store the loaded data
+        self.data = None                      # BinaryRecording, or None for a CSV file (read one column at a time)
+        self.columns = []                     # Column names of the loaded data
+        self.header_index = None              # Line of the CSV column header
         self.create_widgets()                 # Call the method to create widgets
 
     def create_widgets(self):
@@ -40,47 +47,47 @@ class CSVPlotterApp:
         self.plot_button = tk.Button(self.root, text="Plot Data", command=self.plot_data, bg='#2196F3', fg='white', font=('Arial', 12))
         self.plot_button.pack(pady=10)
 
+        # Button to open the zoomable viewer for long recordings
+        self.fast_view_button = tk.Button(self.root, text="Fast View (large files)", command=self.fast_view, bg='#FF9800', fg='white', font=('Arial', 12))
+        self.fast_view_button.pack(pady=10)
+
     def load_csv(self):
-        self.filename = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])   # Open file dialog to select CSV file
+        self.filename = filedialog.askopenfilename(filetypes=[("Recordings", "*.csv *.bin"), ("CSV files", "*.csv"), ("Binary recordings", "*.bin")])   # Open file dialog to select a recording
         if self.filename:
             try:
-                with open(self.filename, "r", encoding="utf-8") as f:                    # Open the selected CSV file
-                    lines = f.readlines()                                                # Read all lines into a list for header detection
-
-                header_index = None                                                      # Initialize the variable to track where (Header)'Counter' appears
-                for i, line in enumerate(lines):                                         # Iterate through lines to find the header line
-                    if "Counter" in line:
-                        header_index = i                                                 # Store the index of the line containing 'Counter'
-                        break                                                            # If found, break the loop
-
-                if header_index is None:                                                 # If no header row with 'Counter' was found, show error and exit
-                    messagebox.showerror("Error", "CSV file must contain a 'Counter' column.")
-                    return
-
-                # Now read CSV again, skipping metadata lines before the header
-                self.data = pd.read_csv(self.filename, skiprows=header_index, header=0)
-
-                # Ensure 'Counter' column is present
-                if 'Counter' not in self.data.columns:
-                    messagebox.showerror("Error", "CSV file must contain a 'Counter' column.")
-                    return
+                if self.filename.endswith(".bin"):
+                    self.data = BinaryRecording(self.filename)                           # Memory-mapped, nothing is read until plotted
+                    self.columns = [f'Channel{i+1}' for i in range(self.data.num_channels)]
+                else:
+                    try:
+                        _, _, self.columns, self.header_index = read_csv_header(self.filename)   # Only the header, channels are read when plotted
+                    except ValueError:                                                   # If no header row with 'Counter' was found, show error and exit
+                        messagebox.showerror("Error", "CSV file must contain a 'Counter' column.")
+                        return
+                    self.data = None
 
                 # Setup dropdown based on available channels
                 self.setup_dropdown_menu()
                 self.file_label.config(text=f"File: {self.filename.split('/')[-1]}")
 
             except Exception as e:
-                messagebox.showerror("Error", f"Could not load CSV file: {e}")
+                messagebox.showerror("Error", f"Could not load file: {e}")
 
     def setup_dropdown_menu(self):
         # Get available channel columns
-        channel_columns = [col for col in self.data.columns if 'Channel' in col]
+        channel_columns = [col for col in self.columns if 'Channel' in col]
 
         # Populate dropdown menu with available channels
         self.dropdown_menu['values'] = channel_columns
         if channel_columns:
             self.channel_selection.set(channel_columns[0])  # Default selection to the first channel
 
+    def channel_values(self, channel_name):
+        """Return the samples of a channel from either a CSV or a binary recording."""
+        if isinstance(self.data, BinaryRecording):
+            return self.data.channel(self.columns.index(channel_name))
+        return pd.read_csv(self.filename, skiprows=self.header_index + 1, names=self.columns, header=None, usecols=[channel_name])[channel_name]
+
     def plot_data(self):
         """Creates an interactive plot of the selected data channel using Plotly."""
         selected_channel = self.channel_selection.get()   # Get the selected channel
@@ -89,7 +96,8 @@ class CSVPlotterApp:
             return
 
         fig = go.Figure()  # Plot the selected channel using Plotly
-        fig.add_trace(go.Scatter(x=self.data.index, y=self.data[selected_channel], mode='lines', name=selected_channel))
+        values = self.channel_values(selected_channel)
+        fig.add_trace(go.Scatter(x=np.arange(len(values)), y=values, mode='lines', name=selected_channel))
         
         fig.update_layout(
             title=f"Channel: {selected_channel}",
@@ -99,6 +107,15 @@ class CSVPlotterApp:
         )
         fig.show()               # Display the plot in a new window
 
+    def fast_view(self):
+        """Open the selected channel in the zoomable LOD viewer, which draws only what the zoom level needs."""
+        selected_channel = self.channel_selection.get()
+        if not self.filename or not selected_channel:
+            messagebox.showerror("Error", "Load a file and select a channel first")
+            return
+        # The viewer builds <file>.lod on first use (this may take a while for long recordings) and reuses it afterwards
+        subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lod_viewer.py"), self.filename, "--channel", selected_channel])
+
 if __name__ == "__main__":
     root = tk.Tk()               # Create the main Tkinter root window
     app = CSVPlotterApp(root)    # Create an instance of the CSVPlotterApp class
@@ -1,13 +1,19 @@
 import numpy as np
-from scipy.signal import butter, filtfilt
+from stream_filters import MovingRMS, highpass
+from stream_hub import connect_inlet, make_filter
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QMainWindow, QWidget
 from pyqtgraph import PlotWidget
 import pyqtgraph as pg
 import pylsl
 import sys
+import argparse
+from ring_buffer import RingBuffer
+from sample_writer import push_block
 
 class EMGMonitor(QMainWindow):
-    def __init__(self): 
+    def __init__(self, envelope_outlet=False, hub=None):
+        """envelope_outlet: also publish the RMS envelope as its own LSL stream
+        hub: StreamHub to receive chunks from instead of opening an inlet (see visualizer.py)"""
         super().__init__()
 
         self.setWindowTitle("Real-Time EMG Monitor with EMG Envelope")
@@ -38,41 +44,32 @@ class EMGMonitor(QMainWindow):
         central_widget.setLayout(layout)
         self.setCentralWidget(central_widget)
 
-        # Set up LSL stream inlet
-        print("Searching for available LSL streams...")
-        available_streams = pylsl.resolve_streams()
-
-        if not available_streams:
-            print("No LSL streams found! Exiting...")
-            sys.exit(0)
-
-        self.inlet = None
-        for stream in available_streams:
-            try:
-                self.inlet = pylsl.StreamInlet(stream)
-                print(f"Connected to LSL stream: {stream.name()}")
-                break
-            except Exception as e:
-                print(f"Failed to connect to {stream.name()}: {e}")
-
-        if self.inlet is None:
-            print("Unable to connect to any LSL stream! Exiting...")
-            sys.exit(0)
+        # Set up LSL stream inlet, or use the one shared by the visualizer host
+        self.hub = hub
+        self.inlet = hub.inlet if hub else connect_inlet()
 
         # Sampling rate
         self.sampling_rate = int(self.inlet.info().nominal_srate())
-        print(f"Sampling rate: {self.sampling_rate} Hz")
+        if hub is None:
+            print(f"Sampling rate: {self.sampling_rate} Hz")
         
         # Data and buffers
         self.buffer_size = self.sampling_rate * 10  # Fixed-size buffer for 10 seconds
-        self.emg_data = np.zeros(self.buffer_size)  # Fixed-size array for circular buffer
+        self.emg_data = RingBuffer(self.buffer_size)  # Fixed-size ring buffer of filtered EMG, read back in time order
+        self.envelope_data = RingBuffer(self.buffer_size)  # Preallocated ring of RMS envelope values
         self.time_data = np.linspace(0, 10, self.buffer_size)  # Fixed time array for plotting
-        self.current_index = 0  # Index for overwriting data
 
-        self.b, self.a = butter(4, 70.0 / (0.5 * self.sampling_rate), btype='high')
+        self.filter = make_filter(hub, highpass(70.0, self.sampling_rate, order=4))   # High-pass filter, applied to new samples only
 
         # Moving RMS window size (25 for 250 sampling rate and 50 for 500 sampling rate)
         self.rms_window_size = int(0.1 * self.sampling_rate)
+        self.envelope = MovingRMS(self.rms_window_size)   # Running sum of squares, updated per chunk
+
+        self.outlet = None
+        if envelope_outlet:   # Let other apps use the envelope without recomputing it
+            info = pylsl.StreamInfo("BioAmpEMGEnvelope", "EMGEnvelope", 1, self.sampling_rate, "float32", "emgenvelope")
+            self.outlet = pylsl.StreamOutlet(info)
+            print("Publishing the EMG envelope as LSL stream 'BioAmpEMGEnvelope'")
 
         # Set fixed axis ranges
         self.emg_plot.setXRange(0, 10, padding=0)
@@ -87,42 +84,43 @@ class EMGMonitor(QMainWindow):
             self.envelope_plot.setYRange(0, ((2**14)/2), padding=0)  # for R4
 
         # Plot curves for EMG data and envelope
-        self.emg_curve = self.emg_plot.plot(self.time_data, self.emg_data, pen=pg.mkPen('b', width=1))
-        self.envelope_curve = self.envelope_plot.plot(self.time_data, self.emg_data, pen=pg.mkPen('r', width=2))
+        self.emg_curve = self.emg_plot.plot(self.time_data, self.emg_data.view(), pen=pg.mkPen('b', width=1))
+        self.envelope_curve = self.envelope_plot.plot(self.time_data, self.envelope_data.view(), pen=pg.mkPen('r', width=2))
 
-        # Timer for plot update
-        self.timer = pg.QtCore.QTimer()
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(15)
-
-    def calculate_moving_rms(self, signal, window_size):
-        # Calculate RMS using a moving window
-        rms = np.sqrt(np.convolve(signal**2, np.ones(window_size) / window_size, mode='valid'))
-        return np.pad(rms, (len(signal) - len(rms), 0), 'constant')
+        # Timer for plot update, unless the hub drives process_chunk
+        if hub is None:
+            self.timer = pg.QtCore.QTimer()
+            self.timer.timeout.connect(self.update_plot)
+            self.timer.start(15)
+        else:
+            hub.add_view(self)
 
     def update_plot(self):
-        samples, _ = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
         if samples:
-            for sample in samples:
-                # Overwrite the oldest data point in the buffer
-                self.emg_data[self.current_index] = sample[0]
-                self.current_index = (self.current_index + 1) % self.buffer_size  # Circular increment
-
-            # Filter the EMG data
-            filtered_emg = filtfilt(self.b, self.a, self.emg_data)
+            self.process_chunk(np.asarray(samples), timestamps)
 
-            # Take absolute value before calculating RMS envelope
-            abs_filtered_emg = np.abs(filtered_emg)
+    def process_chunk(self, samples, timestamps):
+        # Filter the new EMG samples and overwrite the oldest data points in the buffer
+        filtered_chunk = self.filter.process(samples[:, 0])
+        self.emg_data.extend(filtered_chunk)
 
-            # Calculate the RMS envelope
-            rms_envelope = self.calculate_moving_rms(abs_filtered_emg, self.rms_window_size)
+        # Update the RMS envelope with the new samples only
+        envelope_chunk = self.envelope.process(filtered_chunk)
+        self.envelope_data.extend(envelope_chunk)
+        if self.outlet:
+            push_block(self.outlet, envelope_chunk[:, np.newaxis], timestamps)   # Same timestamps as the source samples
 
-            # Update curves
-            self.emg_curve.setData(self.time_data, filtered_emg)  # Plot filtered EMG in blue
-            self.envelope_curve.setData(self.time_data, rms_envelope)  # Plot EMG envelope in red
+        # Update curves
+        self.emg_curve.setData(self.time_data, self.emg_data.view())  # Plot filtered EMG in blue
+        self.envelope_curve.setData(self.time_data, self.envelope_data.view())  # Plot EMG envelope in red
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time EMG monitor with RMS envelope")
+    parser.add_argument("--lsl-envelope", action="store_true", help="Publish the RMS envelope as the LSL stream 'BioAmpEMGEnvelope'")
+    args = parser.parse_args()
+
     app = QApplication(sys.argv)
-    window = EMGMonitor()  
+    window = EMGMonitor(envelope_outlet=args.lsl_envelope)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -1,17 +1,21 @@
 import numpy as np
-from scipy.signal import butter, lfilter, lfilter_zi
-from PyQt5.QtWidgets import QApplication, QVBoxLayout, QMainWindow, QWidget, QHBoxLayout
+from stream_filters import lowpass
+from stream_hub import connect_inlet, make_filter
+from PyQt5.QtWidgets import QApplication, QVBoxLayout, QMainWindow, QWidget, QHBoxLayout, QLabel
 import pyqtgraph as pg
-import pylsl
 import sys
 import time
 from collections import deque
+from ring_buffer import RingBuffer
+from blink_detector import BlinkDetector
 
 class EOGMonitor(QMainWindow):
-    def __init__(self):
+    def __init__(self, hub=None):
+        """hub: StreamHub to receive chunks from instead of opening an inlet (see visualizer.py)"""
         super().__init__()
 
-        self.setWindowTitle("Real-Time EOG Monitor - Eye Blink Detection")
+        self.title = "Real-Time EOG Monitor - Eye Blink Detection"
+        self.setWindowTitle(self.title)
         self.setGeometry(100, 100, 800, 400)
 
         # Create layout
@@ -43,39 +47,27 @@ class EOGMonitor(QMainWindow):
         layout.addWidget(self.eog_plot)
         layout.addWidget(self.blink_plot)
 
-        # Set up LSL stream inlet
-        print("Searching for available LSL streams...")
-        available_streams = pylsl.resolve_streams()
+        # Processing time per chunk, inside the widget so it also shows as a visualizer tab
+        self.frame_label = QLabel("Frame time: -")
+        layout.addWidget(self.frame_label)
 
-        if not available_streams:
-            print("No LSL streams found! Exiting...")
-            sys.exit(0)
-
-        self.inlet = None
-        for stream in available_streams:
-            try:
-                self.inlet = pylsl.StreamInlet(stream)
-                print(f"Connected to LSL stream: {stream.name()}")
-                break
-            except Exception as e:
-                print(f"Failed to connect to {stream.name()}: {e}")
-
-        if self.inlet is None:
-            print("Unable to connect to any LSL stream! Exiting...")
-            sys.exit(0)
+        # Set up LSL stream inlet, or use the one shared by the visualizer host
+        self.hub = hub
+        self.inlet = hub.inlet if hub else connect_inlet()
 
         self.sampling_rate = int(self.inlet.info().nominal_srate())
-        print(f"Sampling rate: {self.sampling_rate} Hz")
+        if hub is None:
+            print(f"Sampling rate: {self.sampling_rate} Hz")
 
         self.buffer_size = self.sampling_rate * 5  # 5 seconds buffer for recent data
-        self.eog_data = np.zeros(self.buffer_size)
+        self.eog_data = RingBuffer(self.buffer_size)  # Ring buffer holding the last 5 seconds of filtered EOG
         self.time_data = np.linspace(0, 5, self.buffer_size)
         self.blink_data = np.zeros(self.buffer_size)  # Blink data array
-        self.current_index = 0
 
         # Low-pass filter for EOG (10 Hz)
-        self.b, self.a = butter(4, 10.0 / (0.5 * self.sampling_rate), btype='low')
-        self.zi = lfilter_zi(self.b, self.a)  # Initialize filter state
+        self.filter = make_filter(hub, lowpass(10.0, self.sampling_rate, order=4))   # Keeps its state between chunks
+        # Threshold of mean + 2 SD over ~5 s, peaks at least 0.1 s apart, 2 s calibration delay
+        self.detector = BlinkDetector(self.sampling_rate, threshold_sd=2.0, refractory_period=0.1, stats_window=5.0, warmup=2.0)
 
         self.eog_plot.setXRange(0, 5, padding=0)
         if self.sampling_rate == 250:  
@@ -83,95 +75,73 @@ class EOGMonitor(QMainWindow):
         elif self.sampling_rate == 500:  
             self.eog_plot.setYRange(0, 2**14,padding=0)  # for R4 & ensuring no extra spaces at end
 
-        # Plot curves
-        self.eog_curve = self.eog_plot.plot(self.time_data, self.eog_data, pen=pg.mkPen('b', width=1))
+        # Plot items, created once and updated in place with setData
+        self.eog_curve = self.eog_plot.plot(self.time_data, self.eog_data.view(), pen=pg.mkPen('b', width=1))
+        self.peak_scatter = pg.ScatterPlotItem(pen=pg.mkPen('r'), brush=None, symbol='o', size=6)
+        self.eog_plot.addItem(self.peak_scatter)
         self.blink_curve = self.blink_plot.plot(self.time_data, self.blink_data, pen=pg.mkPen('r', width=2))
 
-        # Circular buffer for detected peaks
+        # Circular buffer for detected peaks, stored as absolute sample numbers
         self.detected_peaks = deque(maxlen=self.sampling_rate * 5)  # Store peaks with 5-second window
+        self.peak_indices = np.empty(0, dtype=int)                  # Peak positions drawn on the previous tick
 
-        # Timer for plot update
-        self.timer = pg.QtCore.QTimer()
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(15)
-        self.start_time = time.time()
+        # Frame-time counter, shown in the window title once per second
+        self.frame_time = 0.0              # Smoothed time spent in process_chunk (seconds)
+        self.last_frame_report = time.time()
+
+        # Timer for plot update, unless the hub drives process_chunk
+        if hub is None:
+            self.timer = pg.QtCore.QTimer()
+            self.timer.timeout.connect(self.update_plot)
+            self.timer.start(15)
+        else:
+            hub.add_view(self)
 
     def update_plot(self):
-        samples, _ = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
         if samples:
-            for sample in samples:
-                # Overwrite the oldest data point in the buffer
-                self.eog_data[self.current_index] = sample[0]
-                self.current_index = (self.current_index + 1) % self.buffer_size
-
-            # Filter only the new data (not the entire buffer)
-            filtered_eog, self.zi = lfilter(self.b, self.a, self.eog_data, zi=self.zi)
-
-            # Update curve with the filtered EOG signal (5-second window)
-            self.eog_plot.clear()    # Clear the previous peaks from the plot
-            self.eog_curve = self.eog_plot.plot(self.time_data, filtered_eog, pen=pg.mkPen('b', width=1))
-
-            if time.time() - self.start_time >= 2:
-                self.detect_blinks(filtered_eog)
-
-            # Clear out old peaks from the circular buffer after 4 seconds(As we want to clear the peaks just after the data overwrite.)
-            current_time = time.time()
-            while self.detected_peaks and (current_time - self.detected_peaks[0][1] > 4):
-                self.detected_peaks.popleft()  # Remove old peaks from the buffer
-
-            # Update the blink plot based on stored peaks
-            self.blink_data[:] = 0  # Reset blink data
-            for index, _ in self.detected_peaks:
-                if 0 <= index < self.buffer_size:
-                    self.blink_data[index] = 1  # Keep blink data high at detected peaks
-
-            # Mark the stored peaks on the EOG plot
-            peak_indices = [index for index, t in self.detected_peaks]
-            peak_values = [filtered_eog[i] for i in peak_indices]
-            self.eog_plot.plot(self.time_data[peak_indices], peak_values, pen=None, symbol='o', symbolPen='r', symbolSize=6)
-
-            # Update the blink plot with the current blink data
+            self.process_chunk(np.asarray(samples), timestamps)
+
+    def process_chunk(self, samples, timestamps):
+        frame_start = time.perf_counter()
+        # Filter only the new data (not the entire buffer) and overwrite the oldest data points
+        filtered_chunk = self.filter.process(samples[:, 0])
+        self.eog_data.extend(filtered_chunk)
+        filtered_eog = self.eog_data.view()
+
+        # Update curve with the filtered EOG signal (5-second window)
+        self.eog_curve.setData(self.time_data, filtered_eog)
+
+        # Detect blinks in the new samples only and store them with the time they were found
+        for blink in self.detector.process(filtered_chunk, timestamps):
+            self.detected_peaks.append((blink.index, time.time()))
+
+        # Clear out old peaks from the circular buffer after 4 seconds(As we want to clear the peaks just after the data overwrite.)
+        current_time = time.time()
+        while self.detected_peaks and (current_time - self.detected_peaks[0][1] > 4):
+            self.detected_peaks.popleft()  # Remove old peaks from the buffer
+
+        # Map the stored peaks onto the plot window (oldest sample on the left)
+        oldest = self.eog_data.total - self.buffer_size
+        peak_indices = np.fromiter((index for index, _ in self.detected_peaks), dtype=int, count=len(self.detected_peaks)) - oldest
+        peak_indices = peak_indices[(peak_indices >= 0) & (peak_indices < self.buffer_size)]
+
+        # Redraw the overlay only if there is something to show or erase
+        if len(peak_indices) or len(self.peak_indices):
+            self.blink_data[self.peak_indices] = 0  # Clear the peaks drawn on the previous tick
+            self.blink_data[peak_indices] = 1       # Keep blink data high at detected peaks
+            self.peak_scatter.setData(self.time_data[peak_indices], filtered_eog[peak_indices])  # Mark the stored peaks on the EOG plot
             self.blink_curve.setData(self.time_data, self.blink_data)
+            self.peak_indices = peak_indices
+
+        self.update_frame_time(time.perf_counter() - frame_start)
 
-    def detect_blinks(self, filtered_eog):
-        mean_signal = np.mean(filtered_eog)
-        stdev_signal = np.std(filtered_eog)
-        threshold = mean_signal + (2 * stdev_signal)
-
-        # Calculate the start and end indices for the 1-second window
-        window_size = 1 * self.sampling_rate
-        start_index = self.current_index - window_size
-        if start_index < 0:
-            start_index = 0
-        end_index = self.current_index
-
-        # Use a 1-second window for peak detection
-        filtered_window = filtered_eog[start_index:end_index]
-        peaks = self.detect_peaks(filtered_window, threshold)
-
-        # Mark detected peaks and store them with timestamps
-        for peak in peaks:
-            full_peak_index = start_index + peak
-            self.detected_peaks.append((full_peak_index, time.time()))  # Add detected peak with current timestamp
-
-    def detect_peaks(self, signal, threshold):
-        peaks = []
-        prev_peak_time = None  # Variable to store the timestamp of the previous peak
-        min_peak_gap = 0.1     # Minimum time gap between two peaks in seconds
-
-        for i in range(1, len(signal) - 1):
-            if signal[i] > signal[i - 1] and signal[i] > signal[i + 1] and signal[i] > threshold:
-                current_peak_time = i / self.sampling_rate  # Time in seconds based on the sampling rate
-
-                if prev_peak_time is not None:
-                    time_gap = current_peak_time - prev_peak_time
-                    if time_gap < min_peak_gap:
-                        continue
-
-                peaks.append(i)
-                prev_peak_time = current_peak_time
-
-        return peaks
+    def update_frame_time(self, elapsed):
+        """Keep a smoothed process_chunk duration and show it below the plots every second."""
+        self.frame_time = elapsed if self.frame_time == 0 else 0.95 * self.frame_time + 0.05 * elapsed
+        if time.time() - self.last_frame_report >= 1:
+            self.last_frame_report = time.time()
+            self.frame_label.setText(f"Frame time: {self.frame_time * 1000:.2f} ms")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
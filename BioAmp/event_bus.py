@@ -0,0 +1,62 @@
+import json
+import queue
+import threading
+
+class EventBus:
+    """Publish/subscribe hub for the web interface's server-sent events.
+
+    Every subscriber (one per open browser tab) gets its own bounded queue and blocks on it, so
+    nothing is polled. A subscriber that stops reading loses its oldest events rather than
+    blocking the publishers. New subscribers first receive the last event of every topic.
+    """
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.last = {}                 # Topic -> last published data
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a new subscriber and return its queue of (topic, data) events."""
+        events = queue.Queue(maxsize=self.max_queue)
+        with self.lock:
+            for topic, data in self.last.items():
+                events.put_nowait((topic, data))
+            self.subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def publish(self, topic, data, only_changes=False):
+        """Send an event to every subscriber. With only_changes, data equal to the last event of the topic is skipped."""
+        with self.lock:
+            if only_changes and self.last.get(topic) == data:
+                return False
+            self.last[topic] = data
+            for events in self.subscribers:
+                while True:
+                    try:
+                        events.put_nowait((topic, data))
+                        break
+                    except queue.Full:
+                        try:
+                            events.get_nowait()    # Drop the oldest event of a slow subscriber
+                        except queue.Empty:
+                            pass
+        return True
+
+    def stream(self, keepalive=15):
+        """Generator of server-sent event strings for one subscriber, ending when the client disconnects."""
+        events = self.subscribe()
+        try:
+            while True:
+                try:
+                    topic, data = events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"           # Comment line, lets the server notice closed connections
+                    continue
+                prefix = "" if topic == "message" else f"event: {topic}\n"   # "message" is the EventSource default
+                yield f"{prefix}data: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(events)
@@ -1,17 +1,22 @@
 import numpy as np
-from collections import deque
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QHBoxLayout, QMainWindow, QWidget
 from PyQt5.QtCore import Qt
 from pyqtgraph import PlotWidget
 import pyqtgraph as pg
-import pylsl
 import sys
-from scipy.signal import butter, iirnotch, lfilter, lfilter_zi
-from scipy.fft import fft
-import math
+import argparse
+from stream_filters import notch, bandpass
+from stream_hub import connect_inlet, make_filter
+from spectral import SpectralTracker
+from ring_buffer import RingBuffer
+
+BANDS = ['Delta', 'Theta', 'Alpha', 'Beta', 'Gamma']
+CHANNEL_SPACING = 10000   # Vertical offset between stacked channels in multichannel mode
 
 class EEGMonitor(QMainWindow):
-    def __init__(self): 
+    def __init__(self, num_channels=1, hub=None):
+        """num_channels: number of stream channels to analyse (None for all of them)
+        hub: StreamHub to receive chunks from instead of opening an inlet (see visualizer.py)"""
         super().__init__()
 
         self.setWindowTitle("Real-Time EEG Monitor with FFT and Brainwave Power")
@@ -51,110 +56,101 @@ class EEGMonitor(QMainWindow):
         self.bar_chart_widget.setLabel('bottom', 'Brainpower Bands')
         self.bar_chart_widget.setXRange(-0.5, 4.5)
         self.bar_chart_widget.setMouseEnabled(x=False, y=False)  # Disable zoom
-        # Add brainwave power bars
-        self.brainwave_bars = pg.BarGraphItem(x=[0, 1, 2, 3, 4], height=[0, 0, 0, 0, 0], width=0.5, brush='g')
-        self.bar_chart_widget.addItem(self.brainwave_bars)
         # Set x-ticks for brainwave types
-        self.bar_chart_widget.getAxis('bottom').setTicks([[(0, 'Delta'), (1, 'Theta'), (2, 'Alpha'), (3, 'Beta'), (4, 'Gamma')]])
+        self.bar_chart_widget.getAxis('bottom').setTicks([list(enumerate(BANDS))])
         self.bottom_layout.addWidget(self.bar_chart_widget)
 
         # Add the bottom layout to the main layout
         self.main_layout.addLayout(self.bottom_layout)
         self.setCentralWidget(self.central_widget)
 
-        # Set up LSL stream inlet
-        print("Searching for available LSL streams...")
-        available_streams = pylsl.resolve_streams()
-
-        if not available_streams:
-            print("No LSL streams found! Exiting...")
-            sys.exit(0)
-
-        self.inlet = None
-        for stream in available_streams:
-            try:
-                self.inlet = pylsl.StreamInlet(stream)
-                print(f"Connected to LSL stream: {stream.name()}")
-                break
-            except Exception as e:
-                print(f"Failed to connect to {stream.name()}: {e}")
-
-        if self.inlet is None:
-            print("Unable to connect to any LSL stream! Exiting...")
-            sys.exit(0)
+        # Set up LSL stream inlet, or use the one shared by the visualizer host
+        self.hub = hub
+        self.inlet = hub.inlet if hub else connect_inlet()
 
         # Sampling rate
         self.sampling_rate = int(self.inlet.info().nominal_srate())
-        print(f"Sampling rate: {self.sampling_rate} Hz")
-
-        # Data and Buffers
-        self.eeg_data = deque(maxlen=500)       # Initialize moving window with 500 samples
-        self.moving_window = deque(maxlen=500)  # 500 samples for FFT and power calculation (sliding window)
-
-        self.b_notch, self.a_notch = iirnotch(50, 30, self.sampling_rate)
-        self.b_band, self.a_band = butter(4, [0.5 / (self.sampling_rate / 2), 48.0 / (self.sampling_rate / 2)], btype='band')
-
-        self.zi_notch = lfilter_zi(self.b_notch, self.a_notch) * 0
-        self.zi_band = lfilter_zi(self.b_band, self.a_band) * 0
-
-        # Timer for updating the plot
-        self.timer = pg.QtCore.QTimer()
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(20) 
+        if hub is None:
+            print(f"Sampling rate: {self.sampling_rate} Hz")
+
+        stream_channels = self.inlet.info().channel_count()
+        self.num_channels = stream_channels if num_channels is None else min(num_channels, stream_channels)
+        print(f"Analysing {self.num_channels} channel(s)")
+
+        # Data and Buffers, all channels processed together as (channels, samples) blocks
+        self.eeg_data = RingBuffer(500, self.num_channels)  # Last 500 filtered samples for the EEG plot
+        self.time_axis = np.linspace(0, 4, 500)
+        self.spectral = SpectralTracker(self.sampling_rate, window_size=500, hop=50, num_channels=self.num_channels)  # FFT and band power every 50 samples
+
+        # 50 Hz notch followed by a 0.5-48 Hz bandpass, applied once per chunk
+        self.filter = make_filter(hub, notch(50, self.sampling_rate), bandpass(0.5, 48.0, self.sampling_rate, order=4), num_channels=self.num_channels)
+
+        # Timer for updating the plot, unless the hub drives process_chunk
+        if hub is None:
+            self.timer = pg.QtCore.QTimer()
+            self.timer.timeout.connect(self.update_plot)
+            self.timer.start(20)
+        else:
+            hub.add_view(self)
+
+        if self.num_channels == 1:
+            self.eeg_curves = [self.eeg_plot_widget.plot(pen=pg.mkPen('b', width=1))]
+            self.fft_curves = [self.fft_plot.plot(pen=pg.mkPen('r', width=1))]  # FFT Colour is red
+            self.offsets = np.zeros(1)
+            self.brainwave_bars = pg.BarGraphItem(x=np.arange(len(BANDS)), height=np.zeros(len(BANDS)), width=0.5, brush='g')
+        else:
+            self.setup_multichannel_plots()
+        self.bar_chart_widget.addItem(self.brainwave_bars)
 
-        self.eeg_curve = self.eeg_plot_widget.plot(pen=pg.mkPen('b', width=1))
-        self.fft_curve = self.fft_plot.plot(pen=pg.mkPen('r', width=1))  # FFT Colour is red
+    def setup_multichannel_plots(self):
+        """Stack the channels in the EEG plot, overlay their spectra and group the band bars per channel."""
+        colors = [pg.intColor(channel, hues=self.num_channels) for channel in range(self.num_channels)]
+        self.offsets = -np.arange(self.num_channels) * CHANNEL_SPACING   # Channel 1 on top
+        self.eeg_plot_widget.setYRange(self.offsets[-1] - CHANNEL_SPACING / 2, CHANNEL_SPACING / 2, padding=0)
+        self.eeg_plot_widget.getAxis('left').setTicks([[(offset, f"CH{channel + 1}") for channel, offset in enumerate(self.offsets)]])
+        self.eeg_curves = [self.eeg_plot_widget.plot(pen=pg.mkPen(color, width=1)) for color in colors]
+        self.fft_plot.addLegend()
+        self.fft_curves = [self.fft_plot.plot(pen=pg.mkPen(color, width=1), name=f"CH{channel + 1}") for channel, color in enumerate(colors)]
+
+        # One bar per (channel, band), grouped around each band's tick
+        width = 0.8 / self.num_channels
+        group_offsets = (np.arange(self.num_channels) - (self.num_channels - 1) / 2) * width
+        bar_x = (np.arange(len(BANDS))[np.newaxis, :] + group_offsets[:, np.newaxis]).ravel()
+        brushes = [color for color in colors for _ in BANDS]
+        self.brainwave_bars = pg.BarGraphItem(x=bar_x, height=np.zeros(len(bar_x)), width=width, brushes=brushes)
 
     def update_plot(self):
-        samples, _ = self.inlet.pull_chunk(timeout=0.0)
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0)
         if samples:
-            for sample in samples:
-                raw_point = sample[0]
+            self.process_chunk(np.asarray(samples), timestamps)
 
-                notch_filtered, self.zi_notch = lfilter(self.b_notch, self.a_notch, [raw_point], zi=self.zi_notch)
-                band_filtered, self.zi_band = lfilter(self.b_band, self.a_band, notch_filtered, zi=self.zi_band)
-                band_filtered = band_filtered[-1]  # Get the current filtered point
+    def process_chunk(self, samples, timestamps):
+        filtered = self.filter.process(samples[:, :self.num_channels])  # Filter the whole chunk, all channels at once
+        self.eeg_data.extend(filtered)  # Update EEG data buffer
 
-                # Update EEG data buffer
-                self.eeg_data.append(band_filtered)
+        if self.spectral.update(filtered):  # A new 500-sample window is complete every 50 samples
+            self.process_fft_and_brainpower()
 
-                if len(self.moving_window) < 500:
-                    self.moving_window.append(band_filtered)
-                else:
-                    self.process_fft_and_brainpower()
+        plot_data = self.eeg_data.view() + self.offsets[:, np.newaxis]
+        for curve, channel_data in zip(self.eeg_curves, plot_data):
+            curve.setData(self.time_axis, channel_data)
 
-                    self.moving_window = deque(list(self.moving_window)[50:] + [band_filtered], maxlen=500)
+    def process_fft_and_brainpower(self):
+        for curve, spectrum in zip(self.fft_curves, self.spectral.spectrum):
+            curve.setData(self.spectral.freqs, spectrum)
 
-            plot_data = np.array(self.eeg_data)
-            time_axis = np.linspace(0, 4, len(plot_data))
-            self.eeg_curve.setData(time_axis, plot_data)
+        brainwave_power = self.spectral.band_power()  # (channels, bands) RMS amplitude of Delta, Theta, Alpha, Beta and Gamma bins
+        self.brainwave_bars.setOpts(height=brainwave_power.ravel())
 
-    def process_fft_and_brainpower(self):
-        window = np.hanning(len(self.moving_window))
-        buffer_windowed = np.array(self.moving_window) * window
-        fft_result = np.abs(np.fft.rfft(buffer_windowed))
-        fft_result /= len(buffer_windowed)
-        freqs = np.fft.rfftfreq(len(buffer_windowed), 1 / self.sampling_rate)
-        self.fft_curve.setData(freqs, fft_result)
-
-        brainwave_power = self.calculate_brainwave_power(fft_result, freqs)
-        self.brainwave_bars.setOpts(height=brainwave_power)
-
-    def calculate_brainwave_power(self, fft_data, freqs):
-        delta_power = math.sqrt(np.sum(((fft_data[(freqs >= 0.5) & (freqs <= 4)])**2)/4))
-        theta_power = math.sqrt(np.sum(((fft_data[(freqs >= 4) & (freqs <= 8)])**2)/5))
-        alpha_power = math.sqrt(np.sum(((fft_data[(freqs >= 8) & (freqs <= 13)])**2)/6))
-        beta_power = math.sqrt(np.sum(((fft_data[(freqs >= 13) & (freqs <=30)])**2)/18))
-        gamma_power = math.sqrt(np.sum(((fft_data[(freqs >= 30) & (freqs <= 45)])**2)/16))
-        print("Delta Power", delta_power)
-        print("Theta Power", theta_power)
-        print("Alpha Power", alpha_power)
-        print("Beta Power", beta_power)
-        print("Gamma Power", gamma_power)
-        return [delta_power, theta_power, alpha_power, beta_power, gamma_power]
+def parse_channels(value):
+    return None if value == "all" else int(value)
  
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time EEG monitor with FFT and brainwave power")
+    parser.add_argument("--channels", type=parse_channels, default=1, help="Number of channels to analyse, or 'all' (default: 1)")
+    args = parser.parse_args()
+
     app = QApplication(sys.argv)
-    window = EEGMonitor()  
+    window = EEGMonitor(num_channels=args.channels)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -2,10 +2,9 @@ import pygame
 import sys
 import queue
 import threading
-from pylsl import StreamInlet, resolve_streams, resolve_byprop
+from pylsl import StreamInlet, resolve_byprop
 import numpy as np
-from scipy.signal import welch
-from scipy.integrate import simpson
+from spectral import SpectralTracker
 import time
 import os
 
@@ -69,28 +68,17 @@ first_attempt = True  # Keeps track if it's the first game or a restart
 powerData1 = []
 powerData2 = []
 
-def bandpower(data, sf, band, window_sec=None, relative=False):
-    band = np.asarray(band)
-    low, high = band
-
-    if window_sec is not None:
-        nperseg = window_sec * sf
-    else:
-        nperseg = (2 / low) * sf
-
-    freqs, psd = welch(data, sf, nperseg=nperseg)
-    freq_res = freqs[1] - freqs[0]
-    idx_band = np.logical_and(freqs >= low, freqs <= high)
-    bp = simpson(psd[idx_band], dx=freq_res)
-
+def bandpower(tracker, relative=False):
+    """(channels, bands) power from the tracker's latest Welch-averaged spectrum."""
+    power = tracker.band_power(normalize=False) ** 2
     if relative:
-        bp /= simpson(psd, dx=freq_res)
-    return bp
+        power /= np.sum(tracker.spectrum ** 2, axis=-1, keepdims=True)
+    return power
 
 def eeg_data_thread(eeg_queue):
     global powerData1, powerData2
     print("Searching for available LSL streams...")
-    streams = resolve_streams()
+    streams = resolve_byprop('type', 'EXG', timeout=1.0)   # Raw data only, not derived streams such as the EMG envelope
     available_streams = [s.name() for s in streams]
 
     if not available_streams:
@@ -115,7 +103,8 @@ def eeg_data_thread(eeg_queue):
     sampling_frequency = 500
     bands = {'Alpha': [8, 13],'Beta': [13, 30]}
     buffer_length = sampling_frequency * 1
-    data_buffer = {'Channel1': [], 'Channel2': []}
+    # Both players' channels in one tracker: 1 s window, 3 half-overlapping Welch segments, updated every 50 ms
+    tracker = SpectralTracker(sampling_frequency, window_size=buffer_length, hop=sampling_frequency // 20, num_channels=2, bands=bands, welch_segments=3)
     powerData1 = []
     powerData2 = []
     c = 0
@@ -128,28 +117,16 @@ def eeg_data_thread(eeg_queue):
             time.sleep(0.1)  # Pause the thread when the game is paused
             continue
         try:
-            sample, timestamp = inlet.pull_sample()
-            if len(sample) >= 6:
-                channel1_data = sample[0]  # PLAYER A
-                channel2_data = sample[1]  # PLAYER B
-
-                data_buffer['Channel1'].append(channel1_data)
-                data_buffer['Channel2'].append(channel2_data)
-
-                # Keep the data buffer length in check
-                if len(data_buffer['Channel1']) > buffer_length:
-                    data_buffer['Channel1'].pop(0)
-                    data_buffer['Channel2'].pop(0)
+            samples, timestamps = inlet.pull_chunk(timeout=0.0)
+            if samples and len(samples[0]) >= 6:
+                chunk = np.asarray(samples)[:, :2]  # PLAYER A, PLAYER B
 
                 elapsed_time = time.time() - start_time
-                if len(data_buffer['Channel1']) >= buffer_length:
-                    power_data = {'Channel1': {}, 'Channel2': {}}
-                    for band_name, band_freqs in bands.items():
-                        power_data['Channel1'][band_name] = bandpower(np.array(data_buffer['Channel1']), sampling_frequency, band_freqs)
-                        power_data['Channel2'][band_name] = bandpower(np.array(data_buffer['Channel2']), sampling_frequency, band_freqs)
+                if tracker.update(chunk):  # New spectrum once a full window is buffered, then every hop
+                    (alpha1, beta1), (alpha2, beta2) = bandpower(tracker)
 
-                    powerData1.append(power_data['Channel1']['Beta'] / power_data['Channel1']['Alpha'])
-                    powerData2.append(power_data['Channel2']['Beta'] / power_data['Channel2']['Alpha'])
+                    powerData1.append(beta1 / alpha1)
+                    powerData2.append(beta2 / alpha2)
 
                     if elapsed_time >= 5:
                         if c != 1:
@@ -168,7 +145,7 @@ def eeg_data_thread(eeg_queue):
                             powerData2 = []
                             data_time = elapsed_time
             else:
-                time.sleep(0.1)  # Prevent busy waiting
+                time.sleep(0.02)  # Prevent busy waiting until the next chunk arrives
         except Exception as e:
             print(f"Error occurred while pulling sample: {e}")  
             time.sleep(0.1)  
@@ -1,112 +1,131 @@
 import sys
-from pylsl import StreamInlet, resolve_streams, resolve_byprop
+import time
+import numpy as np
 import pyqtgraph as pg  # For real-time plotting
 from pyqtgraph.Qt import QtWidgets, QtCore  # PyQt components for GUI
-import numpy as np
-
-# Initialize global variables
-inlet = None
-data = None
-num_channels = 6  # Default number of channels
-curves = []
-plots = []
-
-def update_plots():
-    global data
-    if inlet is not None:
-        # Pull multiple samples at once
-        samples, timestamps = inlet.pull_chunk(timeout=0.0, max_samples=10)  # Pull up to 10 samples
-
-        # Update data buffer
-        for sample in samples:
-            data = np.roll(data, -1, axis=1)  # Shift data left
-            data[:, -1] = sample[:num_channels]  # Add new channel data to the right end of the array
-
-        # Update the curves with the new data
-        for i in range(num_channels):
-            curves[i].setData(data[i])
-
-def plot_lsl_data():
-    global inlet, num_channels, data
-
-    print("Searching for available LSL streams...")
-    streams = resolve_streams()                         # Discover available LSL streams
-    available_streams = [s.name() for s in streams]     # Get list of stream names
-
-    if not available_streams:
-        print("No LSL streams found!")
-        return None
-
-    for stream_name in available_streams:
-        print(f"Trying to connect to {stream_name}...")
-        resolved_streams = resolve_byprop('name', stream_name, timeout=2)
-
-        if resolved_streams:
-            print(f"Successfully connected to {stream_name}!")
-            inlet = StreamInlet(resolved_streams[0])           # Create an inlet to receive data from the stream
-            break
+from ring_buffer import RingBuffer  # Preallocated plot history
+from stream_hub import connect_inlet
+
+def minmax_decimate(data, width):
+    """Reduce (num_channels, n_samples) data to about `width` min/max pairs per channel.
+
+    Returns the x positions (sample numbers) and the decimated (num_channels, 2 * bins) values.
+    Each bin keeps its minimum and maximum, so spikes stay visible however much the data is reduced.
+    Data that already fits in `width` pixels is returned unchanged.
+    """
+    count = data.shape[-1]
+    width = max(width, 1)
+    if count <= 2 * width:                              # Already no more than two points per pixel
+        return np.arange(count), data
+    factor = -(-count // width)                         # Samples per bin, rounded up
+    bins = count // factor
+    offset = count - bins * factor                      # Drop the oldest samples that do not fill a bin
+    blocks = data[:, offset:].reshape(data.shape[0], bins, factor)
+    values = np.empty((data.shape[0], bins, 2))
+    values[:, :, 0] = blocks.min(axis=2)
+    values[:, :, 1] = blocks.max(axis=2)
+    x = np.repeat(offset + np.arange(bins) * factor, 2)
+    return x, values.reshape(data.shape[0], 2 * bins)
+
+class RawMonitor(QtWidgets.QWidget):
+    def __init__(self, hub=None):
+        """hub: StreamHub to receive chunks from instead of opening an inlet (see visualizer.py)"""
+        super().__init__()
+        self.hub = hub
+        self.inlet = hub.inlet if hub else connect_inlet()
+
+        self.num_channels = self.inlet.info().channel_count()
+        print(f"Detected {self.num_channels} channels.")
+
+        # Initialize data buffer based on the number of channels
+        self.data = RingBuffer(2000, self.num_channels)  # Buffer to hold the last 2000 samples for each channel
+
+        layout = QtWidgets.QVBoxLayout()  # Create a vertical layout for the window
+        self.setLayout(layout)  # Set the layout to the window
+        self.setWindowTitle("Real-Time Arduino Data")  # Set the window title
+
+        pg.setConfigOption('background', 'w')  # Background color
+        pg.setConfigOption('foreground', 'k')  # Foreground color
+
+        # All channels stacked in one GraphicsLayoutWidget, sharing the x axis
+        self.plot_layout = pg.GraphicsLayoutWidget()
+        layout.addWidget(self.plot_layout)
+        self.plots = []
+        self.curves = []
+        colors = ['#D10054', '#007A8C', '#0A6847', '#674188', '#E65C19', '#2E073F' ]  # Different colors for each channel
+        for i in range(self.num_channels):
+            plot = self.plot_layout.addPlot(row=i, col=0)  # One row per channel
+            plot.setLabel('left', f"CH{i + 1}")
+            plot.setXRange(0, self.data.capacity, padding=0)
+            plot.setMouseEnabled(x=False, y=True)
+            if self.plots:
+                plot.setXLink(self.plots[0])
+            if i < self.num_channels - 1:
+                plot.hideAxis('bottom')  # Only the bottom plot shows the sample axis
+            color = colors[i % len(colors)]  # Cycle colors if fewer colors than channels
+            curve = plot.plot(pen=color)  # Create a curve (line) for plotting data, decimated by update_curves
+            self.plots.append(plot)  # Store the plot
+            self.curves.append(curve)  # Store the curve
+
+        # Create a status bar at the bottom for displaying information
+        status_bar = QtWidgets.QHBoxLayout()
+
+        # LSL status label
+        self.lsl_label = QtWidgets.QLabel(f"LSL Status: Connected ({self.num_channels} channels detected)")
+        status_bar.addWidget(self.lsl_label)
+
+        # Rendering status: samples still waiting in the inlet and redraws per second
+        self.render_label = QtWidgets.QLabel("Backlog: 0 samples | 0 FPS")
+        status_bar.addWidget(self.render_label)
+
+        layout.addLayout(status_bar)  # Add the status bar to the layout
+
+        # Redraw at most once per display refresh, however often samples arrive
+        screen = QtWidgets.QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen and screen.refreshRate() > 0 else 60
+        self.frame_interval = 1.0 / refresh_rate
+        self.last_draw = 0.0
+        self.frames = 0                  # Redraws since the last status update
+        self.last_status = time.time()
+
+        if hub is None:
+            # Create a timer to pull new samples every 10ms
+            self.timer = QtCore.QTimer()
+            self.timer.timeout.connect(self.update_plots)  # Connect the update function to the timer
+            self.timer.start(10)  # Start the timer with a 10ms interval
         else:
-            print(f"Failed to connect to {stream_name}.")
-
-    if inlet is None:
-        print("Could not connect to any stream.")
-        return None
-
-    info = inlet.info()
-    num_channels = info.channel_count()
-    print(f"Detected {num_channels} channels.")
-    
-    # Initialize data buffer based on the number of channels
-    data = np.zeros((num_channels, 2000))  # Buffer to hold the last 2000 samples for each channel
-
-    init_gui()
-
-def init_gui():
-    global plots, curves, app, win, timer, status_bar, lsl_label
+            hub.add_view(self)
+
+    def update_plots(self):
+        # Pull everything waiting (not a fixed number of samples), so the plot never falls behind
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=max(self.inlet.samples_available(), 1))
+        if samples:
+            self.process_chunk(np.asarray(samples), timestamps)
+
+    def process_chunk(self, samples, timestamps):
+        self.data.extend(samples)  # Add new channel data to the ring buffer
+
+        now = time.perf_counter()
+        if now - self.last_draw >= self.frame_interval:
+            self.last_draw = now
+            self.update_curves()
+            self.frames += 1
+
+        if time.time() - self.last_status >= 1:
+            elapsed = time.time() - self.last_status
+            self.last_status = time.time()
+            self.render_label.setText(f"Backlog: {self.inlet.samples_available()} samples | {self.frames / elapsed:.0f} FPS")
+            self.frames = 0
+
+    def update_curves(self):
+        """Redraw every channel, decimated to the width of the plots in pixels."""
+        width = int(self.plots[0].getViewBox().width()) or self.data.capacity
+        x, plot_data = minmax_decimate(self.data.view(), width)  # All channels at once
+        for curve, channel_data in zip(self.curves, plot_data):
+            curve.setData(x, channel_data)
 
+if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)  # Create the Qt application
-    win = QtWidgets.QWidget()  # Create the main window
-    layout = QtWidgets.QVBoxLayout()  # Create a vertical layout for the window
-    win.setLayout(layout)  # Set the layout to the window
-    win.setWindowTitle("Real-Time Arduino Data")  # Set the window title
-
-    pg.setConfigOption('background', 'w')  # Background color
-    pg.setConfigOption('foreground', 'k')  # Foreground color
-
-    # Create plots for each channel based on num_channels
-    global plots, curves
-    plots = []
-    curves = []
-    colors = ['#D10054', '#007A8C', '#0A6847', '#674188', '#E65C19', '#2E073F' ]  # Different colors for each channel
-    for i in range(num_channels):
-        plot = pg.PlotWidget(title=f"Channel {i + 1}")  # Create a plot widget for each channel
-        layout.addWidget(plot)  # Add the plot to the layout
-        color = colors[i % len(colors)]  # Cycle colors if fewer colors than channels
-        curve = plot.plot(pen=color)  # Create a curve (line) for plotting data
-        curve.setDownsampling(auto=True)  # Automatically downsample if needed
-        curve.setClipToView(True)  # Clip the data to the view
-        plots.append(plot)  # Store the plot
-        curves.append(curve)  # Store the curve
-
-    # Create a status bar at the bottom for displaying information
-    status_bar = QtWidgets.QHBoxLayout()
-
-    # LSL status label
-    lsl_label = QtWidgets.QLabel(f"LSL Status: Connected ({num_channels} channels detected)")
-    status_bar.addWidget(lsl_label)
-
-    layout.addLayout(status_bar)  # Add the status bar to the layout
-
+    win = RawMonitor()
     win.show()  # Show the window
-
-    # Create a timer to update the plots every 1ms
-    timer = QtCore.QTimer()
-    timer.timeout.connect(update_plots)  # Connect the update function to the timer
-    timer.start(10)  # Start the timer with a 10ms interval
-
-    QtWidgets.QApplication.processEvents()  # Process any pending events
-
-if __name__ == "__main__":
-    plot_lsl_data()
-    if inlet:
-        sys.exit(app.exec_())  # Start the Qt application only if a stream was connected
\ No newline at end of file
+    sys.exit(app.exec_())  # Start the Qt application once a stream was connected
@@ -1,15 +1,17 @@
 import numpy as np
-from scipy.signal import butter, filtfilt
+from stream_filters import lowpass
+from stream_hub import connect_inlet, make_filter
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QLabel, QMainWindow, QWidget
 from PyQt5.QtCore import Qt
 from pyqtgraph import PlotWidget
 import pyqtgraph as pg
-import pylsl
-import neurokit2 as nk
 import sys
+from ring_buffer import RingBuffer
+from qrs_detector import QRSDetector
 
 class ECGMonitor(QMainWindow):
-    def __init__(self): 
+    def __init__(self, hub=None):
+        """hub: StreamHub to receive chunks from instead of opening an inlet (see visualizer.py)"""
         super().__init__()
 
         self.setWindowTitle("Real-Time ECG Monitor")  # Set up GUI window
@@ -34,45 +36,31 @@ class ECGMonitor(QMainWindow):
         central_widget.setLayout(layout)
         self.setCentralWidget(central_widget)
 
-        # Set up LSL stream inlet
-        print("Searching for available LSL streams...")
-        available_streams = pylsl.resolve_streams()
-
-        # Exit if no streams are found
-        if not available_streams:
-            print("No LSL streams found! Exiting...")
-            sys.exit(0)
-
-        self.inlet = None
-        for stream in available_streams:
-            try:
-                self.inlet = pylsl.StreamInlet(stream)
-                print(f"Connected to LSL stream: {stream.name()}")
-                break
-            except Exception as e:
-                print(f"Failed to connect to {stream.name()}: {e}")
-
-        if self.inlet is None:
-            print("Unable to connect to any LSL stream! Exiting...")
-            sys.exit(0)
+        # Set up LSL stream inlet, or use the one shared by the visualizer host
+        self.hub = hub
+        self.inlet = hub.inlet if hub else connect_inlet()
 
         # Get Sampling rate from the stream info.
         self.sampling_rate = int(self.inlet.info().nominal_srate())
-        print(f"Sampling rate: {self.sampling_rate} Hz")
+        if hub is None:
+            print(f"Sampling rate: {self.sampling_rate} Hz")
         
         # Data and buffers
         self.buffer_size = self.sampling_rate * 10  # Fixed-size buffer for 10 seconds
-        self.ecg_data = np.zeros(self.buffer_size)  # Fixed-size array for circular buffer
+        self.ecg_data = RingBuffer(self.buffer_size)  # Fixed-size ring buffer of filtered ECG, read back in time order
         self.time_data = np.linspace(0, 10, self.buffer_size)  # Fixed time array for plotting
-        self.r_peaks = []       # Store the indices of R-peaks
         self.heart_rate = None  # Initialize heart rate variable
-        self.current_index = 0  # Index for overwriting data
+        self.heart_rate_label.setText("Heart Rate: Calculating...")
+        self.qrs_detector = QRSDetector(self.sampling_rate)   # Streaming R-peak detector, keeps the last 64 R-peaks with their LSL timestamps
 
-        self.b, self.a = butter(4, 20.0 / (0.5 * self.sampling_rate), btype='low')   # Low-pass filter coefficients
+        self.filter = make_filter(hub, lowpass(20.0, self.sampling_rate, order=4))   # Low-pass filter, applied to new samples only
 
-        self.timer = pg.QtCore.QTimer()   # Timer for updating the plot (every 10 ms)
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(10)
+        if hub is None:
+            self.timer = pg.QtCore.QTimer()   # Timer for updating the plot (every 10 ms)
+            self.timer.timeout.connect(self.update_plot)
+            self.timer.start(10)
+        else:
+            hub.add_view(self)                # The hub pulls the samples and calls process_chunk
 
         # Set y-axis limits based on sampling rate
         if self.sampling_rate == 250:  
@@ -83,7 +71,7 @@ class ECGMonitor(QMainWindow):
         # Set fixed x-axis range
         self.plot_widget.setXRange(0, 10,padding=0)  # ensure no extra spaces
 
-        self.ecg_curve = self.plot_widget.plot(self.time_data, self.ecg_data, pen=pg.mkPen('k', width=1))
+        self.ecg_curve = self.plot_widget.plot(self.time_data, self.ecg_data.view(), pen=pg.mkPen('k', width=1))
         self.r_peak_curve = self.plot_widget.plot([], [], pen=None, symbol='o', symbolBrush='r', symbolSize=10)  # R-peaks in red
         
         self.moving_average_window_size = 5   # Initialize moving average buffer
@@ -105,48 +93,44 @@ class ECGMonitor(QMainWindow):
         self.plot_widget.setXRange(0, 10, padding=0)
 
     def update_plot(self):
-        samples, _ = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=30)
         if samples:
-            for sample in samples:
-                # Overwrite the oldest data point in the buffer
-                self.ecg_data[self.current_index] = sample[0]
-                self.current_index = (self.current_index + 1) % self.buffer_size  # Circular increment
+            self.process_chunk(np.asarray(samples), timestamps)
 
-            filtered_ecg = filtfilt(self.b, self.a, self.ecg_data) # Filter the signal
+    def process_chunk(self, samples, timestamps):
+        filtered_chunk = self.filter.process(samples[:, 0])  # Filter the new samples
+        self.ecg_data.extend(filtered_chunk)                 # and overwrite the oldest ones
 
-            self.ecg_curve.setData(self.time_data, filtered_ecg)  # Use current buffer for plotting
+        filtered_ecg = self.ecg_data.view()
 
-            # Detect R-peaks and update heart rate
-            self.r_peaks = self.detect_r_peaks(filtered_ecg)
-            self.calculate_heart_rate()
-            self.plot_r_peaks(filtered_ecg)
+        self.ecg_curve.setData(self.time_data, filtered_ecg)  # Use current buffer for plotting
 
-    def detect_r_peaks(self, ecg_signal):
-        r_peaks = nk.ecg_findpeaks(ecg_signal, sampling_rate=self.sampling_rate)
-        return r_peaks['ECG_R_Peaks'] if 'ECG_R_Peaks' in r_peaks else []
+        # Detect R-peaks in the new samples only and update heart rate once per beat
+        if self.qrs_detector.process(filtered_chunk, timestamps):
+            self.calculate_heart_rate()
+        self.plot_r_peaks(filtered_ecg)
 
     def calculate_heart_rate(self):
-        if len(self.r_peaks) >= 10:  # Check if we have 10 or more R-peaks
-            recent_r_peaks = self.r_peaks[-10:]  # Use the last 10 R-peaks for heart rate calculation
-            rr_intervals = np.diff([self.time_data[i] for i in recent_r_peaks])  # Calculate RR intervals (time differences between consecutive R-peaks)
-            if len(rr_intervals) > 0:
-                avg_rr = np.mean(rr_intervals)  # Average RR interval
-                self.heart_rate = 60.0 / avg_rr  # Convert to heart rate (BPM)
-                self.heart_rate_history.append(self.heart_rate)   # Update moving average
-                if len(self.heart_rate_history) > self.moving_average_window_size:
-                    self.heart_rate_history.pop(0)  # Remove the oldest heart rate 
-                
-                # Calculate the moving average heart rate
-                moving_average_hr = np.mean(self.heart_rate_history)
-                
-                # Update heart rate label with moving average & convert into int
-                self.heart_rate_label.setText(f"Heart Rate: {int(moving_average_hr)} BPM")
+        if self.qrs_detector.heart_rate is not None:  # Available once 9 RR intervals (from the R-peak LSL timestamps) are known
+            self.heart_rate = self.qrs_detector.heart_rate     # Mean of the last 9 RR intervals (BPM)
+            self.heart_rate_history.append(self.heart_rate)   # Update moving average
+            if len(self.heart_rate_history) > self.moving_average_window_size:
+                self.heart_rate_history.pop(0)  # Remove the oldest heart rate 
+            
+            # Calculate the moving average heart rate
+            moving_average_hr = np.mean(self.heart_rate_history)
+            
+            # Update heart rate label with moving average & convert into int
+            self.heart_rate_label.setText(f"Heart Rate: {int(moving_average_hr)} BPM")
         else:
             self.heart_rate_label.setText("Heart Rate: Calculating...")   # Display message if not enough R-peaks detected
 
     def plot_r_peaks(self, filtered_ecg):
-        r_peak_times = self.time_data[self.r_peaks]             # Extract the time of detected R-peaks
-        r_peak_values = filtered_ecg[self.r_peaks]              # Get corresponding ECG values
+        oldest = self.ecg_data.total - self.buffer_size         # Absolute sample number of the left edge of the plot
+        r_peaks = np.array([peak.index for peak in self.qrs_detector.r_peaks], dtype=int) - oldest
+        r_peaks = r_peaks[r_peaks >= 0]
+        r_peak_times = self.time_data[r_peaks]                  # Extract the time of detected R-peaks
+        r_peak_values = filtered_ecg[r_peaks]                   # Get corresponding ECG values
         self.r_peak_curve.setData(r_peak_times, r_peak_values)  # Plot R-peaks as red dots
 
 if __name__ == "__main__":
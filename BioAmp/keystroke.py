@@ -3,18 +3,17 @@ from tkinter import PhotoImage
 import threading
 import pyautogui
 import numpy as np
-from scipy.signal import butter, lfilter
+from stream_filters import StreamingFilter, lowpass
 import pylsl
 import time
+from blink_detector import BlinkDetector
 
 class EOGPeakDetector:
     def __init__(self, blink_button, keystroke_action, connect_button):
         self.inlet = None                         # LSL inlet for receiving data
         self.sampling_rate = None                 # Sampling rate of the data stream
-        self.buffer_size = None                   # Size of the buffer for storing EOG data
-        self.eog_data = None                      # Buffer for EOG data
-        self.current_index = 0                    # Current index in the buffer
-        self.b, self.a = None, None               # Filter coefficients for low-pass filter
+        self.filter = None                        # Streaming low-pass filter
+        self.detector = None                      # Streaming blink detector
         self.blink_button = blink_button          # Button to trigger blink action
         self.keystroke_action = keystroke_action  # Action to perform on blink detection
         self.connect_button = connect_button      # Button to connect to LSL stream
@@ -28,7 +27,7 @@ class EOGPeakDetector:
     def initialize_stream(self):
         """Initialize the LSL stream connection and set up the buffer and filter coefficients."""
         print("Searching for available LSL streams...")
-        available_streams = pylsl.resolve_streams()
+        available_streams = pylsl.resolve_byprop('type', 'EXG', timeout=1.0)   # Raw data only, not derived streams such as the EMG envelope
         
         if not available_streams:
             print("No LSL streams found! Connection failed.")
@@ -39,13 +38,7 @@ class EOGPeakDetector:
             try:
                 self.inlet = pylsl.StreamInlet(stream)
                 print(f"Connected to LSL stream: {stream.name()}")
-                self.sampling_rate = int(self.inlet.info().nominal_srate())
-                print(f"Sampling rate: {self.sampling_rate} Hz")
-
-                # Set buffer size and filter coefficients
-                self.buffer_size = self.sampling_rate * 1      # Buffer size for 1 second of data
-                self.eog_data = np.zeros(self.buffer_size)     # Initialize buffer for EOG data
-                self.b, self.a = butter(4, 10.0 / (0.5 * self.sampling_rate), btype='low')  # Low-pass filter coefficients
+                self.configure(int(self.inlet.info().nominal_srate()))
                 self.connected = True                          # Set connected flag to True(LSL Stream connected)
                 print("LSL stream connected successfully.")
                 return True  # Stop trying after first successful connection
@@ -57,20 +50,29 @@ class EOGPeakDetector:
         self.connected = False
         return False
 
+    def configure(self, sampling_rate):
+        """Set up the filter and the blink detector (threshold of mean + 1.7 SD over ~1 s) for a sampling rate."""
+        self.sampling_rate = sampling_rate
+        print(f"Sampling rate: {self.sampling_rate} Hz")
+        self.filter = StreamingFilter(lowpass(10.0, self.sampling_rate, order=4))  # Low-pass filter with persistent state
+        self.detector = BlinkDetector(self.sampling_rate, threshold_sd=1.7, refractory_period=self.refractory_period, stats_window=1.0, warmup=1.0)
+
+    def process_samples(self, samples, timestamps):
+        """Filter a chunk of samples and run blink detection on the first channel."""
+        filtered_eog = self.filter.process(np.asarray(samples)[:, 0])
+        self.detect_blinks(filtered_eog, timestamps)             # Run blink detection on the new filtered samples
+
     def start_detection(self):
         """Start the peak detection process"""
         print("Starting peak detection...")
         self.running = True    # Flag to control the detection loop
         while self.running:
             try:
-                samples, _ = self.inlet.pull_chunk(timeout=1.0, max_samples=1)
-                if samples:
-                    for sample in samples:
-                        self.eog_data[self.current_index] = sample[0]                     # Store sample in circular buffer at current position
-                        self.current_index = (self.current_index + 1) % self.buffer_size  # Update index with wrap-around using modulo
-
-                    filtered_eog = lfilter(self.b, self.a, self.eog_data)
-                    self.detect_blinks(filtered_eog)             # Run blink detection on the filtered signal
+                sample, timestamp = self.inlet.pull_sample(timeout=0.05)    # Returns as soon as a sample arrives
+                if sample is None:
+                    continue
+                samples, timestamps = self.inlet.pull_chunk(timeout=0.0)   # Plus whatever is already buffered
+                self.process_samples([sample] + list(samples), [timestamp] + list(timestamps))
             except Exception as e:
                 print(f"Error in detection: {e}")
                 break
@@ -80,35 +82,16 @@ class EOGPeakDetector:
         print("Stopping peak detection...")
         self.running = False               # Set running flag to False to stop the detection loop
 
-    def detect_blinks(self, filtered_eog):
-        """Detect blinks in the filtered EOG signal using a threshold-based method."""
-        # Calculate dynamic threshold based on signal statistics
-        mean_signal = np.mean(filtered_eog)
-        stdev_signal = np.std(filtered_eog)
-        threshold = mean_signal + (1.7 * stdev_signal)
-
-        window_size = self.sampling_rate
-        start_index = self.current_index - window_size
-        if start_index < 0:
-            start_index = 0
-
-        filtered_window = filtered_eog[start_index:self.current_index]  # Get the current window of filtered EOG data
-        peaks = self.detect_peaks(filtered_window, threshold)           # Detect peaks above threshold in the current window
+    def detect_blinks(self, filtered_eog, timestamps):
+        """Detect blinks in newly filtered EOG samples and trigger the keystroke for the first one."""
+        blinks = self.detector.process(filtered_eog, timestamps)   # Refractory period is applied by LSL timestamp
 
         current_time = time.time()
-        if peaks and (current_time - self.last_blink_time > self.refractory_period):
+        if blinks and (current_time - self.last_blink_time > self.refractory_period):
             self.last_blink_time = current_time
-            print(f"Blink detected at index {peaks[0]}. Time: {current_time}")
+            print(f"Blink detected at sample {blinks[0].index}. Time: {blinks[0].timestamp}")
             self.trigger_action()
 
-    def detect_peaks(self, signal, threshold):
-        peaks = []
-        for i in range(1, len(signal) - 1):
-            if signal[i] > signal[i - 1] and signal[i] > signal[i + 1] and signal[i] > threshold:
-                if not peaks or (i - peaks[-1] > self.sampling_rate * self.refractory_period):
-                    peaks.append(i)
-        return peaks
-
     def trigger_action(self):
         """Trigger the keystroke action when a blink is detected."""
         if not self.blink_detected:
@@ -211,4 +194,5 @@ def create_popup():
 
     popup.mainloop()
 
-create_popup()
\ No newline at end of file
+if __name__ == "__main__":
+    create_popup()
\ No newline at end of file
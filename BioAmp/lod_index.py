@@ -0,0 +1,192 @@
+# Level-of-detail index for long recordings
+#
+# A min/max pyramid per channel, stored next to the recording in a sidecar file
+# (<recording>.lod) so it is only built once:
+#
+#         MAGIC (8 bytes) | header length (uint32) | JSON header (space padded) | levels... | raw samples
+#         level = float32 (num_channels, bins, 2) array of the min and max of each bin
+#
+# Level k groups LEVEL_FACTOR ** (k + 1) samples per bin. CSV recordings also get their samples
+# stored as float32 (n_samples, num_channels) after the levels, so any range can be read back
+# without parsing the CSV again; binary recordings are read directly from the .bin file.
+# The sidecar is rebuilt automatically when the size or modification time of the recording changes.
+
+import json
+import os
+import struct
+import numpy as np
+import pandas as pd
+from recording import BinaryRecording, read_csv_header, encode_header, HEADER_ALIGNMENT, CSV_CHUNK_SIZE
+
+MAGIC = b"CHRDLOD1"       # Sidecar signature and format version
+LEVEL_FACTOR = 8          # Samples (or bins of the level below) per bin
+MIN_TOP_BINS = 1024       # Stop adding levels once a level has no more bins than this
+
+def sidecar_filename(filename):
+    return filename + ".lod"
+
+def reduce_level(level):
+    """Combine every LEVEL_FACTOR bins of a (num_channels, bins, 2) level into one, keeping a partial last bin."""
+    bins = level.shape[1]
+    padded_bins = -(-bins // LEVEL_FACTOR) * LEVEL_FACTOR
+    padded = np.empty((level.shape[0], padded_bins, 2), dtype=level.dtype)
+    padded[:, :bins] = level
+    padded[:, bins:, 0] = np.inf     # Padding never wins a min
+    padded[:, bins:, 1] = -np.inf    # or a max
+    groups = padded.reshape(level.shape[0], -1, LEVEL_FACTOR, 2)
+    return np.stack([groups[..., 0].min(axis=2), groups[..., 1].max(axis=2)], axis=-1)
+
+def minmax_bins(samples, factor):
+    """(num_channels, bins, 2) min/max of each `factor` consecutive rows of (n_samples, num_channels) samples."""
+    bins = len(samples) // factor
+    blocks = samples[:bins * factor].reshape(bins, factor, -1)
+    return np.stack([blocks.min(axis=1).T, blocks.max(axis=1).T], axis=-1).astype(np.float32)
+
+class LODIndex:
+    """Min/max pyramid of a CSV or binary recording, opened from (or built into) its sidecar file."""
+    def __init__(self, filename, rebuild=False):
+        self.filename = filename
+        self.sidecar = sidecar_filename(filename)
+        if rebuild or not self.is_current():
+            build_index(filename)
+        self.load()
+
+    def is_current(self):
+        """True if the sidecar exists and was built from the recording as it is now."""
+        try:
+            header, _ = read_sidecar_header(self.sidecar)
+        except (OSError, ValueError):
+            return False
+        stat = os.stat(self.filename)
+        return header["source_size"] == stat.st_size and header["source_mtime"] == stat.st_mtime
+
+    def load(self):
+        self.header, offset = read_sidecar_header(self.sidecar)
+        self.columns = self.header["columns"]                # Channel names
+        self.num_channels = len(self.columns)
+        self.num_samples = self.header["num_samples"]
+        self.sampling_rate = self.header["sampling_rate"]
+        self.levels = []                                     # (factor, memmapped (num_channels, bins, 2) level)
+        for level in self.header["levels"]:
+            shape = (self.num_channels, level["bins"], 2)
+            self.levels.append((level["factor"], np.memmap(self.sidecar, dtype='<f4', mode='r', offset=offset + level["offset"], shape=shape)))
+        if self.header["raw_offset"] is None:                # Binary recording: samples come from the recording itself
+            self.samples = BinaryRecording(self.filename).channels[:self.num_samples]
+        elif self.num_samples:
+            self.samples = np.memmap(self.sidecar, dtype='<f4', mode='r', offset=offset + self.header["raw_offset"], shape=(self.num_samples, self.num_channels))
+        else:
+            self.samples = np.empty((0, self.num_channels), dtype=np.float32)
+
+    def channel_range(self, channel, start, stop, max_points):
+        """Samples start..stop of a channel, reduced to at most about `max_points` min/max pairs.
+
+        Returns (x, y): sample numbers and values. Ranges that fit in 2 * max_points points are read
+        from the raw samples; wider ranges come from the finest pyramid level that is coarse enough.
+        """
+        start, stop = max(0, int(start)), min(self.num_samples, int(np.ceil(stop)))
+        if stop <= start:
+            return np.empty(0), np.empty(0)
+        if stop - start <= 2 * max_points:
+            return np.arange(start, stop), np.asarray(self.samples[start:stop, channel], dtype=np.float64)
+
+        factor, level = self.levels[-1]
+        for level_factor, candidate in self.levels:         # Finest level with few enough bins
+            if (stop - start) / level_factor <= max_points:
+                factor, level = level_factor, candidate
+                break
+        first, last = start // factor, -(-stop // factor)
+        values = np.asarray(level[channel, first:last], dtype=np.float64).ravel()   # min, max, min, max...
+        x = np.repeat(np.arange(first, last) * factor, 2) + np.tile([0, factor // 2], last - first)
+        return x, values
+
+def read_sidecar_header(sidecar):
+    """Return (header, offset of the first level) of a sidecar file."""
+    with open(sidecar, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{sidecar} is not a Chords LOD index")
+        header_length, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    return header, len(MAGIC) + 4 + header_length
+
+def read_chunks(filename, chunk_size=CSV_CHUNK_SIZE):
+    """Yield (columns, sampling_rate) once, then (n_samples, num_channels) float blocks of a CSV or binary recording."""
+    if filename.endswith(".bin"):
+        recording = BinaryRecording(filename)
+        yield [f'Channel{i+1}' for i in range(recording.num_channels)], recording.sampling_rate
+        for start in range(0, len(recording), chunk_size):
+            yield np.asarray(recording.channels[start:start + chunk_size], dtype=np.float32)
+        return
+
+    _, sampling_rate, columns, header_index = read_csv_header(filename)
+    channel_columns = [column for column in columns if 'Channel' in column]
+    yield channel_columns, sampling_rate
+    reader = pd.read_csv(filename, skiprows=header_index + 1, names=columns, header=None, usecols=channel_columns, dtype=np.float32, chunksize=chunk_size, skip_blank_lines=True)
+    for chunk in reader:
+        yield chunk[channel_columns].to_numpy(dtype=np.float32)
+
+def build_index(filename, chunk_size=CSV_CHUNK_SIZE):
+    """Read a recording chunk by chunk and write its min/max pyramid (and, for CSV, its samples) to the sidecar."""
+    sidecar = sidecar_filename(filename)
+    stat = os.stat(filename)
+    store_raw = not filename.endswith(".bin")
+    raw_temp = sidecar + ".raw.tmp"
+
+    chunks = read_chunks(filename, chunk_size)
+    columns, sampling_rate = next(chunks)
+    num_samples = 0
+    first_level = []                                 # Finest level, built chunk by chunk
+    pending = np.empty((0, len(columns)), dtype=np.float32)   # Samples that do not fill a bin yet
+    raw = open(raw_temp, 'wb') if store_raw else None
+    try:
+        for block in chunks:
+            if raw:
+                raw.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+            num_samples += len(block)
+            block = np.concatenate([pending, block])
+            full = len(block) // LEVEL_FACTOR * LEVEL_FACTOR
+            first_level.append(minmax_bins(block[:full], LEVEL_FACTOR))
+            pending = block[full:]
+    finally:
+        if raw:
+            raw.close()
+    if len(pending):                                 # Partial last bin
+        first_level.append(minmax_bins(pending, len(pending)))
+
+    levels = [np.concatenate(first_level, axis=1) if first_level else np.empty((len(columns), 0, 2), dtype=np.float32)]
+    while levels[-1].shape[1] > MIN_TOP_BINS:
+        levels.append(reduce_level(levels[-1]))
+
+    header = {
+        "source": os.path.basename(filename),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "columns": columns,
+        "sampling_rate": sampling_rate,
+        "num_samples": num_samples,
+        "levels": [],
+        "raw_offset": None,
+    }
+    position = 0
+    for index, level in enumerate(levels):
+        header["levels"].append({"factor": LEVEL_FACTOR ** (index + 1), "bins": level.shape[1], "offset": position})
+        position += -(-level.nbytes // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+    if store_raw:
+        header["raw_offset"] = position
+
+    temp = sidecar + ".tmp"
+    with open(temp, 'wb') as f:
+        f.write(encode_header(header, magic=MAGIC))
+        for level in levels:
+            data = np.ascontiguousarray(level, dtype='<f4').tobytes()
+            f.write(data.ljust(-(-len(data) // HEADER_ALIGNMENT) * HEADER_ALIGNMENT, b'\0'))
+        if store_raw:
+            with open(raw_temp, 'rb') as raw:
+                while True:
+                    data = raw.read(1 << 22)
+                    if not data:
+                        break
+                    f.write(data)
+    if store_raw:
+        os.remove(raw_temp)
+    os.replace(temp, sidecar)       # Only a complete sidecar ever has the final name
+    return sidecar
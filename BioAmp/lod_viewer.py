@@ -0,0 +1,59 @@
+import sys
+import argparse
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtWidgets
+from lod_index import LODIndex
+
+class LODViewer(QtWidgets.QMainWindow):
+    """Zoomable plot of one channel of a long recording.
+
+    Only the visible range is drawn, at the level of detail that matches the width of the plot:
+    raw samples when zoomed in, min/max bins from the recording's LOD index when zoomed out.
+    """
+    def __init__(self, index, channel=0):
+        super().__init__()
+        self.index = index
+        self.channel = channel
+        self.setWindowTitle(f"{index.filename} - {index.columns[channel]}")
+        self.setGeometry(100, 100, 1200, 500)
+
+        pg.setConfigOption('background', 'w')
+        pg.setConfigOption('foreground', 'k')
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.setLabel('bottom', 'Index')
+        self.plot_widget.setLabel('left', index.columns[channel])
+        self.setCentralWidget(self.plot_widget)
+
+        self.curve = self.plot_widget.plot(pen=pg.mkPen('#2196F3', width=1))
+        self.view_box = self.plot_widget.getViewBox()
+        self.view_box.setMouseEnabled(x=True, y=False)                          # Zoom and pan along time only
+        self.view_box.setLimits(xMin=0, xMax=max(index.num_samples, 1))
+        self.plot_widget.setAutoVisible(y=True)                                 # Y range follows the visible data
+        self.view_box.sigXRangeChanged.connect(self.update_curve)
+        self.plot_widget.setXRange(0, index.num_samples, padding=0)
+        self.update_curve()
+
+    def update_curve(self):
+        """Load the visible range at the level of detail the plot width can show."""
+        start, stop = self.view_box.viewRange()[0]
+        width = max(int(self.view_box.width()), 200)
+        x, y = self.index.channel_range(self.channel, start, stop, width)
+        self.curve.setData(x, y)
+        self.view_box.enableAutoRange(axis='y')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zoomable viewer for long CSV or binary recordings")
+    parser.add_argument("recording", help="CSV or binary (.bin) recording")
+    parser.add_argument("--channel", default="Channel1", help="Channel to plot (default: Channel1)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the LOD index even if it is up to date")
+    args = parser.parse_args()
+
+    index = LODIndex(args.recording, rebuild=args.rebuild)   # Built once, then reused from <recording>.lod
+    if args.channel not in index.columns:
+        parser.error(f"Unknown channel {args.channel}, available: {', '.join(index.columns)}")
+
+    app = QtWidgets.QApplication(sys.argv)
+    window = LODViewer(index, index.columns.index(args.channel))
+    window.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,139 @@
+# Acquisition health metrics for app.py
+#
+# chords.py and npg-ble.py report once per second through their "stats" status lines
+# (see status_events.py): samples received in the last second, total missing samples, writer queue
+# depth, decode time and clock drift. AcquisitionMetrics keeps the latest values per source (the
+# LSL stream, or each NPG device), lifetime totals and rolling windows of the per-second values,
+# and exports them as JSON or in the Prometheus text format.
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+WINDOW = 300    # Seconds of per-second values kept for the rolling histograms
+QUANTILES = (0.05, 0.5, 0.95)
+
+# Rolling histograms: name -> (help text, bucket upper bounds)
+HISTOGRAMS = {
+    "samples_per_second": ("Samples received per second", (100, 200, 240, 250, 260, 300, 400, 480, 490, 500, 510, 1000, 2000, 5000)),
+    "missing_per_second": ("Samples lost per second", (0, 1, 2, 5, 10, 50, 100)),
+    "decode_ms": ("Milliseconds per second spent decoding", (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100)),
+}
+
+class RollingHistogram:
+    """Values observed during the last `window` seconds, plus lifetime sum and count."""
+    def __init__(self, buckets, window=WINDOW):
+        self.buckets = buckets
+        self.window = window
+        self.values = deque()           # (time, value)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value, now):
+        self.values.append((now, value))
+        self.sum += value
+        self.count += 1
+        while self.values and self.values[0][0] < now - self.window:
+            self.values.popleft()
+
+    def snapshot(self):
+        values = np.array([value for _, value in self.values], dtype=np.float64)
+        counts = [int(np.count_nonzero(values <= bound)) for bound in self.buckets]   # Cumulative, like Prometheus buckets
+        quantiles = {str(q): float(np.quantile(values, q)) for q in QUANTILES} if len(values) else {}
+        return {"window": self.window, "observations": len(values), "buckets": dict(zip(map(str, self.buckets), counts)),
+                "quantiles": quantiles, "min": float(values.min()) if len(values) else None, "sum": self.sum, "count": self.count}
+
+class SourceMetrics:
+    """Metrics of one source: the LSL stream of chords.py, or one NPG device."""
+    def __init__(self, stream, source):
+        self.stream = stream
+        self.source = source
+        self.samples_total = 0
+        self.missing_total = 0          # As reported by the producer (restarts with the process)
+        self.dropped_total = 0
+        self.gauges = {}                # Latest per-second values
+        self.updated = None
+        self.histograms = {name: RollingHistogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()}
+
+    def observe(self, stats, now):
+        samples = stats.get("samples", 0)
+        missing = stats.get("missing", 0)
+        missing_delta = missing - self.missing_total if missing >= self.missing_total else missing   # Producer restarted
+        self.samples_total += samples
+        self.missing_total = missing
+        self.dropped_total = stats.get("dropped", self.dropped_total)
+        self.gauges = {"samples_per_second": samples, "queue_depth": stats.get("queue_depth"), "decode_ms": stats.get("decode_ms"),
+                       "decode_max_ms": stats.get("decode_max_ms"), "drift_seconds_per_hour": stats.get("drift")}
+        self.updated = now
+        self.histograms["samples_per_second"].observe(samples, now)
+        self.histograms["missing_per_second"].observe(missing_delta, now)
+        if stats.get("decode_ms") is not None:
+            self.histograms["decode_ms"].observe(stats["decode_ms"], now)
+
+    def snapshot(self):
+        return {"stream": self.stream, "source": self.source, "updated": self.updated, "samples_total": self.samples_total,
+                "missing_total": self.missing_total, "dropped_total": self.dropped_total, **self.gauges,
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}}
+
+class AcquisitionMetrics:
+    """Aggregates the "stats" events of every stream process for the /metrics endpoints."""
+    def __init__(self):
+        self.sources = {}               # (stream, source) -> SourceMetrics
+        self.lock = threading.Lock()
+
+    def observe(self, stream, stats):
+        """Record one "stats" event of a stream ("lsl" or "npg")."""
+        source = stats.get("address") or stream
+        now = stats.get("time") or time.time()
+        with self.lock:
+            key = (stream, source)
+            if key not in self.sources:
+                self.sources[key] = SourceMetrics(stream, source)
+            self.sources[key].observe(stats, now)
+
+    def to_json(self, streams=None):
+        """All sources, plus the supervisor's stream states if given ({name: snapshot})."""
+        with self.lock:
+            sources = [metrics.snapshot() for metrics in self.sources.values()]
+        return {"time": time.time(), "streams": streams or {}, "sources": sources}
+
+    def to_prometheus(self, streams=None):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            sources = [metrics.snapshot() for metrics in self.sources.values()]
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP chords_{name} {help_text}")
+            lines.append(f"# TYPE chords_{name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    label_text = ",".join(f'{key}="{escape(str(label))}"' for key, label in labels.items())
+                    lines.append(f"chords_{name}{{{label_text}}} {float(value)!r}")
+
+        if streams:
+            metric("stream_up", "gauge", "1 while the stream process is running", [({"stream": name}, int(bool(status and status["active"]))) for name, status in streams.items()])
+        labels = [{"stream": s["stream"], "source": s["source"]} for s in sources]
+        metric("samples_total", "counter", "Samples received", [(label, s["samples_total"]) for label, s in zip(labels, sources)])
+        metric("missing_samples_total", "counter", "Samples lost, from the packet counters", [(label, s["missing_total"]) for label, s in zip(labels, sources)])
+        metric("dropped_samples_total", "counter", "Samples dropped by the recording/LSL writer queue", [(label, s["dropped_total"]) for label, s in zip(labels, sources)])
+        metric("samples_per_second", "gauge", "Samples received in the last second", [(label, s["samples_per_second"]) for label, s in zip(labels, sources)])
+        metric("queue_depth", "gauge", "Blocks or samples waiting for output", [(label, s["queue_depth"]) for label, s in zip(labels, sources)])
+        metric("decode_ms", "gauge", "Milliseconds spent decoding in the last second", [(label, s["decode_ms"]) for label, s in zip(labels, sources)])
+        metric("decode_max_ms", "gauge", "Longest single decode in the last second", [(label, s["decode_max_ms"]) for label, s in zip(labels, sources)])
+        metric("clock_drift_seconds_per_hour", "gauge", "Board clock drift against the host clock", [(label, s["drift_seconds_per_hour"]) for label, s in zip(labels, sources)])
+        metric("last_update_timestamp_seconds", "gauge", "Time of the last stats event", [(label, s["updated"]) for label, s in zip(labels, sources)])
+
+        for name, (help_text, _) in HISTOGRAMS.items():
+            samples = []
+            for label, s in zip(labels, sources):
+                histogram = s["histograms"][name]
+                for quantile, value in histogram["quantiles"].items():
+                    samples.append(({**label, "quantile": quantile}, value))
+            metric(f"{name}_window", "summary", f"{help_text}, quantiles over the last {WINDOW} s", samples)
+            lines.extend(f'chords_{name}_window_{part}{{stream="{escape(label["stream"])}",source="{escape(label["source"])}"}} {float(s["histograms"][name][part])!r}'
+                         for label, s in zip(labels, sources) for part in ("sum", "count"))
+        return "\n".join(lines) + "\n"
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
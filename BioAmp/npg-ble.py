@@ -1,10 +1,14 @@
 import asyncio
 from bleak import BleakScanner, BleakClient
 import time
-from pylsl import StreamInfo, StreamOutlet
+from pylsl import StreamInfo, StreamOutlet, local_clock
+import numpy as np
 import sys
 import argparse
 import threading
+from sample_writer import push_block
+from stream_clock import SampleClock, unroll_counters
+import status_events
 
 # BLE parameters (must match your firmware)
 DEVICE_NAME_PREFIX = "NPG"
@@ -16,167 +20,366 @@ CONTROL_CHAR_UUID = "0000ff01-0000-1000-8000-00805f9b34fb"
 SINGLE_SAMPLE_LEN = 7   # (1 Counter + 3 Channels * 2 bytes)
 BLOCK_COUNT = 10
 NEW_PACKET_LEN = SINGLE_SAMPLE_LEN * BLOCK_COUNT
+NUM_CHANNELS = 3
+SAMPLING_RATE = 500
+SAMPLE_DTYPE = np.dtype([('counter', 'u1'), ('channels', '>i2', (NUM_CHANNELS,))])   # Layout of one sample
+
+# Reconnect parameters (--reconnect)
+RECONNECT_DELAY = 0.5          # Seconds before the first reconnect attempt
+MAX_RECONNECT_DELAY = 10.0     # Upper bound of the exponential backoff
+MAX_FILL_SECONDS = 60          # Longer dropouts restart the counter instead of being filled
+GAP_MARKER = np.iinfo(np.int16).min   # Merged int16 streams: value of missing samples (never produced by the ADC)
+
+def fill_gaps(unrolled, channels, first, fill_value=np.nan):
+    """Expand a block with missing samples into a contiguous one starting at `first`, filling the gaps with `fill_value`"""
+    count = int(unrolled[-1] - first + 1)
+    if count == len(unrolled):
+        return unrolled, channels
+    filled = np.full((count, channels.shape[1]), fill_value, dtype=np.float32)
+    filled[unrolled - first] = channels
+    return np.arange(first, unrolled[-1] + 1), filled
 
 class NPGBluetoothClient:
-    def __init__(self):
+    """A single NPG device: BLE connection, block decoding and per-device counters"""
+    def __init__(self, device_address=None):
+        self.device_address = device_address      # BLE address of the device
         self.prev_unrolled_counter = None          # Previous Counter
         self.samples_received = 0                  # Number of Samples received
         self.start_time = None                     # Start time of the first sample
         self.total_missing_samples = 0             # Total missing samples
-        self.outlet = None                         # LSL outlet
+        self.outlet = None                         # LSL outlet (per-device mode)
+        self.merged_outlet = None                  # MergedOutlet shared with other devices (merged mode)
+        self.clock = SampleClock(SAMPLING_RATE)    # Timestamps from the unrolled counter
         self.last_received_time = None             # Last time a sample was received
-        self.DATA_TIMEOUT = 2.0                    # Timeout for considering data interrupted
         self.client = None                         # Bleak client instance
-        self.monitor_task = None                   # Task for monitoring connection
-        self.print_rate_task = None                # Task for printing sample rate
-        self.running = False                       # Flag indicating if NPGBluetoothClient is running or not
-        self.loop = None                           # Event loop for asyncio
-        self.connection_event = threading.Event()  # Event for connection status
-        self.stop_event = threading.Event()        # Event for stopping all operations
+        self.multi_device = False                  # Tag log lines with the address when several devices run
+        self.fill_gaps = False                     # Push NaN rows for missing samples (--fill-gaps)
+        self.block_start = None                    # Unrolled counter expected for the first sample of the last block
+        self.resume_time = None                    # Time of the last sample before a dropout, while reconnecting
+        self.reconnecting = False                  # A reconnect is in progress
+        self.reconnects = 0                        # Number of successful reconnects
+        self.decode_time = 0.0                     # Seconds spent handling notifications since the last rate report
+        self.decode_max_time = 0.0                 # Longest notification since the last rate report
 
-    def process_sample(self, sample_data: bytearray):
-        """Process a single EEG sample packet"""
+    def process_block(self, data):
+        """Decode a notification of one or more samples and return (unrolled counters, channel values)"""
         self.last_received_time = time.time()
-        
-        # Validate Sample Length 
-        if len(sample_data) != SINGLE_SAMPLE_LEN:
-            print("Unexpected sample length:", len(sample_data))
-            return
 
-        # Extract and Validate Sample Counter   
-        sample_counter = sample_data[0]
-        if self.prev_unrolled_counter is None:
-            self.prev_unrolled_counter = sample_counter
-        else:
-            # Calculate unrolled counter (handling 0-255)
-            last = self.prev_unrolled_counter % 256
-            if sample_counter < last:
-                current_unrolled = self.prev_unrolled_counter - last + sample_counter + 256
-            else:
-                current_unrolled = self.prev_unrolled_counter - last + sample_counter
-            
-            # Check for missing samples
-            if current_unrolled != self.prev_unrolled_counter + 1:
-                missing = current_unrolled - (self.prev_unrolled_counter + 1)
-                print(f"Missing {missing} sample(s)")
-                self.total_missing_samples += missing
-            
-            self.prev_unrolled_counter = current_unrolled
-                   
+        # View the notification as (counter, 3 x big-endian int16) records without copying
+        block = np.frombuffer(data, dtype=SAMPLE_DTYPE)
+        unrolled = unroll_counters(block['counter'], self.prev_unrolled_counter)  # Unrolled counter (handling 0-255)
+        if self.resume_time is not None:   # First block after a reconnect
+            unrolled = self.resume_counters(unrolled)
+
+        # Check for missing samples across the whole block
+        expected_first = unrolled[0] if self.prev_unrolled_counter is None else self.prev_unrolled_counter + 1
+        self.block_start = int(expected_first)
+        gaps = np.diff(unrolled, prepend=expected_first - 1) - 1
+        for missing in gaps[gaps > 0]:
+            print(f"Missing {missing} sample(s)" + self.label())
+        self.total_missing_samples += int(gaps.sum())
+        self.prev_unrolled_counter = int(unrolled[-1])
+
         # Initialize timing on first sample received
         if self.start_time is None:
             self.start_time = time.time()
-        
-        # Extract 3 channels of EEG data (16-bit signed integers, big-endian)
-        channels = [
-            int.from_bytes(sample_data[1:3], byteorder='big', signed=True),
-            int.from_bytes(sample_data[3:5], byteorder='big', signed=True),
-            int.from_bytes(sample_data[5:7], byteorder='big', signed=True)]
-        
-        # Push sample to LSL outlet
-        if self.outlet:
-            self.outlet.push_sample(channels)
-        
-        self.samples_received += 1
-        
-        # Periodically print the number of samples received and the elapsed time when 500 samples are received
-        if self.samples_received % 500 == 0:
+
+        # Periodically print the number of samples received and the elapsed time every 500 samples
+        previous_count = self.samples_received
+        self.samples_received += len(block)
+        if self.samples_received // 500 != previous_count // 500:
             elapsed = time.time() - self.start_time
-            print(f"Received {self.samples_received} samples in {elapsed:.2f}s")
+            print(f"Received {self.samples_received} samples in {elapsed:.2f}s" + self.label())
+
+        return unrolled, block['channels']
+
+    def resume_counters(self, unrolled):
+        """Place the first block after a dropout using the elapsed time, since the 8-bit counter alone
+        cannot tell how many times it wrapped while the device was away"""
+        elapsed = self.last_received_time - self.resume_time
+        self.resume_time = None
+        expected_first = self.prev_unrolled_counter + round(elapsed * SAMPLING_RATE) - len(unrolled) + 1
+        if expected_first - self.prev_unrolled_counter > MAX_FILL_SECONDS * SAMPLING_RATE:
+            print(f"Dropout of {elapsed:.1f}s is too long to fill, restarting the sample counter" + self.label())
+            self.prev_unrolled_counter = None
+            self.clock.reset()
+            if self.merged_outlet:
+                self.merged_outlet.restart(self)
+            return unrolled - 256 * (unrolled[0] // 256)   # Restart below 256, consistent with the raw counter
+        wraps = max(0, round((expected_first - unrolled[0]) / 256))   # Whole counter wraps missed, reconciled with the counter value
+        return unrolled + 256 * wraps
 
     def notification_handler(self, sender, data: bytearray):
         """Handle incoming notifications from the BLE device"""
+        handler_start = time.perf_counter()
         try:
-            if len(data) == NEW_PACKET_LEN:
-                for i in range(0, NEW_PACKET_LEN, SINGLE_SAMPLE_LEN):
-                    self.process_sample(data[i:i+SINGLE_SAMPLE_LEN])
-            elif len(data) == SINGLE_SAMPLE_LEN:
-                self.process_sample(data)
-            else:
+            arrival_time = local_clock()   # Time at which the newest sample of the notification arrived
+            if len(data) == 0 or len(data) % SINGLE_SAMPLE_LEN != 0:
                 print(f"Unexpected packet length: {len(data)} bytes")
+                return
+
+            unrolled, channels = self.process_block(data)
+            if self.fill_gaps:                      # Keep the stream contiguous across lost samples
+                unrolled, channels = fill_gaps(unrolled, channels, self.block_start)
+            if self.outlet or self.merged_outlet:   # One push per notification, timestamped from the counters
+                timestamps = self.clock.timestamps(unrolled, arrival_time)
+                if self.merged_outlet:
+                    self.merged_outlet.push(self, unrolled, channels, timestamps)
+                else:
+                    push_block(self.outlet, channels, timestamps, dtype=np.float32 if self.fill_gaps else np.int16)
         except Exception as e:
             print(f"Error processing data: {e}")
+        elapsed = time.perf_counter() - handler_start
+        self.decode_time += elapsed
+        self.decode_max_time = max(self.decode_max_time, elapsed)
+
+    def queue_depth(self):
+        """Samples waiting in the merged outlet for the other devices"""
+        return len(self.merged_outlet.pending[id(self)][0]) if self.merged_outlet else 0
+
+    def label(self):
+        """Suffix identifying the device in log lines when several devices are connected"""
+        return f" [{self.device_address}]" if self.multi_device else ""
+
+    async def start(self):
+        """Connect to the device, send START and subscribe to data notifications"""
+        print(f"Attempting to connect to {self.device_address}...")
+        status_events.emit("connecting", address=self.device_address)
+        self.client = BleakClient(self.device_address)  # Initialize and connect BLE client using the device address
+        await self.client.connect()                     # Asynchronously connect to the BLE device
+
+        if not self.client.is_connected:                # Verify connection was successful
+            print(f"Failed to connect to {self.device_address}")
+            return False
+
+        print(f"Connected to {self.device_address}", flush=True)
+        status_events.emit("connected", address=self.device_address)
+        self.last_received_time = time.time()           # Record current time as last received
+
+        # Send start command
+        await self.client.write_gatt_char(CONTROL_CHAR_UUID, b"START", response=True)
+        print("Sent START command" + self.label())
+
+        # Subscribe to notifications
+        await self.client.start_notify(DATA_CHAR_UUID, self.notification_handler)
+        print("Subscribed to data notifications" + self.label())
+        status_events.emit("streaming", address=self.device_address, sampling_rate=SAMPLING_RATE, num_channels=NUM_CHANNELS)
+        return True
+
+    def interruption(self, timeout):
+        """Return the reason data stopped flowing from this device, or None if it is healthy"""
+        if self.last_received_time and (time.time() - self.last_received_time) > timeout:   # Check for Data Timeout
+            return "Data Interrupted"
+        if self.client and not self.client.is_connected:                                     # Check for BLE Disconnection
+            return "Data Interrupted (Bluetooth disconnected)"
+        return None
+
+    async def disconnect(self):
+        """Disconnect from the BLE device if currently connected"""
+        if self.client and self.client.is_connected:
+            await self.client.disconnect()
+
+    async def reconnect(self, stop_event):
+        """Reconnect with exponential backoff until the device streams again or the session is stopped"""
+        self.reconnecting = True
+        if self.prev_unrolled_counter is not None:   # Lets the first block after the dropout be placed in time
+            self.resume_time = self.last_received_time
+        delay = RECONNECT_DELAY
+        try:
+            while not stop_event.is_set():
+                try:
+                    await self.disconnect()            # Drop the stale connection before trying again
+                except Exception:
+                    pass
+                await asyncio.sleep(delay)
+                try:
+                    if await self.start():
+                        self.reconnects += 1
+                        return True
+                except Exception as e:
+                    print(f"Reconnect failed: {str(e)}" + self.label())
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            return False
+        finally:
+            self.reconnecting = False
+
+class MergedOutlet:
+    """One LSL outlet carrying the channels of several devices side by side.
+
+    Each device's samples are queued until every device has delivered the same number of
+    sample periods; missing samples are pushed as NaN (float32) or GAP_MARKER (int16) so the columns
+    stay aligned without repeating real samples.
+    """
+    def __init__(self, clients, max_pending=SAMPLING_RATE * 2, channel_format="int16"):
+        self.clients = clients
+        self.max_pending = max_pending                                       # Samples kept per device while waiting for the others
+        self.dtype = np.dtype(channel_format)
+        self.gap_value = np.nan if self.dtype.kind == "f" else GAP_MARKER   # Value of the rows a device missed
+        self.pending = {id(client): (np.empty((0, NUM_CHANNELS), dtype=self.dtype), np.empty(0)) for client in clients}
+        self.last_unrolled = {id(client): None for client in clients}        # Last unrolled counter queued per device
+        self.dropped_samples = 0                                             # Samples discarded because another device stalled
+        info = StreamInfo("NPG-Merged", "EXG", NUM_CHANNELS * len(clients), SAMPLING_RATE, channel_format, "npg-merged")
+        channels = info.desc().append_child("channels")
+        for client in clients:                                               # Describe which device each channel comes from
+            for index in range(NUM_CHANNELS):
+                channel = channels.append_child("channel")
+                channel.append_child_value("label", f"{client.device_address}-CH{index + 1}")
+        self.outlet = StreamOutlet(info)
+
+    def push(self, client, unrolled, channels, timestamps):
+        """Queue a decoded block from one device and push every fully aligned row"""
+        key = id(client)
+        previous = self.last_unrolled[key]
+        first = int(unrolled[0]) if previous is None else min(previous + 1, int(unrolled[0]))   # Counters never go backwards, but stay safe
+        filled_counters, filled_channels = fill_gaps(unrolled, channels, first, self.gap_value)
+        filled_channels = np.asarray(filled_channels).astype(self.dtype)
+        filled_timestamps = timestamps[-1] + (filled_counters - unrolled[-1]) / SAMPLING_RATE
+        self.last_unrolled[key] = int(unrolled[-1])
+
+        queued_channels, queued_timestamps = self.pending[key]
+        queued_channels = np.concatenate([queued_channels, filled_channels])[-self.max_pending:]
+        queued_timestamps = np.concatenate([queued_timestamps, filled_timestamps])[-self.max_pending:]
+        self.dropped_samples += len(filled_channels) + len(self.pending[key][0]) - len(queued_channels)
+        self.pending[key] = (queued_channels, queued_timestamps)
+
+        ready = min(len(queued[0]) for queued in self.pending.values())
+        if ready == 0:
+            return
+        rows = np.hstack([self.pending[id(c)][0][:ready] for c in self.clients])
+        stamps = self.pending[id(self.clients[0])][1][:ready]               # The first device provides the time base
+        push_block(self.outlet, rows, stamps, dtype=self.dtype)
+        for c in self.clients:
+            queued_channels, queued_timestamps = self.pending[id(c)]
+            self.pending[id(c)] = (queued_channels[ready:], queued_timestamps[ready:])
+
+    def restart(self, client):
+        """A device restarted its sample counter after a long dropout: forget its last counter and
+        drop every queued sample, so the rows start aligned again from the next blocks"""
+        self.last_unrolled[id(client)] = None
+        for key, (queued_channels, queued_timestamps) in self.pending.items():
+            self.dropped_samples += len(queued_channels)
+            self.pending[key] = (queued_channels[:0], queued_timestamps[:0])
+
+class NPGDeviceManager:
+    """Connects any number of NPG devices concurrently in a single asyncio event loop"""
+    def __init__(self, device_addresses, merged=False, reconnect=False, fill_gaps=False):
+        self.clients = [NPGBluetoothClient(address) for address in device_addresses]
+        self.merged = merged and len(self.clients) > 1  # Merging only makes sense with several devices
+        self.reconnect = reconnect                      # Resilient mode: reconnect instead of exiting
+        self.channel_format = "float32" if fill_gaps else "int16"   # float32 so gaps can be filled with NaN
+        for client in self.clients:
+            client.multi_device = len(self.clients) > 1
+            client.fill_gaps = fill_gaps
+        self.DATA_TIMEOUT = 2.0                    # Timeout for considering data interrupted
+        self.monitor_task = None                   # Task for monitoring all connections
+        self.print_rate_task = None                # Task for printing sample rates
+        self.reconnect_tasks = set()               # Running reconnect tasks
+        self.running = False                       # Flag indicating if the manager is running or not
+        self.loop = None                           # Event loop for asyncio
+        self.connection_event = threading.Event()  # Event for connection status
+        self.stop_event = threading.Event()        # Event for stopping all operations
+
+    def create_outlets(self):
+        """Set up one LSL stream per device, or one merged stream for all of them"""
+        if self.merged:
+            merged_outlet = MergedOutlet(self.clients, channel_format=self.channel_format)
+            for client in self.clients:
+                client.merged_outlet = merged_outlet
+            return
+        for index, client in enumerate(self.clients):
+            if len(self.clients) == 1:   # Keep the original stream for a single device
+                info = StreamInfo("NPG", "EXG", NUM_CHANNELS, SAMPLING_RATE, self.channel_format, "npg1234")
+            else:
+                info = StreamInfo(f"NPG-{index + 1}", "EXG", NUM_CHANNELS, SAMPLING_RATE, self.channel_format, client.device_address)
+            client.outlet = StreamOutlet(info)
 
     async def print_rate(self):
-        """Periodically print the sample rate every second"""
+        """Periodically print the sample rate of every device every second"""
         while not self.stop_event.is_set():      # Continue running until stop event is triggered
             await asyncio.sleep(1)
-            print(f"Samples per second: {self.samples_received}")
-            self.samples_received = 0            # Reset the counter after printing
+            for client in self.clients:
+                print(f"Samples per second: {client.samples_received}" + client.label())
+                status_events.emit("stats", address=client.device_address, samples=client.samples_received, missing=client.total_missing_samples,
+                                   queue_depth=client.queue_depth(), decode_ms=client.decode_time * 1000, decode_max_ms=client.decode_max_time * 1000, drift=client.clock.drift)
+                client.samples_received = 0      # Reset the counter after printing
+                client.decode_time = client.decode_max_time = 0.0
 
     async def monitor_connection(self):
-        """Monitor the connection status and check for data interruptions"""
+        """Monitor every connection and check for data interruptions"""
         while not self.stop_event.is_set():      # Continue running until stop event is triggered
-            if self.last_received_time and (time.time() - self.last_received_time) > self.DATA_TIMEOUT:     # Check for Data Timeout
-                print("\nData Interrupted")
-                self.running = False
-                break
-            if self.client and not self.client.is_connected:     # Check for BLE Disconnection
-                print("\nData Interrupted (Bluetooth disconnected)")
-                self.running = False                             # Set running flag to False
-                break                                            # Exit the monitoring loop
-            await asyncio.sleep(0.5)                             # Short sleep to prevent busy-waiting
-
-    async def async_connect(self, device_address):
-        """Asynchronous function to establish BLE connection and start data streaming"""
+            for client in self.clients:
+                if client.reconnecting:
+                    continue
+                reason = client.interruption(self.DATA_TIMEOUT)
+                if reason and self.reconnect:    # Keep the outlet alive and bring the device back
+                    print("\nConnection lost, reconnecting..." + client.label(), flush=True)
+                    status_events.emit("reconnecting", address=client.device_address, message=reason)
+                    task = asyncio.create_task(client.reconnect(self.stop_event))
+                    self.reconnect_tasks.add(task)
+                    task.add_done_callback(self.reconnect_tasks.discard)
+                elif reason:
+                    print(f"\n{reason}" + client.label())
+                    status_events.emit("interrupted", address=client.device_address, message=reason)
+                    self.running = False         # Stop the whole session, like a single device would
+                    return
+            await asyncio.sleep(0.5)             # Short sleep to prevent busy-waiting
+
+    async def async_connect(self):
+        """Connect to all devices concurrently and stream until interrupted or stopped"""
         try:
-            print(f"Attempting to connect to {device_address}...")
-            
-            info = StreamInfo("NPG", "EXG", 3, 500, "int16", "npg1234")   # Set up LSL stream
-            self.outlet = StreamOutlet(info)                              # Create the LSL output stream
-            
-            self.client = BleakClient(device_address)  # Initialize and connect BLE client using the device address
-            await self.client.connect()                # Asynchronously connect to the BLE device
-            
-            if not self.client.is_connected:           # Verify connection was successful
-                print("Failed to connect")
-                return False                           # Return False if connection failed
-            
-            print(f"Connected to {device_address}", flush=True)
-            self.connection_event.set()                # Shows connection is established
-            
-            self.last_received_time = time.time()                               # Record current time as last received
+            self.create_outlets()
+            results = await asyncio.gather(*(client.start() for client in self.clients), return_exceptions=True)
+            failed = [client.device_address for client, result in zip(self.clients, results) if result is not True]
+            for client, result in zip(self.clients, results):
+                if isinstance(result, Exception):
+                    print(f"Connection error: {str(result)}" + client.label())
+            if failed:
+                print(f"Failed to connect to {', '.join(failed)}")
+                status_events.emit("error", message=f"Failed to connect to {', '.join(failed)}")
+                return False
+
+            self.connection_event.set()                                         # Shows connection is established
             self.monitor_task = asyncio.create_task(self.monitor_connection())  # Task to monitor connection status
             self.print_rate_task = asyncio.create_task(self.print_rate())       # Task to periodically print sample rate
-            
-            # Send start command
-            await self.client.write_gatt_char(CONTROL_CHAR_UUID, b"START", response=True)
-            print("Sent START command")
-            
-            # Subscribe to notifications
-            await self.client.start_notify(DATA_CHAR_UUID, self.notification_handler)
-            print("Subscribed to data notifications")
-            
+
             # Main processing loop
             self.running = True
             while self.running and not self.stop_event.is_set():
                 await asyncio.sleep(1)
-            
+
             return True
-            
+
         except Exception as e:
             print(f"Connection error: {str(e)}")
+            status_events.emit("error", message=f"Connection error: {str(e)}")
             return False
         finally:
             await self.cleanup()
 
     async def cleanup(self):
-        """Clean up resources and disconnect from the BLE device"""
+        """Clean up resources and disconnect from every BLE device"""
         if self.monitor_task:
             self.monitor_task.cancel()               # Cancel the background monitoring task if it exists
         if self.print_rate_task:
             self.print_rate_task.cancel()            # Cancel the sample rate printing task if it exists
-        if self.client and self.client.is_connected:
-            await self.client.disconnect()           # Disconnect from the BLE device if currently connected
+        for task in list(self.reconnect_tasks):
+            task.cancel()                            # Give up on devices that are still reconnecting
+        await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
         self.running = False                         # Set running flag to False
         self.connection_event.clear()                # Clear the connection event flag
+        for client in self.clients:
+            if client.total_missing_samples:
+                print(f"Total missing samples: {client.total_missing_samples}" + client.label())
+            if client.reconnects:
+                print(f"Reconnected {client.reconnects} time(s)" + client.label())
+        status_events.emit("stopped", missing=sum(client.total_missing_samples for client in self.clients))
 
-    def connect(self, device_address):
+    def connect(self):
         self.loop = asyncio.new_event_loop()         # Create a new async event loop (required for async operations)
         asyncio.set_event_loop(self.loop)            # Set this as the active loop for our thread
         
         try:
-            self.loop.run_until_complete(self.async_connect(device_address))  # Run the async connection until it finishes
+            self.loop.run_until_complete(self.async_connect())                # Run the async connection until it finishes
         except Exception as e:
             print(f"Error in connection: {str(e)}")                           # If connection fails, print error and return False
             return False
@@ -195,7 +398,11 @@ def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser()
     parser.add_argument("--scan", action="store_true", help="Scan for devices")
-    parser.add_argument("--connect", type=str, help="Connect to device address")
+    parser.add_argument("--connect", type=str, nargs="+", help="Connect to one or more device addresses")
+    parser.add_argument("--merged", action="store_true", help="Stream all connected devices through one merged LSL outlet")
+    parser.add_argument("--reconnect", action="store_true", help="Reconnect automatically after a dropout instead of exiting")
+    parser.add_argument("--fill-gaps", action="store_true", help="Push NaN samples for missing samples (the stream uses float32 channels)")
+    parser.add_argument("--status-json", action="store_true", help="Also print status events as JSON lines (used by app.py)")
     return parser.parse_args()
 
 async def scan_devices():
@@ -213,18 +420,18 @@ async def scan_devices():
 
 if __name__ == "__main__":
     args = parse_args()                  # Handle command line arguments
-    client = NPGBluetoothClient()        # Create Bluetooth client instance
+    if args.status_json:
+        status_events.enable()
     
     try:
         if args.scan:                    # Scan flag - discover available devices
             asyncio.run(scan_devices())
-        elif args.connect:               # Connect flag - connect to a specific device
-            client.connect(args.connect)
+        elif args.connect:               # Connect flag - connect to one or more devices
+            manager = NPGDeviceManager(args.connect, merged=args.merged, reconnect=args.reconnect, fill_gaps=args.fill_gaps)
             try:                         # Keep running until data interrupted or connection fails
-                while client.running:
-                    time.sleep(1)
+                manager.connect()
             except KeyboardInterrupt:
-                client.stop()
+                manager.stop()
         else:
             print("Please specify --scan or --connect")
             sys.exit(1)
@@ -0,0 +1,125 @@
+from collections import deque, namedtuple
+import numpy as np
+from ring_buffer import RingBuffer
+from stream_filters import StreamingFilter, bandpass
+
+RPeak = namedtuple("RPeak", ["timestamp", "index", "value"])  # LSL timestamp, absolute sample number, ECG value
+
+class QRSDetector:
+    """Streaming Pan-Tompkins style QRS detector and heart-rate tracker.
+
+    New samples are band-passed (5-15 Hz), differentiated, squared and integrated over a 150 ms
+    moving window, all with state carried between chunks. Local maxima of the integrated signal
+    are classified as QRS or noise against an adaptive threshold; for each QRS the R peak is the
+    maximum of the input ECG within a short lookback window. R peaks are kept with their LSL
+    timestamps (the last `max_peaks`), and the heart rate is the mean of the last `history` RR intervals.
+    """
+    def __init__(self, sampling_rate, refractory_period=0.25, integration_window=0.15, lookback=0.25, learning_period=2.0, history=9, max_peaks=64):
+        self.sampling_rate = sampling_rate
+        self.refractory_period = refractory_period
+        self.lookback = int(lookback * sampling_rate)                   # Samples searched back for the R peak
+        self.learning_samples = int(learning_period * sampling_rate)    # Samples used to initialise the thresholds
+        self.filter = StreamingFilter(bandpass(5.0, 15.0, sampling_rate, order=2))
+        self.window = max(1, int(integration_window * sampling_rate))
+        self.energy_tail = np.zeros(self.window - 1)                    # Last squared-derivative samples of the previous chunk
+        self.previous_band = None                                       # Last band-passed sample, for the derivative
+        self.tail = (np.empty(0), np.empty(0))                          # Last two integrated samples and their timestamps
+        self.max_chunk = 2 * sampling_rate                              # Longer chunks are processed in pieces
+        capacity = self.lookback + self.max_chunk + 2                   # Covers a chunk plus the two tail samples
+        self.ecg = RingBuffer(capacity)                                 # Recent input samples for the R-peak search
+        self.times = RingBuffer(capacity)                               # and their timestamps
+        self.total = 0                                                  # Samples processed so far
+        self.signal_level = 0.0                                         # Running estimate of QRS peak height (SPKI)
+        self.noise_level = 0.0                                          # Running estimate of noise peak height (NPKI)
+        self.learning_max = 0.0
+        self.learning_sum = 0.0
+        self.r_peaks = deque(maxlen=max(max_peaks, history + 1))        # Most recent R peaks
+        self.rr_intervals = deque(maxlen=history)                       # RR intervals in seconds
+        self.rr_sum = 0.0                                               # Running sum of rr_intervals
+
+    @property
+    def threshold(self):
+        return self.noise_level + 0.25 * (self.signal_level - self.noise_level)
+
+    @property
+    def heart_rate(self):
+        """Mean heart rate (BPM) over the RR history, or None until the history is full."""
+        if len(self.rr_intervals) < self.rr_intervals.maxlen:
+            return None
+        return 60.0 * len(self.rr_intervals) / self.rr_sum
+
+    def integrate(self, values):
+        """Band-pass, differentiate, square and integrate new samples over the moving window."""
+        band = np.nan_to_num(self.filter.process(values))   # The filter restarts after stream gaps (NaN)
+        previous = band[0] if self.previous_band is None else self.previous_band
+        self.previous_band = band[-1]
+        energy = np.concatenate([self.energy_tail, np.diff(band, prepend=previous) ** 2])
+        self.energy_tail = energy[len(energy) - (self.window - 1):]
+        sums = np.cumsum(np.concatenate(([0.0], energy)))
+        return (sums[self.window:] - sums[:-self.window]) / self.window
+
+    def process(self, values, timestamps=None):
+        """Add new (low-pass filtered) ECG samples and return the R peaks found as RPeaks."""
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        if count == 0:
+            return []
+        if timestamps is None:
+            timestamps = (self.total + np.arange(count)) / self.sampling_rate
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if count > self.max_chunk:                # E.g. after a stall: the R-peak search must stay within the buffer
+            return [peak for start in range(0, count, self.max_chunk)
+                    for peak in self.process(values[start:start + self.max_chunk], timestamps[start:start + self.max_chunk])]
+        self.ecg.extend(np.nan_to_num(values, nan=-np.inf))   # Gap samples are never picked as R peaks
+        self.times.extend(timestamps)
+        integrated = self.integrate(values)
+
+        first_index = self.total
+        self.total += count
+        if first_index < self.learning_samples:   # Learn the initial signal and noise levels
+            learning = integrated[:self.learning_samples - first_index]
+            self.learning_max = max(self.learning_max, learning.max())
+            self.learning_sum += learning.sum()
+            if self.total >= self.learning_samples:
+                self.signal_level = 0.25 * self.learning_max
+                self.noise_level = 0.5 * self.learning_sum / self.learning_samples
+            else:
+                self.tail = (integrated[-2:], timestamps[-2:])
+                return []
+
+        tail_values, tail_times = self.tail
+        signal = np.concatenate([tail_values, integrated])
+        times = np.concatenate([tail_times, timestamps])
+        start = first_index - len(tail_values)    # Absolute sample number of signal[0]
+        self.tail = (signal[-2:], times[-2:])
+
+        middle = signal[1:-1]
+        candidates = np.flatnonzero((middle > signal[:-2]) & (middle >= signal[2:])) + 1
+        peaks = []
+        for position in candidates:   # A few local maxima per chunk
+            height = signal[position]
+            last_time = self.r_peaks[-1].timestamp if self.r_peaks else -np.inf
+            if height > self.threshold and times[position] - last_time >= self.refractory_period:
+                self.signal_level = 0.125 * height + 0.875 * self.signal_level
+                peaks.append(self.add_peak(start + position))
+            else:
+                self.noise_level = 0.125 * height + 0.875 * self.noise_level
+        return peaks
+
+    def add_peak(self, index):
+        """Locate the R peak in the input just before integrated-signal peak `index` and update the RR history."""
+        offset = self.total - index               # Samples from the end of the recent-input buffer
+        if offset + self.lookback > self.ecg.capacity:
+            raise ValueError("R-peak search outside the recent-input buffer")
+        window = self.ecg.latest(offset + self.lookback)[:self.lookback + 1]
+        times = self.times.latest(offset + self.lookback)[:self.lookback + 1]
+        position = int(np.argmax(window))
+        peak = RPeak(times[position], index - (len(window) - 1) + position, window[position])
+        if self.r_peaks:
+            interval = peak.timestamp - self.r_peaks[-1].timestamp
+            if len(self.rr_intervals) == self.rr_intervals.maxlen:
+                self.rr_sum -= self.rr_intervals[0]
+            self.rr_intervals.append(interval)
+            self.rr_sum += interval
+        self.r_peaks.append(peak)
+        return peak
@@ -0,0 +1,219 @@
+# Recording formats for Chords-Python
+#
+# CSV:    the original human-readable ChordsPy-*.csv log.
+# Binary: a small JSON header followed by packed little-endian frames, one per sample:
+#
+#         MAGIC (8 bytes) | header length (uint32) | JSON header (space padded) | frames...
+#         frame = counter (uint16) + one int16/uint16 value per channel
+#
+# Binary recordings are opened through np.memmap, so multi-hour sessions open instantly
+# and only the parts that are actually used are read from disk.
+
+import argparse
+import csv
+import json
+import os
+import struct
+import time
+from datetime import datetime
+import numpy as np
+
+MAGIC = b"CHRDBIN1"       # File signature and format version
+HEADER_ALIGNMENT = 64     # Frames start on a multiple of this many bytes
+CSV_CHUNK_SIZE = 50000    # Rows converted per chunk
+
+def frame_dtype(num_channels, channel_dtype="uint16"):
+    """Structured dtype of one binary frame."""
+    return np.dtype([('counter', '<u2'), ('channels', np.dtype(channel_dtype).newbyteorder('<'), (num_channels,))])
+
+class CSVRecorder:
+    """Writes samples to the original ChordsPy CSV format."""
+    def __init__(self, filename, board, sampling_rate, num_channels):
+        self.filename = filename
+        self.file = open(filename, mode='w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([f"Arduino Board: {board}"])
+        self.writer.writerow([f"Sampling Rate (samples per second): {sampling_rate}"])
+        self.writer.writerow([])  # Blank row for separation
+        self.writer.writerow(['Counter'] + [f'Channel{i+1}' for i in range(num_channels)])  # Write header
+
+    def write_block(self, counters, samples):
+        """Write a block of counters (n_samples,) and channel values (n_samples, num_channels)."""
+        self.writer.writerows([counter] + channel_data for counter, channel_data in zip(np.asarray(counters).tolist(), np.asarray(samples).tolist()))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class BinaryRecorder:
+    """Writes samples as a JSON header followed by packed int16/uint16 frames."""
+    def __init__(self, filename, board, sampling_rate, num_channels, channel_dtype="uint16", start_timestamp=None):
+        self.filename = filename
+        self.dtype = frame_dtype(num_channels, channel_dtype)
+        self.limits = np.iinfo(self.dtype['channels'].base)
+        self.header = {
+            "board": board,
+            "sampling_rate": sampling_rate,
+            "num_channels": num_channels,
+            "channel_dtype": np.dtype(channel_dtype).name,
+            "start_timestamp": time.time() if start_timestamp is None else start_timestamp,
+        }
+        self.header["start_time"] = datetime.fromtimestamp(self.header["start_timestamp"]).isoformat()
+        self.file = open(filename, mode='wb')
+        self.file.write(encode_header(self.header))
+
+    def write_block(self, counters, samples):
+        """Write a block of counters (n_samples,) and channel values (n_samples, num_channels)."""
+        samples = np.asarray(samples)
+        if samples.size and (samples.min() < self.limits.min or samples.max() > self.limits.max):
+            raise ValueError(f"Sample values out of range for {self.header['channel_dtype']} recording")
+        frames = np.empty(len(samples), dtype=self.dtype)
+        frames['counter'] = counters
+        frames['channels'] = samples
+        self.file.write(frames.tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def encode_header(header, magic=MAGIC):
+    """Serialize a header, padded so the frames that follow are aligned."""
+    payload = json.dumps(header).encode('utf-8')
+    prefix = len(magic) + 4
+    padded = -(-(prefix + len(payload)) // HEADER_ALIGNMENT) * HEADER_ALIGNMENT - prefix
+    return magic + struct.pack('<I', padded) + payload.ljust(padded, b' ')
+
+def open_recorder(record_format, filename, board, sampling_rate, num_channels, channel_dtype="uint16"):
+    """Create a recorder for the requested format ('csv' or 'binary')."""
+    if record_format == "binary":
+        return BinaryRecorder(filename, board, sampling_rate, num_channels, channel_dtype=channel_dtype)
+    return CSVRecorder(filename, board, sampling_rate, num_channels)
+
+class BinaryRecording:
+    """Memory-mapped reader for binary recordings."""
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not a Chords binary recording")
+            header_length, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_length).decode('utf-8'))
+        self.offset = len(MAGIC) + 4 + header_length
+        self.dtype = frame_dtype(self.header["num_channels"], self.header["channel_dtype"])
+        count = (os.path.getsize(filename) - self.offset) // self.dtype.itemsize  # Ignore a partially written last frame
+        if count > 0:
+            self.frames = np.memmap(filename, dtype=self.dtype, mode='r', offset=self.offset, shape=(count,))
+        else:
+            self.frames = np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def board(self):
+        return self.header["board"]
+
+    @property
+    def sampling_rate(self):
+        return self.header["sampling_rate"]
+
+    @property
+    def num_channels(self):
+        return self.header["num_channels"]
+
+    @property
+    def counters(self):
+        return self.frames['counter']
+
+    @property
+    def channels(self):
+        """(n_samples, num_channels) view of the channel data."""
+        return self.frames['channels']
+
+    def channel(self, index):
+        """Strided view of a single channel."""
+        return self.frames['channels'][:, index]
+
+def read_csv_header(filename):
+    """Read the metadata rows of a ChordsPy CSV file.
+
+    Returns (board, sampling_rate, columns, header_index) where header_index is the line holding 'Counter'.
+    """
+    board, sampling_rate = None, None
+    with open(filename, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip().strip('"')
+            if line.startswith("Arduino Board:"):
+                board = line.split(":", 1)[1].strip()
+            elif line.startswith("Sampling Rate"):
+                sampling_rate = int(float(line.split(":", 1)[1]))
+            elif "Counter" in line:
+                return board, sampling_rate, next(csv.reader([line])), index
+    raise ValueError("CSV file must contain a 'Counter' column.")
+
+def read_csv_blocks(csv_filename, header_index, chunk_size=CSV_CHUNK_SIZE):
+    """Yield the sample rows of a ChordsPy CSV recording as float64 blocks of up to chunk_size rows."""
+    with open(csv_filename, "r", encoding="utf-8", newline='') as f:
+        reader = csv.reader(f)
+        for _ in range(header_index + 1):  # Skip the metadata and the column header
+            next(reader)
+        while True:
+            rows = [row for _, row in zip(range(chunk_size), reader) if row]
+            if not rows:
+                break
+            yield np.asarray(rows, dtype=np.float64)
+
+def convert_csv(csv_filename, bin_filename=None, channel_dtype="auto", sampling_rate=None, chunk_size=CSV_CHUNK_SIZE):
+    """Convert a ChordsPy CSV recording into the binary format, one chunk at a time.
+
+    With channel_dtype "auto" the whole file is scanned first: inverted recordings contain negative
+    values and need int16. If the conversion fails the partial output file is removed.
+    """
+    board, csv_rate, columns, header_index = read_csv_header(csv_filename)
+    sampling_rate = sampling_rate or csv_rate
+    if sampling_rate is None:
+        raise ValueError("Sampling rate missing from the CSV file, please specify it")
+    bin_filename = bin_filename or os.path.splitext(csv_filename)[0] + ".bin"
+    num_channels = len(columns) - 1
+    start_timestamp = os.path.getmtime(csv_filename)
+
+    if channel_dtype == "auto":
+        negative = any(block[:, 1:].min() < 0 for block in read_csv_blocks(csv_filename, header_index, chunk_size))
+        channel_dtype = "int16" if negative else "uint16"
+    recorder = BinaryRecorder(bin_filename, board, sampling_rate, num_channels, channel_dtype=channel_dtype, start_timestamp=start_timestamp)
+    try:
+        for block in read_csv_blocks(csv_filename, header_index, chunk_size):
+            recorder.write_block(block[:, 0], block[:, 1:])
+        recorder.close()
+    except BaseException:
+        recorder.close()
+        os.remove(bin_filename)   # Never leave a truncated recording behind
+        raise
+    return bin_filename
+
+def main():
+    parser = argparse.ArgumentParser(description="Chords-Python recording tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Convert a ChordsPy CSV file to the binary format")
+    convert_parser.add_argument("csv_file", help="CSV recording to convert")
+    convert_parser.add_argument("-o", "--output", help="Output file (defaults to the CSV name with a .bin extension)")
+    convert_parser.add_argument("--sampling-rate", type=int, help="Sampling rate, if missing from the CSV metadata")
+    info_parser = subparsers.add_parser("info", help="Show the header of a binary recording")
+    info_parser.add_argument("bin_file", help="Binary recording")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        output = convert_csv(args.csv_file, args.output, sampling_rate=args.sampling_rate)
+        print(f"Converted {args.csv_file} to {output}")
+    elif args.command == "info":
+        recording = BinaryRecording(args.bin_file)
+        for key, value in recording.header.items():
+            print(f"{key}: {value}")
+        print(f"samples: {len(recording)} ({len(recording) / recording.sampling_rate:.1f} seconds)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+
+class RingBuffer:
+    """Preallocated circular buffer for plot history.
+
+    Every sample is written twice, once in each half of a double-length array, so the
+    last `capacity` samples are always available as one contiguous slice in time order.
+    """
+    def __init__(self, capacity, num_channels=None, dtype=np.float64):
+        self.capacity = capacity                   # Number of samples kept
+        self.num_channels = num_channels           # None for a single-channel (1-D) buffer
+        shape = (2 * capacity,) if num_channels is None else (num_channels, 2 * capacity)
+        self._data = np.zeros(shape, dtype=dtype)  # Double-length storage
+        self.index = 0                             # Position where the next sample is written
+        self.total = 0                             # Number of samples written since creation
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, sample):
+        """Add a single sample (a scalar, or one value per channel)."""
+        self._data[..., self.index] = sample
+        self._data[..., self.index + self.capacity] = sample
+        self.index = (self.index + 1) % self.capacity
+        self.total += 1
+
+    def extend(self, chunk):
+        """Add a block of samples shaped (n_samples,) or (n_samples, num_channels), as returned by pull_chunk."""
+        chunk = np.asarray(chunk, dtype=self._data.dtype)
+        if self.num_channels is not None:
+            chunk = chunk.reshape(-1, chunk.shape[-1])[:, :self.num_channels].T  # (num_channels, n_samples)
+        count = chunk.shape[-1]
+        if count == 0:
+            return
+        if count > self.capacity:  # Only the newest samples fit
+            self.total += count - self.capacity
+            chunk = chunk[..., -self.capacity:]
+            count = self.capacity
+
+        start = self.index
+        end = start + count
+        self._data[..., start:end] = chunk  # Lower half (may spill into the upper half)
+        if end <= self.capacity:
+            self._data[..., start + self.capacity:end + self.capacity] = chunk
+        else:
+            split = self.capacity - start
+            self._data[..., start + self.capacity:] = chunk[..., :split]
+            self._data[..., :end - self.capacity] = chunk[..., split:]
+        self.index = end % self.capacity
+        self.total += count
+
+    def view(self):
+        """Return the last `capacity` samples, oldest first, without copying."""
+        return self._data[..., self.index:self.index + self.capacity]
+
+    def latest(self, count):
+        """Return the newest `count` samples, oldest first, without copying."""
+        count = min(count, self.capacity)
+        return self._data[..., self.index + self.capacity - count:self.index + self.capacity]
+
+    def clear(self):
+        self._data[...] = 0
+        self.index = 0
+        self.total = 0
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+import numpy as np
+
+def push_block(outlet, samples, timestamps=None, dtype=np.float32):
+    """Push a (n_samples, num_channels) block to an LSL outlet in a single push_chunk call."""
+    samples = np.ascontiguousarray(samples, dtype=dtype)  # Must match the outlet's channel format
+    if timestamps is None:
+        outlet.push_chunk(samples)
+    else:
+        outlet.push_chunk(samples, timestamp=np.asarray(timestamps, dtype=np.float64).tolist())
+
+class SampleWriter(threading.Thread):
+    """Background thread that writes decoded sample blocks to a recorder and an LSL outlet.
+
+    The acquisition loop only calls `submit`, which never blocks: when the bounded queue is
+    full the block is dropped and counted in `dropped_blocks` / `dropped_samples`.
+    """
+    def __init__(self, recorder=None, outlet=None, max_blocks=512, flush_interval=1.0):
+        super().__init__(name="SampleWriter", daemon=True)
+        self.recorder = recorder                      # CSV or binary recorder (see recording.py)
+        self.outlet = outlet                          # LSL outlet
+        self.queue = queue.Queue(maxsize=max_blocks)  # Bounded queue of (counters, samples, timestamps) blocks
+        self.flush_interval = flush_interval          # Seconds between recording file flushes
+        self.dropped_blocks = 0                       # Blocks discarded because the queue was full
+        self.dropped_samples = 0                      # Samples discarded because the queue was full
+        self.written_samples = 0                      # Samples handed to the recorder/outlet
+        self.max_queue_depth = 0                      # Highest queue depth seen
+        self.recorder_error = None                    # Last exception raised by the recorder
+        self.outlet_error = None                      # Last exception raised while pushing to LSL
+
+    def submit(self, counters, samples, timestamps=None):
+        """Queue a block for writing. Returns False if it had to be dropped.
+
+        `timestamps` are per-sample LSL timestamps; without them LSL stamps the chunk on arrival.
+        """
+        try:
+            self.queue.put_nowait((counters, samples, timestamps))
+        except queue.Full:
+            self.dropped_blocks += 1
+            self.dropped_samples += len(counters)
+            return False
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def run(self):
+        last_flush = time.time()
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]       # Wait for the next block
+            while True:                      # Then take everything already waiting
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:                # Sentinel queued by stop()
+                stopping = True
+                batch = [block for block in batch if block is not None]
+            if batch:
+                counters = np.concatenate([block[0] for block in batch])
+                samples = np.concatenate([block[1] for block in batch])
+                timestamps = None
+                if all(block[2] is not None for block in batch):
+                    timestamps = np.concatenate([block[2] for block in batch])
+                self.write(counters, samples, timestamps)
+
+            if self.recorder and (stopping or time.time() - last_flush >= self.flush_interval):
+                try:
+                    self.recorder.flush()
+                except Exception as e:
+                    self.report("recorder", e)
+                last_flush = time.time()
+
+    def write(self, counters, samples, timestamps=None):
+        """Write a block to the recorder and the outlet; a failure of one does not affect the other."""
+        if self.recorder:
+            try:
+                self.recorder.write_block(counters, samples)
+            except Exception as e:
+                self.report("recorder", e)
+        if self.outlet:
+            try:
+                push_block(self.outlet, samples, timestamps)
+            except Exception as e:
+                self.report("outlet", e)
+        self.written_samples += len(counters)
+
+    def report(self, target, error):
+        """Keep the last error of the recorder or the outlet, printing the first one of each."""
+        if getattr(self, f"{target}_error") is None:
+            print(f"Error while writing samples to the {target}: {error}")
+        setattr(self, f"{target}_error", error)
+
+    def stop(self, timeout=5):
+        """Write everything still queued and stop the thread."""
+        if self.is_alive():
+            self.queue.put(None)
+            self.join(timeout)
@@ -0,0 +1,356 @@
+# Hardware-free board simulator for load and soak testing
+#
+# Serial boards are simulated on a pseudo-terminal that answers WHORU/START/STOP like the firmware
+# and streams byte-exact chords packets (sync bytes, counter, channels, END_BYTE, or the self-describing
+# layout). NPG devices are simulated by replacing bleak with an in-process stub that sends
+# notification blocks in the npg-ble.py format. Sources are synthetic ECG/EMG/EOG/EEG waveforms or
+# a replayed CSV/binary recording; packet loss and BLE dropouts can be injected.
+#
+#   python simulator.py serial --board UNO-R4 --signal ecg             # Prints the port for chords.py --port
+#   python simulator.py serial --replay ChordsPy-<timestamp>.bin       # Replay a recording at its sampling rate
+#   python simulator.py npg --signal emg --connect SIM-1 SIM-2          # npg-ble.py with simulated devices
+#   python simulator.py app --board UNO-R4 --signal eeg                 # app.py wired to simulated devices
+#
+# Serial simulation needs a POSIX system (pty).
+
+import argparse
+import asyncio
+import os
+import runpy
+import select
+import shlex
+import sys
+import threading
+import time
+import types
+import numpy as np
+import chords
+from lod_index import read_chunks
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TICK = 0.002                 # Seconds between checks for due samples
+MAX_PENDING_SECONDS = 1.0    # Output the reader has not taken yet; more is dropped like a UART overrun
+SIGNALS = ["ecg", "emg", "eog", "eeg"]
+
+def ecg_wave(t, rng):
+    """PQRST complexes at about 72 bpm with baseline wander."""
+    beat_period = 60 / 72
+    phase = (t / beat_period) % 1
+    wave = np.zeros_like(t)
+    for center, width, amplitude in ((0.2, 0.025, 0.15), (0.37, 0.008, -0.15), (0.4, 0.01, 1.0), (0.43, 0.008, -0.25), (0.65, 0.04, 0.3)):
+        wave += amplitude * np.exp(-0.5 * ((phase - center) / width) ** 2)
+    return wave + 0.05 * np.sin(2 * np.pi * 0.3 * t) + 0.02 * rng.standard_normal(len(t))
+
+def emg_wave(t, rng):
+    """Broadband noise with 1 s contractions every 3 s."""
+    active = (t % 3) < 1
+    return rng.standard_normal(len(t)) * np.where(active, 0.5, 0.03)
+
+def eog_wave(t, rng):
+    """Blinks every 2.5 s on top of slow left/right eye movements."""
+    blink = np.exp(-0.5 * (((t % 2.5) - 1.25) / 0.08) ** 2)
+    saccade = 0.3 * np.sign(np.sin(2 * np.pi * 0.2 * t))
+    return blink + saccade + 0.02 * rng.standard_normal(len(t))
+
+def eeg_wave(t, rng):
+    """Waxing and waning 10 Hz alpha with some beta and noise."""
+    alpha = (0.6 + 0.4 * np.sin(2 * np.pi * 0.1 * t)) * np.sin(2 * np.pi * 10 * t)
+    beta = 0.15 * np.sin(2 * np.pi * 21 * t + 1.0)
+    return 0.5 * (alpha + beta) + 0.15 * rng.standard_normal(len(t))
+
+WAVES = {"ecg": ecg_wave, "emg": emg_wave, "eog": eog_wave, "eeg": eeg_wave}
+
+class SignalSource:
+    """Synthetic ADC samples of one kind of signal, the channels slightly shifted in time."""
+    def __init__(self, signal, num_channels, sampling_rate, resolution=14, seed=0):
+        self.wave = WAVES[signal]
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.resolution = resolution
+        self.position = 0
+        self.rng = np.random.default_rng(seed)
+
+    def read(self, count):
+        """Next `count` samples as a (count, num_channels) uint16 array."""
+        t = (self.position + np.arange(count)) / self.sampling_rate
+        self.position += count
+        mid = (2 ** self.resolution - 1) / 2
+        samples = np.empty((count, self.num_channels))
+        for channel in range(self.num_channels):
+            samples[:, channel] = mid + 0.4 * mid * self.wave(t + 0.05 * channel, self.rng)
+        return np.clip(np.rint(samples), 0, 2 ** self.resolution - 1).astype(np.uint16)
+
+class ReplaySource:
+    """Samples of a CSV or binary recording, read chunk by chunk and looped at the end."""
+    def __init__(self, filename, resolution=14):
+        self.filename = filename
+        self.resolution = resolution
+        self.chunks = read_chunks(filename)
+        columns, sampling_rate = next(self.chunks)
+        self.num_channels = len(columns)
+        self.sampling_rate = sampling_rate or 500
+        self.pending = np.empty((0, self.num_channels), dtype=np.float32)
+
+    def read(self, count):
+        blocks, available = [self.pending], len(self.pending)
+        while available < count:
+            block = next(self.chunks, None)
+            if block is None:                     # End of the recording, start over
+                self.chunks = read_chunks(self.filename)
+                next(self.chunks)
+                continue
+            blocks.append(block)
+            available += len(block)
+        samples = np.concatenate(blocks)
+        self.pending = samples[count:]
+        return np.clip(np.rint(samples[:count]), 0, 2 ** self.resolution - 1).astype(np.uint16)
+
+def encode_packets(counters, samples, info=None):
+    """Serial packets for a block of samples, in the fixed layout or (with `info`) the self-describing one."""
+    packets = np.zeros(len(counters), dtype=chords.packet_dtype(samples.shape[1], info is not None))
+    packets['sync'] = (chords.SYNC_BYTE1, chords.SYNC_BYTE2)
+    packets['counter'] = counters
+    packets['channels'] = samples
+    packets['marker'] = chords.END_BYTE if info is None else info
+    return packets.tobytes()
+
+class SerialBoard:
+    """A Chords board on a pseudo-terminal, streaming packets in real time after START.
+
+    `loss` is the fraction of packets dropped (their counters are skipped, like packets lost on
+    the wire). Output the reader does not take within MAX_PENDING_SECONDS is dropped and counted
+    as overrun.
+    """
+    def __init__(self, source, board, loss=0.0, self_describing=False, seed=0):
+        import pty, tty                                     # POSIX only
+        self.source = source
+        self.board = board
+        self.loss = loss
+        self.info = chords.encode_info_byte(source.num_channels, source.resolution) if self_describing else None
+        self.packet_size = chords.packet_dtype(source.num_channels, self_describing).itemsize
+        self.rng = np.random.default_rng(seed)
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)                                   # No echo or newline translation
+        os.set_blocking(self.master, False)
+        self.slave = slave                                  # Kept open so the port survives reader restarts
+        self.port = os.ttyname(slave)
+        self.streaming = False
+        self.sent = 0                                       # Samples generated (including lost ones)
+        self.lost = 0
+        self.overrun = 0
+        self.output = bytearray()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="SerialBoard", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        commands = b""
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([self.master], [], [], TICK)
+            if readable:
+                try:
+                    commands += os.read(self.master, 1024)
+                except (BlockingIOError, OSError):
+                    pass
+                while b"\n" in commands:
+                    line, commands = commands.split(b"\n", 1)
+                    self.handle_command(line.strip().decode(errors='ignore'))
+            if self.streaming:
+                self.generate()
+            self.flush()
+
+    def handle_command(self, command):
+        if command == "WHORU":
+            self.output += f"{self.board}\r\n".encode()
+        elif command == "START":
+            self.streaming = True
+            self.stream_start = time.perf_counter() - self.sent / self.source.sampling_rate   # Counters continue after a restart
+        elif command == "STOP":
+            self.streaming = False
+            self.output.clear()
+
+    def generate(self):
+        due = int((time.perf_counter() - self.stream_start) * self.source.sampling_rate) - self.sent
+        if due <= 0:
+            return
+        samples = self.source.read(due)
+        counters = (self.sent + np.arange(due)) % 256
+        self.sent += due
+        if self.loss:
+            kept = self.rng.random(due) >= self.loss
+            self.lost += int(due - kept.sum())
+            counters, samples = counters[kept], samples[kept]
+        packets = encode_packets(counters, samples, self.info)
+        if len(self.output) + len(packets) > MAX_PENDING_SECONDS * self.source.sampling_rate * self.packet_size:
+            self.overrun += len(counters)
+            return
+        self.output += packets
+
+    def flush(self):
+        if not self.output:
+            return
+        try:
+            written = os.write(self.master, self.output)
+        except (BlockingIOError, OSError):
+            return
+        del self.output[:written]
+
+# npg-ble.py packet format (see SAMPLE_DTYPE and BLOCK_COUNT there)
+NPG_CHANNELS = 3
+NPG_RATE = 500
+NPG_BLOCK = 10
+NPG_SAMPLE_DTYPE = np.dtype([('counter', 'u1'), ('channels', '>i2', (NPG_CHANNELS,))])
+DATA_CHAR = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
+
+class BleStub:
+    """In-process stand-in for the bleak module used by npg-ble.py.
+
+    Every address connects to a simulated NPG device that sends BLOCK_COUNT samples per notification
+    in the npg-ble.py sample layout. `loss` drops whole notifications; with `dropout_every` the device
+    disconnects every so many seconds and cannot be reached for `dropout_length` seconds.
+    """
+    def __init__(self, signal="ecg", loss=0.0, dropout_every=0, dropout_length=2.0, devices=2, seed=0):
+        self.signal = signal
+        self.loss = loss
+        self.dropout_every = dropout_every
+        self.dropout_length = dropout_length
+        self.devices = devices
+        self.seed = seed
+        self.unreachable_until = {}          # Address -> time until which connects fail
+        self.power_on = {}                   # Address -> time the device started sampling
+        self.sources = {}                    # Address -> SignalSource
+
+    def device(self, address):
+        """Start time and signal of a device, which keeps sampling while it is disconnected."""
+        if address not in self.power_on:
+            self.power_on[address] = time.perf_counter()
+            self.sources[address] = SignalSource(self.signal, NPG_CHANNELS, NPG_RATE, resolution=12, seed=self.seed + len(self.sources))
+        return self.power_on[address], self.sources[address]
+
+    def module(self):
+        """A module object exposing BleakScanner and BleakClient."""
+        stub = self
+        class BleakScanner:
+            @staticmethod
+            async def discover():
+                return [types.SimpleNamespace(name=f"NPG-SIM-{index + 1}", address=f"SIM-{index + 1}") for index in range(stub.devices)]
+
+        class BleakClient:
+            def __init__(self, address, **kwargs):
+                self.address = address
+                self.is_connected = False
+                self.task = None
+                self.rng = np.random.default_rng(stub.seed)
+
+            async def connect(self):
+                await asyncio.sleep(0.05)
+                if time.time() < stub.unreachable_until.get(self.address, 0):
+                    raise OSError(f"Device {self.address} not found")
+                self.is_connected = True
+                self.connected_at = time.time()
+
+            async def write_gatt_char(self, uuid, data, response=False):
+                pass
+
+            async def start_notify(self, uuid, handler):
+                self.task = asyncio.get_running_loop().create_task(self.notify(handler))
+
+            async def notify(self, handler):
+                start, source = stub.device(self.address)
+                sent = int((time.perf_counter() - start) * NPG_RATE)   # Samples taken while disconnected are lost
+                source.position = sent
+                while self.is_connected:
+                    await asyncio.sleep(NPG_BLOCK / NPG_RATE / 2)
+                    if stub.dropout_every and time.time() - self.connected_at > stub.dropout_every:
+                        stub.unreachable_until[self.address] = time.time() + stub.dropout_length
+                        self.is_connected = False      # Simulated Bluetooth dropout
+                        return
+                    while (time.perf_counter() - start) * NPG_RATE - sent >= NPG_BLOCK:
+                        block = np.zeros(NPG_BLOCK, dtype=NPG_SAMPLE_DTYPE)
+                        block['counter'] = (sent + np.arange(NPG_BLOCK)) % 256
+                        block['channels'] = source.read(NPG_BLOCK).astype(np.int16)
+                        sent += NPG_BLOCK
+                        if not (stub.loss and self.rng.random() < stub.loss):
+                            handler(DATA_CHAR, bytearray(block.tobytes()))
+
+            async def disconnect(self):
+                self.is_connected = False
+                if self.task:
+                    self.task.cancel()
+
+        return types.SimpleNamespace(BleakScanner=BleakScanner, BleakClient=BleakClient)
+
+def run_npg(stub, npg_args):
+    """Run npg-ble.py in this process against the BLE stub."""
+    sys.modules["bleak"] = stub.module()
+    sys.argv = [os.path.join(SCRIPT_DIR, "npg-ble.py")] + npg_args
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+def make_source(args):
+    if args.replay:
+        return ReplaySource(args.replay, resolution=args.resolution)
+    return SignalSource(args.signal, args.channels, args.rate, resolution=args.resolution, seed=args.seed)
+
+def start_board(args):
+    source = make_source(args)
+    if source.sampling_rate != chords.supported_boards[args.board]["sampling_rate"]:
+        print(f"Note: chords.py labels the stream with the {args.board} rate of {chords.supported_boards[args.board]['sampling_rate']} Hz")
+    board = SerialBoard(source, args.board, loss=args.loss, self_describing=args.self_describing, seed=args.seed).start()
+    print(f"Simulated {args.board} on {board.port}: {source.num_channels} channels at {source.sampling_rate} Hz" + (f" from {args.replay}" if args.replay else f", {args.signal}"))
+    return board
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free board simulator for chords.py, npg-ble.py and app.py")
+    parser.add_argument("mode", choices=["serial", "npg", "app"], help="serial: board on a pseudo-terminal; npg: npg-ble.py with simulated BLE devices; app: app.py using both")
+    parser.add_argument("--board", default="UNO-R4", choices=list(chords.supported_boards), help="Board name answered to WHORU (default: UNO-R4)")
+    parser.add_argument("--signal", default="ecg", choices=SIGNALS, help="Synthetic waveform (default: ecg)")
+    parser.add_argument("--channels", type=int, help="Number of channels (default: the board's)")
+    parser.add_argument("--rate", type=int, help="Samples per second, up to several kHz (default: the board's)")
+    parser.add_argument("--resolution", type=int, help="ADC bits (default: the board's)")
+    parser.add_argument("--replay", help="Replay a CSV or binary recording instead of a synthetic signal")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of packets (serial) or notifications (NPG) to drop")
+    parser.add_argument("--self-describing", action="store_true", help="Send packets with the channel/resolution info byte")
+    parser.add_argument("--dropout-every", type=float, default=0, help="NPG: disconnect every N seconds")
+    parser.add_argument("--dropout-length", type=float, default=2.0, help="NPG: seconds a disconnected device stays unreachable")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args, extra = parser.parse_known_args()
+
+    board_info = chords.supported_boards[args.board]
+    args.channels = args.channels or board_info["Num_channels"]
+    args.rate = args.rate or board_info["sampling_rate"]
+    args.resolution = args.resolution or board_info["resolution"]
+    stub = BleStub(args.signal, loss=args.loss, dropout_every=args.dropout_every, dropout_length=args.dropout_length, seed=args.seed)
+
+    if args.mode == "npg":
+        run_npg(stub, extra)              # Remaining arguments go to npg-ble.py
+        return
+
+    board = start_board(args)
+    if args.mode == "serial":
+        print(f"Run: python chords.py --port {board.port} --lsl")
+        try:
+            while True:
+                time.sleep(1)
+                if board.lost or board.overrun:
+                    print(f"Sent {board.sent} samples, lost {board.lost}, overrun {board.overrun}")
+        except KeyboardInterrupt:
+            board.stop()
+        return
+
+    # app mode: app.py starts chords.py on the simulated port and npg-ble.py through this script
+    npg_options = ["--signal", args.signal, "--loss", str(args.loss), "--dropout-every", str(args.dropout_every), "--dropout-length", str(args.dropout_length)]
+    os.environ["CHORDS_PORT"] = board.port
+    os.environ["CHORDS_NPG_COMMAND"] = shlex.join([os.path.abspath(__file__), "npg"] + npg_options)
+    os.chdir(SCRIPT_DIR)
+    sys.argv = [os.path.join(SCRIPT_DIR, "app.py")] + extra
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from ring_buffer import RingBuffer
+
+EEG_BANDS = {'Delta': (0.5, 4), 'Theta': (4, 8), 'Alpha': (8, 13), 'Beta': (13, 30), 'Gamma': (30, 45)}
+
+class SpectralTracker:
+    """Sliding-window amplitude spectrum and band power for one or more channels.
+
+    Samples are added with `update`; a new spectrum is computed every `hop` samples once a full
+    window is available. The Hanning window, frequency axis and band bin ranges are computed once.
+    With `welch_segments` > 1 the window is split into that many half-overlapping segments whose
+    power spectra are averaged (Welch's method), trading frequency resolution for lower variance.
+    """
+    def __init__(self, sampling_rate, window_size, hop=None, num_channels=1, bands=EEG_BANDS, welch_segments=1):
+        self.sampling_rate = sampling_rate
+        self.window_size = window_size                                    # Samples per analysis window
+        self.hop = hop or window_size                                     # Samples between spectra
+        self.num_channels = num_channels
+        self.welch_segments = welch_segments
+        self.segment_length = window_size if welch_segments == 1 else 2 * window_size // (welch_segments + 1)
+        self.segment_step = max(1, self.segment_length // 2)
+        self.taper = np.hanning(self.segment_length)                      # Precomputed Hanning window
+        self.freqs = np.fft.rfftfreq(self.segment_length, 1 / sampling_rate)
+        self.band_names = list(bands)
+        self.band_slices = [slice(np.searchsorted(self.freqs, low, 'left'), np.searchsorted(self.freqs, high, 'right')) for low, high in bands.values()]
+        self.buffer = RingBuffer(window_size, num_channels)               # Last `window_size` samples per channel
+        self.pending = 0                                                  # Samples added since the last spectrum
+        self.spectrum = None                                              # (num_channels, n_freqs) amplitude spectrum
+
+    def update(self, chunk):
+        """Add samples shaped (n_samples,) or (n_samples, num_channels). Returns True if a new spectrum is ready."""
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.ndim == 1:
+            chunk = chunk[:, np.newaxis]
+        self.buffer.extend(chunk)
+        self.pending += len(chunk)
+        if self.buffer.total < self.window_size or self.pending < self.hop:
+            return False
+        self.pending %= self.hop
+        self.compute()
+        return True
+
+    def compute(self, block=None):
+        """Compute the spectrum of `block` (window_size,) or (num_channels, window_size), or of the buffered window."""
+        data = self.buffer.view() if block is None else np.atleast_2d(np.asarray(block, dtype=np.float64))
+        segments = sliding_window_view(data, self.segment_length, axis=-1)[:, ::self.segment_step][:, :self.welch_segments]
+        amplitudes = np.abs(np.fft.rfft(segments * self.taper, axis=-1)) / self.segment_length
+        self.spectrum = amplitudes[:, 0] if self.welch_segments == 1 else np.sqrt(np.mean(amplitudes ** 2, axis=1))
+        return self.spectrum
+
+    def band_power(self, normalize=True):
+        """(num_channels, n_bands) band amplitudes: the RMS of the band's bins, or their root sum of squares if not normalized."""
+        power = self.spectrum ** 2
+        if normalize:
+            return np.sqrt(np.stack([power[:, band].mean(axis=-1) for band in self.band_slices], axis=-1))
+        return np.sqrt(np.stack([power[:, band].sum(axis=-1) for band in self.band_slices], axis=-1))
@@ -0,0 +1,33 @@
+# Machine-readable status lines for the supervisor in app.py
+#
+# With --status-json, chords.py and npg-ble.py print one JSON object per line next to their usual
+# output, e.g. {"event": "streaming", "time": 1718000000.0, "sampling_rate": 500}. Events:
+#
+#   connecting, connected, streaming, stats, reconnecting, interrupted, error, stopped
+#
+# Other output lines are free text and only logged.
+
+import json
+import time
+
+enabled = False   # Set by the scripts' --status-json flag
+
+def enable():
+    global enabled
+    enabled = True
+
+def emit(event, **fields):
+    """Print a status event as one JSON line (only when enabled)."""
+    if enabled:
+        print(json.dumps({"event": event, "time": time.time(), **fields}), flush=True)
+
+def parse(line):
+    """Return the status event of an output line, or None for a free-text line."""
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        status = json.loads(line)
+    except ValueError:
+        return None
+    return status if isinstance(status, dict) and "event" in status else None
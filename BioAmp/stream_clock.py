@@ -0,0 +1,81 @@
+import numpy as np
+from pylsl import local_clock
+
+def unroll_counters(counters, previous=None, modulus=256):
+    """Turn wrapping packet counters into a monotonically increasing sample index.
+
+    `previous` is the last unrolled counter of the previous block (None for the first block).
+    A step of zero is read as a full wrap, so the unrolled index always advances and the
+    gaps match the missing-sample count (step - 1).
+    """
+    counters = np.asarray(counters, dtype=np.int64)
+    if len(counters) == 0:
+        return counters
+    start = counters[0] if previous is None else previous
+    steps = ((np.diff(counters, prepend=start % modulus) - 1) % modulus) + 1
+    if previous is None:
+        steps[0] = 0
+    return start + np.cumsum(steps)
+
+class SampleClock:
+    """Reconstructs LSL timestamps from an unrolled sample counter and the nominal sampling rate.
+
+    Timestamps are `offset + counter / sampling_rate`. The offset is anchored to `local_clock()`
+    using the least-delayed block seen during each resync interval, which removes the serial/BLE
+    delivery jitter while still following the slow drift between the board and the host clock.
+    The offset moves towards a new anchor gradually (by at most `slew` of the counter time that
+    passed), so timestamps never go backwards.
+    """
+    def __init__(self, sampling_rate, resync_interval=10.0, warmup_interval=1.0, slew=0.1):
+        self.sampling_rate = float(sampling_rate)
+        self.resync_interval = resync_interval  # Seconds between re-anchoring the offset
+        self.warmup_interval = warmup_interval  # First re-anchor happens sooner
+        self.slew = slew                        # Largest offset correction per second of samples
+        self.offset = None                      # Current offset between counter time and local_clock()
+        self.target = None                      # Offset of the last anchor, approached at the slew rate
+        self.candidate = np.inf                 # Smallest offset seen since the last resync
+        self.last_resync = None                 # local_clock() of the last resync
+        self.last_unrolled = None               # Last counter stamped
+        self.last_timestamp = -np.inf           # Last timestamp returned, kept across resets
+        self.resyncs = 0                        # Number of times the offset was re-anchored
+        self.anchor = None                      # (local_clock(), offset) of the last resync
+        self.drift = None                       # Board clock drift against local_clock() in seconds per hour (board fast > 0)
+
+    def timestamps(self, unrolled, arrival=None):
+        """Timestamps for a block of unrolled counters whose last sample arrived at `arrival`."""
+        arrival = local_clock() if arrival is None else arrival
+        unrolled = np.asarray(unrolled, dtype=np.float64)
+        offset = arrival - unrolled[-1] / self.sampling_rate  # Arrival is never earlier than capture
+        if self.offset is None:
+            self.offset = self.target = offset
+            self.last_resync = arrival
+        self.candidate = min(self.candidate, offset)
+        interval = self.warmup_interval if self.resyncs == 0 else self.resync_interval
+        if arrival - self.last_resync >= interval:
+            if self.anchor is not None:         # The offset moves by the drift between two resyncs
+                self.drift = -(self.candidate - self.anchor[1]) / (arrival - self.anchor[0]) * 3600
+            self.anchor = (arrival, self.candidate)
+            self.target = self.candidate
+            self.candidate = np.inf
+            self.last_resync = arrival
+            self.resyncs += 1
+
+        offsets = np.full(len(unrolled), self.offset)
+        if self.last_unrolled is not None and self.target != self.offset:   # Spread the correction over the samples
+            limit = self.slew * np.maximum(unrolled - self.last_unrolled, 0) / self.sampling_rate
+            offsets += np.clip(self.target - self.offset, -limit, limit)
+        self.offset = offsets[-1]
+        self.last_unrolled = unrolled[-1]
+        stamps = np.maximum(offsets + unrolled / self.sampling_rate, self.last_timestamp)   # Never earlier than what was pushed
+        self.last_timestamp = stamps[-1]
+        return stamps
+
+    def reset(self):
+        self.offset = None
+        self.target = None
+        self.candidate = np.inf
+        self.last_resync = None
+        self.last_unrolled = None
+        self.resyncs = 0
+        self.anchor = None
+        self.drift = None
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.signal import butter, iirnotch, tf2sos, sosfilt, sosfilt_zi
+
+def notch(frequency, sampling_rate, quality=30):
+    """Second-order sections of a notch filter (e.g. 50/60 Hz mains)."""
+    return tf2sos(*iirnotch(frequency, quality, sampling_rate))
+
+def bandpass(low, high, sampling_rate, order=4):
+    return butter(order, [low, high], btype='band', fs=sampling_rate, output='sos')
+
+def lowpass(cutoff, sampling_rate, order=4):
+    return butter(order, cutoff, btype='low', fs=sampling_rate, output='sos')
+
+def highpass(cutoff, sampling_rate, order=4):
+    return butter(order, cutoff, btype='high', fs=sampling_rate, output='sos')
+
+class StreamingFilter:
+    """Cascade of filter stages applied chunk by chunk, keeping the filter state between chunks.
+
+    Each incoming sample is filtered exactly once, so the cost per update depends on the number of
+    new samples rather than on the length of the plot buffer. The state is initialized to the steady
+    state of the first sample to avoid a start-up transient. Rows containing NaN (gap-filled samples
+    from a resilient stream) are passed through as NaN and the filter restarts after them.
+    """
+    def __init__(self, *stages, num_channels=None):
+        self.sos = np.vstack(stages)      # All stages as one cascade of second-order sections
+        self.num_channels = num_channels  # None for single-channel (1-D) chunks
+        self.zi = None                    # Filter state, created from the first sample
+
+    def reset(self, initial=None):
+        """Restart the filter, in steady state for `initial` if given, otherwise from zero."""
+        if initial is None:
+            self.zi = None
+            return
+        steady = sosfilt_zi(self.sos)  # (n_sections, 2) state for a unit step
+        self.zi = steady if self.num_channels is None else steady[:, :, np.newaxis] * np.ones(self.num_channels)
+        self.zi = self.zi * np.asarray(initial, dtype=np.float64)
+
+    def process(self, chunk):
+        """Filter a chunk shaped (n_samples,) or (n_samples, num_channels) and return the filtered samples."""
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if len(chunk) == 0:
+            return chunk
+        invalid = np.isnan(chunk) if chunk.ndim == 1 else np.isnan(chunk).any(axis=1)
+        if not invalid.any():
+            return self._filter(chunk)
+
+        filtered = np.full(chunk.shape, np.nan)
+        edges = np.flatnonzero(np.diff(np.concatenate(([True], invalid, [True])).astype(np.int8)))
+        for start, end in zip(edges[::2], edges[1::2]):  # Runs of valid rows
+            if start > 0:
+                self.zi = None                            # Restart after a gap
+            filtered[start:end] = self._filter(chunk[start:end])
+        if invalid[-1]:
+            self.zi = None
+        return filtered
+
+    def _filter(self, chunk):
+        if self.zi is None:
+            self.reset(chunk[0])
+        filtered, self.zi = sosfilt(self.sos, chunk, axis=0, zi=self.zi)
+        return filtered
+
+class MovingRMS:
+    """Moving RMS over the last `window_size` samples, kept up to date chunk by chunk.
+
+    A running sum of squares is carried between chunks: each new sample adds its square and
+    removes the square of the sample leaving the window, so an update costs O(1) per new sample.
+    Until a full window has been seen the missing samples count as zeros, as do NaN samples.
+    """
+    RESYNC_INTERVAL = 1000  # Chunks between recomputing the sum exactly, to stop rounding drift
+
+    def __init__(self, window_size, num_channels=None):
+        self.window_size = window_size
+        shape = (window_size,) if num_channels is None else (window_size, num_channels)
+        self.tail = np.zeros(shape)              # Squares of the last window_size samples
+        self.sum = np.zeros(shape[1:])           # Running sum of self.tail
+        self.chunks = 0
+
+    def process(self, chunk):
+        """Return the RMS value after each sample of a (n_samples,) or (n_samples, num_channels) chunk."""
+        squares = np.nan_to_num(np.asarray(chunk, dtype=np.float64)) ** 2
+        count = len(squares)
+        if count == 0:
+            return squares
+        history = np.concatenate([self.tail, squares])
+        sums = self.sum + np.cumsum(squares - history[:count], axis=0)   # Add the new square, drop the oldest one
+        self.tail = history[count:]
+        self.chunks += 1
+        self.sum = self.tail.sum(axis=0) if self.chunks % self.RESYNC_INTERVAL == 0 else sums[-1]
+        return np.sqrt(np.maximum(sums, 0) / self.window_size)
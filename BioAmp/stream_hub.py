@@ -0,0 +1,91 @@
+import sys
+import numpy as np
+import pylsl
+import pyqtgraph as pg
+from stream_filters import StreamingFilter
+
+def connect_inlet():
+    """Resolve the available EXG streams and open an inlet on the first one that accepts a connection."""
+    print("Searching for available LSL streams...")
+    available_streams = pylsl.resolve_byprop('type', 'EXG', timeout=1.0)   # Raw data only, not derived streams such as the EMG envelope
+
+    if not available_streams:
+        print("No LSL streams found! Exiting...")
+        sys.exit(0)
+
+    for stream in available_streams:
+        try:
+            inlet = pylsl.StreamInlet(stream)
+            print(f"Connected to LSL stream: {stream.name()}")
+            return inlet
+        except Exception as e:
+            print(f"Failed to connect to {stream.name()}: {e}")
+
+    print("Unable to connect to any LSL stream! Exiting...")
+    sys.exit(0)
+
+def make_filter(hub, *stages, num_channels=None):
+    """A StreamingFilter for a standalone app, or the hub's shared filter with the same stages when hosted."""
+    if hub is None:
+        return StreamingFilter(*stages, num_channels=num_channels)
+    return hub.filter(*stages, num_channels=num_channels)
+
+class SharedFilter:
+    """A StreamingFilter used by several views of one StreamHub.
+
+    The first view to call `process` during a hub tick filters the chunk; the others get the same
+    result back. Like the apps' own filters it expects channel 0 of the chunk (num_channels=None)
+    or its first `num_channels` channels.
+    """
+    def __init__(self, hub, stream_filter):
+        self.hub = hub
+        self.stream_filter = stream_filter
+        self.tick = -1        # Hub tick of the cached result
+        self.result = None
+
+    def process(self, chunk):
+        if self.tick != self.hub.tick:
+            self.result = self.stream_filter.process(chunk)
+            self.tick = self.hub.tick
+        return self.result
+
+class StreamHub:
+    """One LSL inlet shared by several views in a single process.
+
+    Every `interval` ms the hub pulls everything waiting in the inlet once and hands the chunk
+    to each registered view's `process_chunk(samples, timestamps)`, so the stream is resolved
+    and received only once however many views are open.
+    """
+    def __init__(self, inlet=None, interval=10):
+        self.inlet = inlet or connect_inlet()
+        self.sampling_rate = int(self.inlet.info().nominal_srate())
+        self.num_channels = self.inlet.info().channel_count()
+        print(f"Sampling rate: {self.sampling_rate} Hz")
+        self.views = []                  # Views receiving every chunk
+        self.filters = {}                # Shared filters keyed by (stages, num_channels)
+        self.tick = 0                    # Number of chunks handed out so far
+        self.interval = interval
+        self.timer = pg.QtCore.QTimer()
+        self.timer.timeout.connect(self.update)
+
+    def add_view(self, view):
+        self.views.append(view)
+
+    def filter(self, *stages, num_channels=None):
+        """Return the shared filter for these stages, creating it on first use."""
+        sos = np.vstack(stages)
+        key = (sos.tobytes(), num_channels)
+        if key not in self.filters:
+            self.filters[key] = SharedFilter(self, StreamingFilter(sos, num_channels=num_channels))
+        return self.filters[key]
+
+    def start(self):
+        self.timer.start(self.interval)
+
+    def update(self):
+        samples, timestamps = self.inlet.pull_chunk(timeout=0.0)
+        if samples:
+            self.tick += 1
+            samples = np.asarray(samples)
+            for view in self.views:
+                view.process_chunk(samples, timestamps)
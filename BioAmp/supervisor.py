@@ -0,0 +1,239 @@
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import status_events
+
+LINE_LIMIT = 1024 * 1024   # Longest output line read from a stream process (asyncio's default is 64 KiB)
+ACTIVE_STATES = {"starting", "connected", "streaming", "reconnecting"}   # The stream process is up
+FINAL_STATES = {"interrupted", "failed", "stopped"}                        # The stream is gone
+
+# Allowed transitions; anything else (e.g. a second device reporting "connected" while streaming) is ignored
+TRANSITIONS = {
+    "starting": {"connected", "streaming"} | FINAL_STATES,
+    "connected": {"streaming"} | FINAL_STATES,
+    "streaming": {"reconnecting"} | FINAL_STATES,
+    "reconnecting": {"connected", "streaming"} | FINAL_STATES,
+}
+
+# Status event -> state it moves the stream to. "stats" only updates the counters.
+EVENT_STATES = {
+    "connecting": "starting",
+    "connected": "connected",
+    "streaming": "streaming",
+    "reconnecting": "reconnecting",
+    "interrupted": "interrupted",
+    "error": "failed",
+    "stopped": "stopped",
+}
+
+STREAM_IDS = itertools.count(1)   # Tells apart successive processes of the same stream
+
+class StreamState:
+    """State machine of one stream process (chords.py or npg-ble.py), driven by its JSON status lines.
+
+    starting -> connected -> streaming <-> reconnecting, ending in interrupted, failed or stopped
+    (see TRANSITIONS). Once a final state is reached later events are ignored, so the cause of the
+    end is kept.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.id = next(STREAM_IDS)
+        self.state = "starting"
+        self.message = None           # Human-readable description of the last state change
+        self.pid = None
+        self.process = None           # asyncio subprocess, once started
+        self.returncode = None
+        self.stats = {}               # Last "stats" event of each source (device address, or the stream name)
+        self.stopping = False         # Set when the supervisor terminates the process on request
+        self.started = time.time()
+        self.updated = self.started
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def handle(self, status):
+        """Apply a status event. Returns True if the state changed."""
+        event = status["event"]
+        if event == "stats":
+            self.stats[status.get("address") or self.name] = {key: value for key, value in status.items() if key not in ("event", "time")}
+            return False
+        new_state = EVENT_STATES.get(event)
+        if new_state not in TRANSITIONS.get(self.state, ()):
+            return False
+        self.state = new_state
+        self.message = status.get("message") or self.describe(status)
+        self.updated = time.time()
+        return True
+
+    def describe(self, status):
+        if status["event"] == "connected":
+            return f"Connected to {status.get('address') or status.get('board', 'device')}"
+        if status["event"] == "streaming":
+            return f"{self.name.upper()} stream running"
+        if status["event"] == "stopped":
+            return f"{self.name.upper()} stream stopped"
+        return f"{self.name.upper()} stream {self.state}"
+
+    def exited(self, returncode):
+        """The process ended; without a final status line this counts as a failure or a stop."""
+        self.returncode = returncode
+        if self.state not in FINAL_STATES:
+            failed = not self.stopping and (returncode not in (0, None) or self.state == "starting")
+            self.state = "failed" if failed else "stopped"
+            self.message = f"{self.name.upper()} stream terminated"
+            self.updated = time.time()
+            return True
+        return False
+
+    def snapshot(self):
+        return {"name": self.name, "id": self.id, "state": self.state, "active": self.active, "message": self.message, "pid": self.pid, "returncode": self.returncode,
+                "stopping": self.stopping, "stats": dict(self.stats), "started": self.started, "updated": self.updated}
+
+async def read_line(stream, name):
+    """Next line of a process's output, or None at the end. Lines longer than LINE_LIMIT are skipped."""
+    skipping = False
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:    # Output ended, possibly without a final newline
+            return e.partial if e.partial and not skipping else None
+        except asyncio.LimitOverrunError as e:
+            await stream.readexactly(e.consumed)    # Drop the buffered part of the long line
+            skipping = True
+            continue
+        if not skipping:
+            return line
+        print(f"{name} output: line longer than {LINE_LIMIT} bytes skipped")
+        skipping = False
+
+class Supervisor:
+    """Starts the stream processes and follows all of them from one asyncio event loop thread.
+
+    Each child's stdout is read by a coroutine, status lines update its StreamState and free-text
+    lines are logged. Request handlers only read the cached states (`snapshot`), they never touch
+    the pipes. Listeners are called with (name, snapshot) on every state change, in order, from a
+    single notification thread so they may block (e.g. to stop dependent apps). Telemetry listeners
+    are called the same way with (name, stats) for every "stats" event.
+    """
+    def __init__(self):
+        self.streams = {}                 # Stream name -> StreamState
+        self.listeners = []
+        self.telemetry_listeners = []
+        self.lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SupervisorEvents")
+        self.thread = threading.Thread(target=self.loop.run_forever, name="Supervisor", daemon=True)
+        self.thread.start()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def add_telemetry_listener(self, listener):
+        self.telemetry_listeners.append(listener)
+
+    def start(self, name, command):
+        """Start a stream process (replacing a finished one of the same name) and return its StreamState."""
+        state = StreamState(name)
+        with self.lock:
+            self.streams[name] = state
+        asyncio.run_coroutine_threadsafe(self.run(name, command, state), self.loop)
+        return state
+
+    def snapshot(self, name):
+        with self.lock:
+            state = self.streams.get(name)
+            return state.snapshot() if state else None
+
+    def is_active(self, name):
+        with self.lock:
+            state = self.streams.get(name)
+            return bool(state and state.active)
+
+    def is_current(self, name, stream_id):
+        """True if `stream_id` (from a snapshot) is still the latest process of the stream."""
+        with self.lock:
+            state = self.streams.get(name)
+            return bool(state and state.id == stream_id)
+
+    def stop(self, name, timeout=3, stream_id=None):
+        """Terminate a stream process (killing it after `timeout` seconds) and wait until it is gone.
+
+        With `stream_id`, only that process is stopped: nothing happens if the stream was restarted since.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.terminate(name, timeout, stream_id), self.loop)
+        future.result(timeout + 2)
+
+    async def terminate(self, name, timeout, stream_id=None):
+        state = self.streams.get(name)
+        if state is None or (stream_id is not None and state.id != stream_id):
+            return
+        process = state.process
+        if process is None or process.returncode is not None:
+            return
+        state.stopping = True
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def run(self, name, command, state):
+        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        env = dict(os.environ, PYTHONUNBUFFERED="1")   # Lines reach the supervisor as soon as they are printed
+        try:
+            process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, creationflags=creation_flags, limit=LINE_LIMIT)
+        except Exception as e:
+            self.update(state, lambda: state.handle({"event": "error", "message": f"Error starting {name.upper()}: {e}"}))
+            return
+        state.process = process
+        state.pid = process.pid
+
+        try:
+            while True:
+                raw_line = await read_line(process.stdout, name)
+                if raw_line is None:
+                    break
+                self.handle_line(name, state, raw_line)
+        except Exception as e:                      # The process can no longer be followed, don't leave it blocked on the pipe
+            print(f"Error reading {name} output: {e}")
+            if process.returncode is None:
+                process.kill()
+        finally:
+            returncode = await process.wait()
+            self.update(state, lambda: state.exited(returncode))
+
+    def handle_line(self, name, state, raw_line):
+        line = raw_line.decode('utf-8', errors='replace').rstrip()
+        status = status_events.parse(line)
+        if status is None:
+            if line:
+                print(f"{name} output:", line)   # Free-text output is only logged
+        else:
+            self.update(state, lambda: state.handle(status))
+            if status["event"] == "stats":
+                for listener in self.telemetry_listeners:
+                    self.notifier.submit(listener, name, {key: value for key, value in status.items() if key != "event"})
+
+    def update(self, state, change):
+        """Apply a change to a stream state and notify the listeners if the state changed."""
+        with self.lock:
+            changed = change()
+            snapshot = state.snapshot()
+        if changed:
+            for listener in self.listeners:
+                self.notifier.submit(listener, state.name, snapshot)
+
+    def shutdown(self, timeout=3):
+        """Stop every stream process."""
+        for name in list(self.streams):
+            try:
+                self.stop(name, timeout)
+            except Exception as e:
+                print(f"Error stopping {name}: {e}")
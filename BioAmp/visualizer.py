@@ -0,0 +1,91 @@
+import sys
+import argparse
+import threading
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
+from PyQt5.QtCore import QObject, pyqtSignal
+from stream_hub import StreamHub
+from heartbeat_ecg import ECGMonitor
+from emgenvelope import EMGMonitor
+from eog import EOGMonitor
+from ffteeg import EEGMonitor, parse_channels
+from gui import RawMonitor
+
+VIEWS = {"ecg": "ECG", "emg": "EMG", "eog": "EOG", "fft": "EEG / FFT", "raw": "Raw channels"}   # View name -> tab title
+
+class CommandReader(QObject):
+    """Reads "show <view>" commands from stdin (sent by app.py) on a background thread."""
+    command = pyqtSignal(str)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        for line in sys.stdin:
+            self.command.emit(line.strip())
+
+class Visualizer(QMainWindow):
+    """Single process hosting the ECG, EMG, EOG, FFT and raw views on one shared LSL inlet.
+
+    The stream is resolved once and every chunk is pulled once by the StreamHub, which hands it to
+    each open view; views using identical filter stages share them. Views are created on demand,
+    either from the command line or with "show <view>" lines on stdin.
+    """
+    def __init__(self, views, num_channels=1, envelope_outlet=False):
+        super().__init__()
+        self.setWindowTitle("BioAmp Visualizer")
+        self.setGeometry(100, 100, 1200, 800)
+        self.tabs = QTabWidget()
+        self.setCentralWidget(self.tabs)
+
+        self.num_channels = num_channels          # Channels analysed by the FFT view
+        self.envelope_outlet = envelope_outlet    # Publish the EMG envelope over LSL
+        self.hub = StreamHub()
+        self.views = {}                           # Open views by name
+        for name in views:
+            self.show_view(name)
+        self.hub.start()
+
+    def create_view(self, name):
+        if name == "ecg":
+            return ECGMonitor(hub=self.hub)
+        if name == "emg":
+            return EMGMonitor(envelope_outlet=self.envelope_outlet, hub=self.hub)
+        if name == "eog":
+            return EOGMonitor(hub=self.hub)
+        if name == "fft":
+            return EEGMonitor(num_channels=self.num_channels, hub=self.hub)
+        return RawMonitor(hub=self.hub)
+
+    def show_view(self, name):
+        """Open the view (if it is not open yet) and bring its tab to the front."""
+        if name not in VIEWS:
+            print(f"Unknown view: {name}")
+            return
+        if name not in self.views:
+            self.views[name] = self.create_view(name)
+            self.tabs.addTab(self.views[name], VIEWS[name])
+            print(f"Opened {name} view")
+        self.tabs.setCurrentWidget(self.views[name])
+
+    def handle_command(self, command):
+        action, _, name = command.partition(" ")
+        if action == "show":
+            self.show_view(name)
+        elif command:
+            print(f"Unknown command: {command}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time ECG, EMG, EOG, FFT and raw views sharing one LSL inlet")
+    parser.add_argument("--views", nargs="+", choices=list(VIEWS), default=list(VIEWS), help="Views to open at start-up (default: all)")
+    parser.add_argument("--channels", type=parse_channels, default=1, help="Number of channels analysed by the FFT view, or 'all' (default: 1)")
+    parser.add_argument("--lsl-envelope", action="store_true", help="Publish the EMG envelope as the LSL stream 'BioAmpEMGEnvelope'")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    window = Visualizer(args.views, num_channels=args.channels, envelope_outlet=args.lsl_envelope)
+    if sys.stdin is not None:   # app.py opens more views through stdin
+        reader = CommandReader()
+        reader.command.connect(window.handle_command)
+        reader.start()
+    window.show()
+    sys.exit(app.exec_())